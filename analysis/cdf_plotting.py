@@ -83,7 +83,7 @@ def cdf():
     with get_db_connection() as conn:
         df = pd.read_sql("""
             With filter_records_by_rcvdPackets AS (
-                SELECT DISTINCT
+                SELECT
                     m.*,
                     i.asn,
                     i.as_name,
@@ -153,7 +153,7 @@ def plot_prob_info():
     with get_db_connection() as conn:
         df = pd.read_sql("""
             With filter_records_by_rcvdPackets AS (
-                SELECT DISTINCT
+                SELECT
                     m.*,
                     i.asn,
                     i.as_name,
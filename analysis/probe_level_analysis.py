@@ -9,7 +9,7 @@ from matplotlib.patches import Patch
 def get_sql_probe_for_country_p50_p95():
     return """
             With filter_records_by_rcvdPackets AS (
-                SELECT DISTINCT
+                SELECT
                     m.*,
                     i.asn,
                     i.as_name,
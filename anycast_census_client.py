@@ -0,0 +1,102 @@
+"""Download and cache anycast-census snapshots by date."""
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import httpx
+import pandas as pd
+
+from metrics import InstrumentedSyncTransport
+
+ANYCAST_CENSUS_BASE_URL = os.getenv(
+    "ANYCAST_CENSUS_BASE_URL", "https://raw.githubusercontent.com/ut-dacs/anycast-census/main/"
+)
+ANYCAST_CENSUS_CACHE_DIR = os.getenv("ANYCAST_CENSUS_CACHE_DIR", "data/anycast/census")
+
+logger = logging.getLogger("ripe_atlas")
+
+
+class AnycastCensusClient:
+    """Fetches census CSV snapshots and keeps them on disk per date.
+
+    A snapshot is stored as <cache_dir>/<YYYY-MM-DD>/<family>.csv next to a
+    .meta.json file with the ETag and Last-Modified headers. A cached
+    snapshot younger than max_age seconds is used as is. An older one is
+    revalidated with If-None-Match / If-Modified-Since, so an unchanged
+    file costs a 304 instead of a download. If the census cannot be reached,
+    the cached snapshot is used, so this works offline once a date has been
+    fetched.
+    """
+
+    def __init__(
+        self,
+        base_url: str = ANYCAST_CENSUS_BASE_URL,
+        cache_dir: str = ANYCAST_CENSUS_CACHE_DIR,
+        max_age: float = 7 * 24 * 3600,
+        timeout: float = 60.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.timeout = timeout
+
+    def snapshot_path(self, date_str: str, family: str = "IPv4") -> str:
+        return os.path.join(self.cache_dir, date_str.replace("/", "-"), f"{family}.csv")
+
+    def fetch(self, date_str: str, family: str = "IPv4") -> str:
+        """Make sure the snapshot is cached and return its local path.
+
+        Args:
+            date_str: Census date, 'YYYY/MM/DD'
+            family: 'IPv4' or 'IPv6'
+        """
+        path = self.snapshot_path(date_str, family)
+        meta_path = f"{path}.meta.json"
+        cached = os.path.exists(path)
+        if cached and time.time() - os.path.getmtime(path) <= self.max_age:
+            return path
+
+        meta = {}
+        if cached and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        headers = {}
+        if cached and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if cached and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        url = f"{self.base_url}/{date_str}/{family}.csv"
+        try:
+            with httpx.Client(timeout=self.timeout, follow_redirects=True, transport=InstrumentedSyncTransport("anycast_census", url)) as client:
+                resp = client.get(url, headers=headers)
+                if resp.status_code == 304:
+                    logger.info(f"Anycast census {date_str} {family} not modified")
+                    os.utime(path)
+                    return path
+                resp.raise_for_status()
+        except httpx.HTTPError as e:
+            if not cached:
+                raise
+            logger.warning(f"Using cached anycast census {date_str} {family}, refresh failed: {e}")
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(resp.content)
+        os.replace(tmp_path, path)
+        with open(meta_path, "w") as f:
+            json.dump({
+                "url": url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }, f)
+        logger.info(f"Cached anycast census {date_str} {family} ({len(resp.content)} bytes)")
+        return path
+
+    def get_snapshot(self, date_str: str, family: str = "IPv4", columns: Optional[list[str]] = None) -> pd.DataFrame:
+        """Load a census snapshot as a DataFrame, fetching it if needed."""
+        return pd.read_csv(self.fetch(date_str, family), usecols=columns)
@@ -1,229 +1,227 @@
 import pandas as pd
+import numpy as np
 import os
-import csv
-import asyncio
+from dataclasses import dataclass
+from typing import Optional
 
 import logging
 
-from geo_lite_client import GeoLiteClient
-from ip_info_client import IpinfoClient
+from anycast_census_client import AnycastCensusClient
+from ip_info_client import IpinfoOldClient
+from repositories.anycast_target_repository import AnycastTargetRepository
+from prefix_index import PrefixIndex
+from services.enrichment_pipeline import CheckpointStore, EnrichmentPipeline, export_results_csv
+from services.enrichment_service import EnrichmentService, IpinfoSource, parse_asn
 logger = logging.getLogger("ripe_atlas")
 
-def get_anycast_list(date_str: str = "2025/10/08", param_value: int = 0):
+DEFAULT_CENSUS_DATE = os.getenv("ANYCAST_CENSUS_DATE", "2025/10/08")
+DEFAULT_HITLIST_PATH = os.getenv("ANYCAST_HITLIST_PATH", "data/anycast/internet_address_hitlist_it113w-20250827.fsdb")
+# IPv6 hitlist: one responsive address per line (e.g. the TUM IPv6 Hitlist responsive-addresses.txt)
+DEFAULT_HITLIST_V6_PATH = os.getenv("ANYCAST_HITLIST_V6_PATH", "data/anycast/responsive-addresses.txt")
+CENSUS_FAMILIES = {4: "IPv4", 6: "IPv6"}
+
+
+def default_hitlist_path(af: int = 4) -> str:
+    return DEFAULT_HITLIST_V6_PATH if af == 6 else DEFAULT_HITLIST_PATH
+
+def get_anycast_list(date_str: str = DEFAULT_CENSUS_DATE, param_value: int = 0, af: int = 4):
     """
     Fetch and filter anycast IPs from anycast-census CSV for a given date.
 
     Args:
         date_str (str): Date in format 'YYYY/MM/DD', e.g. '2025/10/08'
         param_value (int): Minimum number_of_sites threshold.
+        af (int): Address family, 4 (IPv4.csv) or 6 (IPv6.csv).
     """
-    base_url = "https://raw.githubusercontent.com/ut-dacs/anycast-census/main/"
-    csv_url = f"{base_url}{date_str}/IPv4.csv"
-
-    # Load and process data
-    df = pd.read_csv(csv_url)
+    # Cached per date and family under data/anycast/census, revalidated when stale
+    df = AnycastCensusClient().get_snapshot(date_str, CENSUS_FAMILIES[af])
     filtered = df[df["number_of_sites"] > param_value].sort_values(
         by="number_of_sites", ascending=False
     )
     return filtered
 
 
-def build_anycast_dict(df):
-    """
-    Given a DataFrame of anycast prefixes (with 'prefix' column),
-    return a dictionary where:
-        key   = first three octets (e.g., '1.0.0')
-        value = prefix string (e.g., '1.0.0.0/24')
+@dataclass
+class HitlistMatch:
+    """Best-scoring responsive hitlist address per prefix."""
+
+    prefixes: list[str]
+    ips: list[Optional[str]]
+    scores: list[Optional[int]]
+    rows_scanned: int = 0
+
+    @property
+    def matched(self) -> int:
+        return sum(ip is not None for ip in self.ips)
+
+    def summary(self) -> dict:
+        return {
+            "prefixes": len(self.prefixes),
+            "matched": self.matched,
+            "unmatched": len(self.prefixes) - self.matched,
+            "rows_scanned": self.rows_scanned,
+        }
+
+
+def _read_hitlist(path: str, chunk_size: int):
+    """Yield (score, ip) chunks from an ISI FSDB hitlist or a plain address list.
+
+    A plain list (one address per line, as IPv6 hitlists are published)
+    gives every address a score of 1.
     """
-    anycast_dict = {}
-
-    for _,row in df.iterrows():
-        prefix = row["prefix"]
-        num_sites = row["number_of_sites"]
-        try:
-            base = ".".join(prefix.split(".")[:3])
-            anycast_dict[base] = {"prefix": prefix, "num_sites": num_sites}
-        except Exception as e:
-            logger.error(f"Error processing row {row}: {e}")
-            continue
-        
-    return anycast_dict
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first = next((line for line in f if line.strip() and not line.startswith("#")), "")
+    if len(first.split()) == 1:
+        chunks = pd.read_csv(
+            path, sep=r"\s+", comment="#", header=None, usecols=[0], names=["ip"],
+            dtype={"ip": str}, chunksize=chunk_size, on_bad_lines="skip",
+        )
+        for chunk in chunks:
+            chunk.insert(0, "score", 1)
+            yield chunk
+        return
+
+    # All three columns are named so a truncated first row can't narrow the table
+    yield from pd.read_csv(
+        path, sep=r"\s+", comment="#", header=None, names=["address_hex", "score", "ip"],
+        usecols=["score", "ip"], dtype={"ip": str},
+        chunksize=chunk_size, on_bad_lines="skip",
+    )
 
 
-# fsdb_reader.py
-def retrieve_ips_from_fsdb_hitlist(anycast_dict, fsdb_path: str = "data/anycast/internet_address_hitlist_it113w-20250827.fsdb"):
+def match_hitlist(prefixes: list[str], fsdb_path: str, chunk_size: int = 1_000_000) -> HitlistMatch:
     """
-    Reads an FSDB file and returns a list of rows (as lists)
-    where the 'score' value is > 0.
+    Stream a hitlist file and pick, for every prefix, the responsive
+    address (score > 0) with the highest score. Ties keep the address seen
+    first. Addresses match their most specific prefix; IPv4 and IPv6
+    prefixes and addresses can be mixed.
     """
-    # anycast_df = get_anycast_list(date_str="2025/10/08", param_value=0)
-    # anycast_dict = build_anycast_dict(anycast_df)
-
-    result = []
-    with open(fsdb_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue  # skip comments or empty lines
-
-            parts = line.split()
-            try:
-                score = int(parts[1])
-                if score > 0:
-                    ip = parts[2]
-                    base = ".".join(ip.split(".")[:3])
-                    if base in anycast_dict:
-                        anycast_dict[base]["ip"] = ip
-                        result.append(ip)
-            except ValueError:
-                print(f"this line has a non-integer score: {line}")
-                continue  # skip malformed lines
-
-    return result
-
-def get_final_anycast_ips(anycast_dict):
-    ips = []
-    for key, val in anycast_dict.items():
-        if "ip" in val:
-            ips.append(val["ip"])
-    return ips
-
-def write_ip_list_to_csv(ip_list, filename, columns=["ip"]):
+    # Duplicate prefixes share one slot
+    codes, unique_prefixes = pd.factorize(pd.Series(list(prefixes), dtype=object))
+    index = PrefixIndex(list(unique_prefixes))
+    best_scores = np.full(len(index), np.iinfo(np.int64).min, dtype=np.int64)
+    best_ips = np.full(len(index), None, dtype=object)
+    rows_scanned = 0
+
+    for chunk in _read_hitlist(fsdb_path, chunk_size):
+        rows_scanned += len(chunk)
+        scores = chunk["score"]
+        if scores.dtype == object:
+            scores = pd.to_numeric(scores, errors="coerce")
+        malformed = int(scores.isna().sum())
+        if malformed:
+            logger.warning(f"Skipping {malformed} hitlist rows with a non-integer score")
+
+        responsive = (scores > 0).to_numpy(dtype=bool, na_value=False)
+        ips = chunk["ip"].to_numpy(dtype=object)[responsive]
+        positions = index.lookup_strings(ips)
+        hit = positions >= 0
+        if not hit.any():
+            continue
+
+        found = pd.DataFrame({
+            "position": positions[hit],
+            "score": scores[responsive].to_numpy(dtype=np.int64)[hit],
+            "ip": ips[hit],
+        })
+        # Best row per prefix in this chunk, then merge with the running best
+        found = found.sort_values("score", ascending=False, kind="stable").drop_duplicates("position")
+        position = found["position"].to_numpy()
+        better = found["score"].to_numpy() > best_scores[position]
+        best_scores[position[better]] = found["score"].to_numpy()[better]
+        best_ips[position[better]] = found["ip"].to_numpy()[better]
+
+    matched = pd.notna(best_ips)
+    ips = [best_ips[code] for code in codes.tolist()]
+    scores = [int(best_scores[code]) if matched[code] else None for code in codes.tolist()]
+    return HitlistMatch(prefixes=list(prefixes), ips=ips, scores=scores, rows_scanned=rows_scanned)
+
+
+def build_anycast_targets(date_str: str = DEFAULT_CENSUS_DATE, param_value: int = 0, fsdb_path: Optional[str] = None, af: int = 4) -> pd.DataFrame:
     """
-    Write a list of IPs to a CSV file with a single column 'ip'.
+    Match the census prefixes of one address family with more than
+    param_value sites against the hitlist of that family and return one
+    row per matched prefix: prefix, num_sites, ip, score.
     """
-    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(columns)
-        for ip in ip_list:
-            writer.writerow([ip])
-
-def get_anycast_ips(param_value: int = 0):
-    csv_path = f"data/anycast/anycast_ip_list_{param_value}.csv"
-    if os.path.exists(csv_path):
-        ips = []
-        with open(csv_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                ips.append(row["ip"])
-        return ips
-    else:
-        anycast_df = get_anycast_list(date_str="2025/10/08", param_value=param_value)
-        anycast_dict = build_anycast_dict(anycast_df)
-        matched_ips = retrieve_ips_from_fsdb_hitlist(anycast_dict)
-        ips = get_final_anycast_ips(anycast_dict)
-        write_ip_list_to_csv(ips, csv_path)
-        return matched_ips
+    anycast_df = get_anycast_list(date_str=date_str, param_value=param_value, af=af)
+    anycast_df = anycast_df.drop_duplicates("prefix", keep="last")
+    match = match_hitlist(anycast_df["prefix"].tolist(), fsdb_path or default_hitlist_path(af))
+    logger.info(f"Hitlist match for IPv{af} census {date_str} (sites > {param_value}): {match.summary()}")
+
+    targets = pd.DataFrame({
+        "prefix": match.prefixes,
+        "num_sites": anycast_df["number_of_sites"].to_numpy(),
+        "ip": match.ips,
+        "score": match.scores,
+    })
+    return targets.dropna(subset=["ip"]).astype({"score": "int64"})
+
+
+def get_anycast_targets(param_value: int = 0, date_str: str = DEFAULT_CENSUS_DATE, af: int = 4) -> pd.DataFrame:
+    """Target snapshot for a census date, site threshold and address family, built once and then read from disk."""
+    repo = AnycastTargetRepository()
+    if not repo.exists(date_str, param_value, af):
+        repo.write_snapshot(date_str, param_value, build_anycast_targets(date_str, param_value, af=af), af)
+    return repo.read_snapshot(date_str, param_value, af)
+
+
+def get_anycast_ips(param_value: int = 0, date_str: str = DEFAULT_CENSUS_DATE, af: int = 4):
+    """Responsive anycast target IPs for a census date, site threshold and address family."""
+    ips = get_anycast_targets(param_value, date_str, af)["ip"]
+    return ips.drop_duplicates().tolist()
     
 
-async def get_anycast_ip_details():
-   
+def _ip_details_row(ip: str, data: dict) -> dict:
+    row = {"ip_address": ip, **{k: data.get(k) for k in ("as_name", "as_domain", "as_org", "country_code", "country", "continent", "continent_code")}}
+    # Older checkpoints hold ipinfo's "AS15169", enrichment results the integer
+    asn = parse_asn(data.get("asn"))
+    row["asn"] = f"AS{asn}" if asn is not None else None
+    return row
+
+
+async def get_anycast_ip_details(concurrency: int = 8, rate_per_sec: float = 20.0):
+    """Enrich the anycast targets with ipinfo and write data/anycast/anycast_ip_details.csv.
+
+    Lookups go through the ipinfo source of EnrichmentService (batched and
+    cached), run concurrently under a shared rate limit, and are
+    checkpointed, so IPs that are already enriched are skipped.
+    """
     OUTPUT_FILE = "data/anycast/anycast_ip_details.csv"
-    BATCH_SIZE = 10
+    SOURCE = "ipinfo_lite"
     FIELDNAMES = [
         "ip_address", "asn", "as_name", "as_domain", "as_org",
         "country_code", "country",
         "continent", "continent_code"
     ]
 
-    # ensure dir & figure out header need
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    header_needed = not (os.path.exists(OUTPUT_FILE) and os.path.getsize(OUTPUT_FILE) > 0)
-
     ips = get_anycast_ips(10)
 
-    # read existing IPs (if any) to avoid duplicate lookups/writes
-    existing_ips = set()
-    if not header_needed:
-        with open(OUTPUT_FILE, "r", newline="", encoding="utf-8") as rf:
-            reader = csv.DictReader(rf)
-            for row in reader:
-                ip = row.get("ip_address")
-                if ip:
-                    existing_ips.add(ip)
-
-    new_ips = [ip for ip in ips if ip not in existing_ips]
-    skipped_existing = len(ips) - len(new_ips)
-    if not new_ips:
-        logger.info("Nothing to do: all %d IPs already recorded.", len(ips))
-        return {"seen": len(ips), "skipped_existing": skipped_existing, "written": 0, "errors": 0}
-
-    written = 0
-    errors = 0
-
-    async with IpinfoClient() as ipinfo, GeoLiteClient() as geolite:
-        with open(OUTPUT_FILE, "a", newline="", encoding="utf-8") as wf:
-            writer = csv.DictWriter(wf, fieldnames=FIELDNAMES)
-            if header_needed:
-                writer.writeheader()
-
-            # process in batches
-            for batch_start in range(0, len(new_ips), BATCH_SIZE):
-                batch = new_ips[batch_start: batch_start + BATCH_SIZE]
-                logger.info("Processing batch %d (%d IPs)", batch_start // BATCH_SIZE + 1, len(batch))
-
-                for ip in batch:
-                    try:
-                        ipinfo_data = await ipinfo.lookup(ip)
-                        #geolite_data = await geolite.city(ip)
-
-                        if not ipinfo_data: #or not geolite_data:
-                            logger.warning("Skipping %s: missing data", ip)
-                            errors += 1
-                            continue
-
-                        row = {
-                            "ip_address": ip,
-                            "asn": ipinfo_data.get("asn"),
-                            #"as_num": geolite_data.as_num,
-                            "as_name": ipinfo_data.get("as_name"),
-                            "as_domain": ipinfo_data.get("as_domain"),
-                            #"as_org": geolite_data.as_org,
-                            "country_code": ipinfo_data.get("country_code"),
-                            "country": ipinfo_data.get("country"),
-                            #"registered_country": getattr(geolite_data, "registered_country", None),
-                            #"registered_country_iso": getattr(geolite_data, "registered_country_iso", None),
-                            "continent": ipinfo_data.get("continent"),
-                            "continent_code": ipinfo_data.get("continent_code"),
-                            # "latitude": getattr(geolite_data, "latitude", None),
-                            # "longitude": getattr(geolite_data, "longitude", None),
-                            # "accuracy_radius_km": getattr(geolite_data, "accuracy_radius_km", None),
-                            # "network": geolite_data.network,
-                            # "time_zone": getattr(geolite_data, "time_zone", None),
-                        }
-
-                        try:
-                            writer.writerow(row)
-                            written += 1
-                        except Exception as write_err:
-                            errors += 1
-                            logger.exception("Write error for %s: %s", ip, write_err)
-
-                    except Exception as fetch_err:
-                        errors += 1
-                        logger.exception("Lookup error for %s: %s", ip, fetch_err)
-
-                # persist once per batch
-                try:
-                    wf.flush()
-                    os.fsync(wf.fileno())
-                except Exception as fs_err:
-                    logger.warning("Flush/fsync warning: %s", fs_err)
-
-    logger.info("Done. Seen=%d, Skipped(existing)=%d, Written=%d, Errors=%d",
-                len(ips), skipped_existing, written, errors)
-    return {"seen": len(ips), "skipped_existing": skipped_existing, "written": written, "errors": errors}
-
-
-
-async def fetch_anycast_hostnames_csv(batch_size: int = 20, sleep_sec: int = 10):
+    store = CheckpointStore()
+    try:
+        store.import_csv(SOURCE, OUTPUT_FILE, ip_field="ip_address")
+        async with EnrichmentService([IpinfoSource()]) as enrichment:
+            async def lookup(ip):
+                result = await enrichment.lookup(ip)
+                return result.as_dict() if result.sources else None
+
+            pipeline = EnrichmentPipeline(SOURCE, lookup, store, concurrency=concurrency, rate_per_sec=rate_per_sec)
+            stats = await pipeline.run(ips)
+        if stats["written"] or not os.path.exists(OUTPUT_FILE):
+            export_results_csv(store, SOURCE, OUTPUT_FILE, FIELDNAMES, _ip_details_row)
+    finally:
+        store.close()
+    return stats
+
+
+async def fetch_anycast_hostnames_csv(concurrency: int = 4, rate_per_sec: float = 2.0):
     """Fetch hostname and metadata for anycast IPs and write to CSV.
 
-    Uses `get_anycast_ips(10)` as the IP source and `IpinfoOldClient` for lookups.
-    Writes all returned fields to `data/anycast/anycast_hostnames.csv` and
-    pauses `sleep_sec` seconds after each `batch_size` requests.
+    Uses `get_anycast_ips(10)` as the IP source and `IpinfoOldClient` for
+    lookups, rate limited to `rate_per_sec` requests per second.
+    Writes all returned fields to `data/anycast/anycast_hostnames.csv`.
     """
     OUTPUT_FILE = "data/anycast/anycast_hostnames.csv"
+    SOURCE = "ipinfo_hostname"
     FIELDNAMES = [
         "ip",
         "hostname",
@@ -238,52 +236,23 @@ async def fetch_anycast_hostnames_csv(batch_size: int = 20, sleep_sec: int = 10)
         "anycast",
     ]
 
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-
     ips = get_anycast_ips(10)
     if not ips:
         return {"status": "complete", "message": "No IPs to process", "processed": 0}
 
-    header_needed = not (os.path.exists(OUTPUT_FILE) and os.path.getsize(OUTPUT_FILE) > 0)
-
-    processed = 0
-    errors = 0
-
-    from ip_info_client import IpinfoOldClient
-
-    async with IpinfoOldClient() as client:
-        with open(OUTPUT_FILE, "a", newline="", encoding="utf-8") as wf:
-            writer = csv.DictWriter(wf, fieldnames=FIELDNAMES, extrasaction="ignore")
-            if header_needed:
-                writer.writeheader()
-
-            for idx, ip in enumerate(ips, start=1):
-                try:
-                    data = await client.lookup(ip)
-                    if not data:
-                        errors += 1
-                        continue
-
-                    row = {k: data.get(k) for k in FIELDNAMES}
-                    # ensure ip field exists (some endpoints may return it separately)
-                    if not row.get("ip"):
-                        row["ip"] = ip
-
-                    writer.writerow(row)
-                    processed += 1
-
-                except Exception as e:
-                    logger.exception("Lookup/write error for %s: %s", ip, e)
-                    errors += 1
-
-                if idx % batch_size == 0:
-                    await asyncio.sleep(sleep_sec)
-
-            try:
-                wf.flush()
-                os.fsync(wf.fileno())
-            except Exception:
-                pass
-
-    return {"status": "success", "processed": processed, "errors": errors}
-
+    store = CheckpointStore()
+    try:
+        store.import_csv(SOURCE, OUTPUT_FILE, ip_field="ip")
+        async with IpinfoOldClient() as client:
+            pipeline = EnrichmentPipeline(SOURCE, client.lookup, store, concurrency=concurrency, rate_per_sec=rate_per_sec)
+            stats = await pipeline.run(ips)
+        if stats["written"] or not os.path.exists(OUTPUT_FILE):
+            # ensure ip field exists (some endpoints may return it separately)
+            export_results_csv(
+                store, SOURCE, OUTPUT_FILE, FIELDNAMES,
+                lambda ip, data: {**{k: data.get(k) for k in FIELDNAMES}, "ip": data.get("ip") or ip},
+            )
+    finally:
+        store.close()
+
+    return {"status": "success", "processed": stats["written"], "skipped_existing": stats["skipped_existing"], "errors": stats["errors"]}
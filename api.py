@@ -1,28 +1,48 @@
-from fastapi import FastAPI, File, UploadFile, Depends
-from fastapi.responses import JSONResponse, RedirectResponse
+from config import load_environment
+
+# Before the imports below: several modules read their settings at import time
+load_environment()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import tempfile
-from typing import List, Dict, Any
-from anycast_ip_collection import get_anycast_ips
-from geo_lite_client import GeoLiteClient
-from ip_info_client import IpinfoClient
+from typing import Any, Dict, Optional
+from services.enrichment_service import EnrichmentService
+from ip_lookup_cache import CachedGeoLiteClient, CachedIpinfoClient
 from logging_config import setup_logger
+from metrics import MetricsMiddleware, render as render_metrics
 from ripe_atlas_client import RipeAtlasClient
 from ripe_measurement_parser import RipeMeasurementParser
-from dotenv import load_dotenv
 
+from services.query_service import query_service
 from services.ripe_atlas_service import RipeAtlasService
-from db.db import check_db_connection, get_db, AsyncSessionLocal
+from apis.dependencies import get_ripe_atlas_client
+from apis.streaming import stream_rows
+from db.db import check_db_connection, close_db_connection, get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
-# Import routers
+# Import routers. pandas/numpy-backed modules (census pipeline, probe
+# selection, ASN database) are imported inside the handlers that use them.
 from apis.routes import anycast_router, common_router, measurement_router, probe_router
 
-load_dotenv()
 logger = setup_logger()
 
-app = FastAPI(title="RIPE IP Geolocation API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients once per worker and close them on shutdown."""
+    app.state.ripe_atlas = RipeAtlasClient()
+    try:
+        yield
+    finally:
+        await app.state.ripe_atlas.aclose()
+        await close_db_connection()
+
+
+app = FastAPI(title="RIPE IP Geolocation API", lifespan=lifespan)
 
 # CORS middleware
 origins = [
@@ -37,6 +57,7 @@ app.add_middleware(
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(measurement_router)
@@ -49,6 +70,12 @@ app.include_router(common_router)
 def home():
     return RedirectResponse(url="/docs")
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics in the text exposition format."""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
 @app.get("/hello")
 def hello():
     return {"message": "Hello, world!"}
@@ -64,45 +91,52 @@ async def upload_measurement(file: UploadFile = File(...)):
     parser = RipeMeasurementParser(tmp_path)
     measurements = parser.parse_measurements()
 
-    async with IpinfoClient() as ipinfo, GeoLiteClient() as geolite:
-        for measurement in measurements:
-            for trace in measurement["traceroute"]:
-                ip = trace["from"]
-                if ip == "*" or ip is None:
-                    trace["ipinfo"] = None
-                    trace["geolite"] = None
-                    continue
-                ipinfo_data = await ipinfo.lookup(ip)
+    hop_ips = {
+        trace["from"]
+        for measurement in measurements
+        for trace in measurement["traceroute"]
+        if trace["from"] not in ("*", None)
+    }
+    async with EnrichmentService() as enrichment, CachedIpinfoClient() as ipinfo, CachedGeoLiteClient() as geolite:
+        enrichment_by_ip = await enrichment.lookup_many(hop_ips)
+        # The per-source answers keep the response shape clients rely on; the
+        # chain above already filled the shared caches for most of them
+        ipinfo_by_ip = await ipinfo.lookup_many(hop_ips)
+        geolite_by_ip = await geolite.city_many(hop_ips)
+
+    for measurement in measurements:
+        for trace in measurement["traceroute"]:
+            ip = trace["from"]
+            if ip == "*" or ip is None:
+                trace["ipinfo"] = None
+                trace["geolite"] = None
+                trace["enrichment"] = None
+                continue
+            trace["ipinfo"] = ipinfo_by_ip.get(ip)
+            trace["geolite"] = geolite_by_ip.get(ip)
+            trace["enrichment"] = enrichment_by_ip[ip].as_dict()
 
-                try:
-                    geolite_data = await geolite.city(ip)
-                except Exception as e:
-                    print(f"Error fetching GeoLite data for {ip}: {e}")
-                    geolite_data = {}
+    return measurements
 
-                trace["ipinfo"] = ipinfo_data
-                trace["geolite"] = geolite_data
 
-    return measurements
+def get_ripe_atlas_service(client: Optional[RipeAtlasClient] = Depends(get_ripe_atlas_client)) -> RipeAtlasService:
+    return RipeAtlasService(client)
 
 
 @app.get("/initiate_measurement")
-async def initiate_measurement():
-    service = RipeAtlasService()
+async def initiate_measurement(service: RipeAtlasService = Depends(get_ripe_atlas_service)):
     result = await service.initiate_measurement()
     return {"result": result}
 
 
 @app.get("/process_measurement_results")
-async def process_measurement_results():
-    service = RipeAtlasService()
+async def process_measurement_results(service: RipeAtlasService = Depends(get_ripe_atlas_service)):
     result = await service.process_ping_msm_results()
     return {"result": result}
 
 
 @app.get("/get_anycast_ip_details")
-async def get_anycast_ip_details():
-    service = RipeAtlasService()
+async def get_anycast_ip_details(service: RipeAtlasService = Depends(get_ripe_atlas_service)):
     result = await service.get_anycast_ip_details()
     return {"result": result}
 
@@ -148,31 +182,69 @@ async def get_database_tables(session: AsyncSession = Depends(get_db)) -> Dict[s
 
 
 @app.get("/api/db/stats")
-async def get_database_stats(session: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
-    """Get database statistics including table row counts"""
+async def get_database_stats(exact: bool = False, session: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
+    """Get database statistics: row counts, table/index sizes and scan counts.
+
+    Row counts are planner estimates from pg_class / pg_stat_user_tables, so
+    the call never scans a table. Pass ?exact=true to run count(*) instead.
+    Partitioned tables report the totals of their partitions.
+    """
     try:
         query = text("""
-            SELECT 
-                table_name,
-                (xpath('/row/cnt/text()', 
-                    xml_count))[1]::text::int AS row_count
-            FROM (
-                SELECT
-                    table_name,
-                    query_to_xml(format('SELECT count(*) AS cnt FROM %I.%I', 
-                        table_schema, table_name), false, true, '') AS xml_count
-                FROM information_schema.tables
-                WHERE table_schema = 'public'
-            ) t
-            ORDER BY row_count DESC
+            SELECT
+                c.relname AS "table",
+                c.relkind = 'p' AS is_partitioned,
+                parent.relname AS partition_of,
+                CASE WHEN c.reltuples < 0 THEN COALESCE(s.n_live_tup, 0)
+                     ELSE c.reltuples END::bigint AS row_count,
+                COALESCE(s.n_dead_tup, 0) AS dead_rows,
+                pg_total_relation_size(c.oid) AS total_bytes,
+                pg_relation_size(c.oid) AS table_bytes,
+                pg_indexes_size(c.oid) AS index_bytes,
+                COALESCE(s.seq_scan, 0) AS seq_scan,
+                COALESCE(s.seq_tup_read, 0) AS seq_tup_read,
+                COALESCE(s.idx_scan, 0) AS idx_scan,
+                COALESCE(s.idx_tup_fetch, 0) AS idx_tup_fetch,
+                GREATEST(s.last_analyze, s.last_autoanalyze) AS last_analyzed
+            FROM pg_class AS c
+            JOIN pg_namespace AS n ON n.oid = c.relnamespace
+            LEFT JOIN pg_stat_user_tables AS s ON s.relid = c.oid
+            LEFT JOIN pg_inherits AS i ON i.inhrelid = c.oid
+            LEFT JOIN pg_class AS parent ON parent.oid = i.inhparent
+            WHERE n.nspname = 'public'
+              AND c.relkind IN ('r', 'p')
         """)
         result = await session.execute(query)
-        stats = [{"table": row[0], "row_count": row[1]} for row in result.fetchall()]
-        
-        total_rows = sum(stat["row_count"] for stat in stats)
+        stats = [dict(row) for row in result.mappings().all()]
+
+        if exact:
+            for stat in stats:
+                if stat["is_partitioned"]:
+                    continue
+                table_name = stat["table"].replace('"', '""')
+                count_result = await session.execute(text(f'SELECT count(*) FROM public."{table_name}"'))
+                stat["row_count"] = count_result.scalar_one()
+
+        # Partitioned parents have no storage of their own; roll up their partitions
+        by_name = {stat["table"]: stat for stat in stats}
+        summed = ("row_count", "dead_rows", "total_bytes", "table_bytes", "index_bytes",
+                  "seq_scan", "seq_tup_read", "idx_scan", "idx_tup_fetch")
+        for stat in stats:
+            if stat["is_partitioned"]:
+                for key in summed:
+                    stat[key] = 0
+        for stat in stats:
+            parent = by_name.get(stat["partition_of"])
+            if parent is not None and not stat["is_partitioned"]:
+                for key in summed:
+                    parent[key] += stat[key]
+
+        stats.sort(key=lambda stat: stat["total_bytes"], reverse=True)
+        total_rows = sum(stat["row_count"] for stat in stats if not stat["is_partitioned"])
         
         return {
             "status": "success",
+            "mode": "exact" if exact else "estimate",
             "total_tables": len(stats),
             "total_rows": total_rows,
             "tables": stats
@@ -184,30 +256,53 @@ async def get_database_stats(session: AsyncSession = Depends(get_db)) -> Dict[st
         }
 
 
+def _positive_int(query_data: Dict[str, Any], key: str) -> Optional[int]:
+    """Optional positive integer field of a request body; 400 for anything else."""
+    value = query_data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise HTTPException(status_code=400, detail=f"{key} must be a positive integer")
+    return value
+
+
 @app.post("/api/db/query")
-async def execute_custom_query(query_data: Dict[str, str], session: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
-    """Execute a custom SQL SELECT query (read-only)"""
+async def execute_custom_query(query_data: Dict[str, Any], request: Request):
+    """Execute a custom SQL SELECT query (read-only).
+
+    Body: {"query": "...", "max_rows": 1000, "timeout_ms": 5000,
+           "format": "json" | "ndjson" | "csv", "cache": false}
+
+    Runs in a read-only transaction with a statement timeout and a row cap.
+    "ndjson" and "csv" stream the rows and stop when the client disconnects;
+    "json" returns them in one document and can be served from a short-lived cache.
+    A streamed query that fails midway ends with an error line.
+    """
+    max_rows = _positive_int(query_data, "max_rows")
+    timeout_ms = _positive_int(query_data, "timeout_ms")
+    fmt = query_data.get("format", "json")
+    if fmt not in ("json", "ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be json, ndjson or csv")
     try:
-        sql_query = query_data.get("query", "").strip()
-        
-        # Security: Only allow SELECT queries
-        if not sql_query.upper().startswith("SELECT"):
-            return {
-                "status": "error",
-                "message": "Only SELECT queries are allowed"
-            }
-        
-        result = await session.execute(text(sql_query))
-        rows = result.fetchall()
-        
-        return {
-            "status": "success",
-            "row_count": len(rows),
-            "data": [dict(row._mapping) for row in rows] if rows else []
-        }
+        sql_query = query_service.validate(query_data.get("query", ""))
+
+        if fmt in ("ndjson", "csv"):
+            chunks = query_service.stream(
+                sql_query,
+                max_rows=max_rows,
+                statement_timeout_ms=timeout_ms,
+                is_disconnected=request.is_disconnected,
+            )
+            return stream_rows(chunks, fmt, "query")
+
+        return await query_service.run(
+            sql_query,
+            max_rows=max_rows,
+            statement_timeout_ms=timeout_ms,
+            use_cache=bool(query_data.get("cache", False)),
+        )
     except Exception as e:
         return {
             "status": "error",
             "message": str(e)
         }
-
@@ -0,0 +1,15 @@
+"""FastAPI dependencies shared by the app and the route modules."""
+from typing import Optional
+
+from fastapi import Request
+
+from ripe_atlas_client import RipeAtlasClient
+
+
+def get_ripe_atlas_client(request: Request) -> Optional[RipeAtlasClient]:
+    """The worker's shared RipeAtlasClient opened by the app lifespan.
+
+    None without the lifespan (e.g. a bare ASGI transport); services then
+    open a client per call.
+    """
+    return getattr(request.app.state, "ripe_atlas", None)
@@ -1,8 +1,12 @@
 """API routes."""
+from .anycast_routes import router as anycast_router
+from .common_routes import router as common_router
 from .measurement_routes import router as measurement_router
 from .probe_routes import router as probe_router
 
 __all__ = [
+    "anycast_router",
+    "common_router",
     "measurement_router",
     "probe_router",
-]
\ No newline at end of file
+]
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException
-import logging
+from typing import Literal, Optional
 
-from anycast_ip_collection import fetch_anycast_hostnames_csv
+from fastapi import APIRouter, HTTPException, Query
+import logging
 
 logger = logging.getLogger("ripe_atlas")
 
@@ -11,9 +11,54 @@ router = APIRouter(prefix="/anycast", tags=["anycast"])
 @router.post("/fetch-hostnames")
 async def fetch_anycast_hostnames():
     """Trigger fetching hostnames for anycast IPs and writing to CSV."""
+    # The census modules pull in pandas; keep them out of app startup
+    from anycast_ip_collection import fetch_anycast_hostnames_csv
+
     try:
         result = await fetch_anycast_hostnames_csv()
         return result
     except Exception as e:
         logger.error("Error fetching hostnames: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/targets/snapshots")
+async def list_target_snapshots(
+    threshold: Optional[int] = Query(None, ge=0),
+    af: Literal[4, 6] = Query(4),
+):
+    """List stored target snapshots (census date, site threshold) of an address family."""
+    from repositories.anycast_target_repository import AnycastTargetRepository
+
+    snapshots = AnycastTargetRepository().list_snapshots(threshold, af)
+    return {
+        "total": len(snapshots),
+        "snapshots": [{"census_date": date, "threshold": sites, "af": af} for date, sites in snapshots],
+    }
+
+
+@router.get("/targets/diff")
+async def diff_target_snapshots(
+    old: str = Query(..., pattern=r"^\d{4}/\d{2}/\d{2}$"),
+    new: str = Query(..., pattern=r"^\d{4}/\d{2}/\d{2}$"),
+    threshold: int = Query(10, ge=0),
+    af: Literal[4, 6] = Query(4),
+):
+    """Prefixes added, removed and retargeted between two target snapshots."""
+    from repositories.anycast_target_repository import AnycastTargetRepository
+
+    repo = AnycastTargetRepository()
+    for date in (old, new):
+        if not repo.exists(date, threshold, af):
+            raise HTTPException(status_code=404, detail=f"No IPv{af} target snapshot for {date} with threshold {threshold}")
+    try:
+        diff = repo.diff_snapshots(old, new, threshold, af)
+        return {
+            "summary": diff.summary(),
+            "added": diff.added.to_dict(orient="records"),
+            "removed": diff.removed.to_dict(orient="records"),
+            "retargeted": diff.retargeted.to_dict(orient="records"),
+        }
+    except Exception as e:
+        logger.error("Error diffing target snapshots: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -2,6 +2,7 @@ import logging
 
 from fastapi import APIRouter, HTTPException, Path
 
+from ip_lookup_cache import cache_metrics
 from services.broot_service import BRootService
 
 
@@ -10,6 +11,15 @@ logger = logging.getLogger("ripe_atlas")
 router = APIRouter(prefix="/common", tags=["common"])
 
 
+@router.get("/ip-cache/stats")
+def get_ip_cache_stats():
+    """Hit/miss/latency metrics of the IP enrichment caches in this process."""
+    return {
+        "status": "success",
+        "sources": cache_metrics(),
+    }
+
+
 @router.post("/broot/download/{hour}")
 def download_broot_hour(
     hour: int = Path(..., ge=0, le=23),
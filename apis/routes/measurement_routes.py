@@ -1,8 +1,13 @@
 """Measurement API routes."""
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, File, Query, UploadFile
+from apis.dependencies import get_ripe_atlas_client
+from apis.streaming import StreamFormat, stream_rows
 from repositories.measurement_repository import MeasurementRepository
 from repositories.probe_repository import ProbeRepository
-from db.db import get_db
+from db.db import AsyncSessionLocal, get_db
+from ripe_atlas_client import RipeAtlasClient
 from sqlalchemy.ext.asyncio import AsyncSession
 import tempfile
 import logging
@@ -17,22 +22,35 @@ logger = logging.getLogger("ripe_atlas")
 router = APIRouter(prefix="/measurements", tags=["measurements"])
 
 
-def get_measurement_service(session: AsyncSession = Depends(get_db)) -> MeasurementService:
+def get_measurement_service(
+    session: AsyncSession = Depends(get_db),
+    client: Optional[RipeAtlasClient] = Depends(get_ripe_atlas_client),
+) -> MeasurementService:
     """Get MeasurementService instance with database repositories."""    
     measurement_repo = MeasurementRepository(session=session)
     probe_repo = ProbeRepository(session=session)
-    probe_service = ProbeService(probe_repository=probe_repo)
+    probe_service = ProbeService(probe_repository=probe_repo, client=client)
     return MeasurementService(
         measurement_repository=measurement_repo,
         probe_service=probe_service,
+        client=client,
     )
 
 @router.post("/initiate/{continent_code}")
 async def initiate_measurements(
     continent_code: str,
+    census_date: Optional[str] = Query(None, pattern=r"^\d{4}/\d{2}/\d{2}$"),
+    threshold: int = Query(10, ge=0),
+    only_new: bool = False,
+    af: Literal[4, 6] = Query(4),
     measurement_service: MeasurementService = Depends(get_measurement_service),
 ):
-    """Initiate measurements for all anycast IPs using African probes."""
+    """Initiate measurements for anycast IPs of a census snapshot.
+    
+    With only_new=true only targets that are new since the previous
+    snapshot are measured. af=6 runs an IPv6 campaign from the IPv6
+    census with IPv6-capable probes.
+    """
     try:
         if not continent_code or continent_code not in ["AF", "SA"]:
             raise HTTPException(status_code=400, detail="Invalid continent code")
@@ -40,6 +58,10 @@ async def initiate_measurements(
         result = await measurement_service.create_measurements(
             continent_code=continent_code,
             measurement_type="ping",
+            census_date=census_date,
+            threshold=threshold,
+            only_new=only_new,
+            af=af,
         )
         
         return result
@@ -85,7 +107,7 @@ async def process_measurement_results(
 async def get_measurments_for_target_analysis(
     measurement_service: MeasurementService = Depends(get_measurement_service),
 ):
-    """Get all measurements from database."""
+    """Get per-target latency statistics (maintained on ingestion)."""
     try:
         measurements = await measurement_service.get_measurement_for_target_analysis()
         return {
@@ -98,21 +120,103 @@ async def get_measurments_for_target_analysis(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/target-stats/refresh")
+async def refresh_target_stats(
+    measurement_service: MeasurementService = Depends(get_measurement_service),
+):
+    """Recompute the per-target latency statistics for all targets."""
+    try:
+        result = await measurement_service.refresh_target_stats()
+        if result.get("status") == "error":
+            raise HTTPException(status_code=500, detail=result.get("message"))
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error refreshing target stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _encode_cursor(row: dict) -> str:
+    """probe_id:timestamp_unix:id of a row, with "null" for a missing timestamp."""
+    timestamp_unix = "null" if row["timestamp_unix"] is None else row["timestamp_unix"]
+    return f"{row['probe_id']}:{timestamp_unix}:{row['id']}"
+
+
+def _decode_cursor(cursor: str) -> tuple[int, Optional[int], int]:
+    try:
+        probe_id, timestamp_unix, row_id = cursor.split(":")
+        return int(probe_id), None if timestamp_unix == "null" else int(timestamp_unix), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/db")
+async def get_measurements_from_db(
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    measurement_service: MeasurementService = Depends(get_measurement_service),
+):
+    """Get one page of result rows from database (keyset pagination on id)."""
+    try:
+        rows = await measurement_service.get_all_measurements_from_db(after_id=after_id, limit=limit)
+        return {
+            "status": "success",
+            "count": len(rows),
+            "next_after_id": rows[-1]["id"] if len(rows) == limit else None,
+            "measurements": rows,
+        }
+    except Exception as e:
+        logger.error(f"Error fetching measurements: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/db/export")
+async def export_measurements_from_db(fmt: StreamFormat = Query("ndjson", alias="format")):
+    """Stream all result rows from database as NDJSON or CSV."""
+    return stream_rows(_stream_measurement_rows(None), fmt, "measurements")
+
+
+@router.get("/db/{measurement_id}/export")
+async def export_measurement_from_db(
+    measurement_id: int,
+    fmt: StreamFormat = Query("ndjson", alias="format"),
+):
+    """Stream all result rows of a measurement from database as NDJSON or CSV."""
+    return stream_rows(_stream_measurement_rows(measurement_id), fmt, f"measurement_{measurement_id}")
+
+
+async def _stream_measurement_rows(measurement_id: Optional[int]):
+    # The response outlives the request's dependencies, so the stream owns its session
+    async with AsyncSessionLocal() as session:
+        repo = MeasurementRepository(session=session)
+        async for rows in repo.stream_measurement_rows(measurement_id):
+            yield rows
+
+
 @router.get("/db/{measurement_id}")
 async def get_measurement_from_db(
     measurement_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
     measurement_service: MeasurementService = Depends(get_measurement_service),
 ):
-    """Get a specific measurement from database by ID."""
+    """Get one page of a measurement's result rows from database.
+    
+    Pass the returned next_cursor to get the following page.
+    """
     try:
-        measurement = await measurement_service.get_measurement_from_db(measurement_id)
+        after = _decode_cursor(cursor) if cursor else None
+        rows = await measurement_service.get_measurement_from_db(measurement_id, after=after, limit=limit)
         
-        if not measurement:
+        if not rows and after is None:
             raise HTTPException(status_code=404, detail="Measurement not found")
         
         return {
             "status": "success",
-            "measurement": measurement
+            "count": len(rows),
+            "next_cursor": _encode_cursor(rows[-1]) if len(rows) == limit else None,
+            "measurement": rows
         }
     except HTTPException:
         raise
@@ -1,7 +1,11 @@
 """Probe API routes."""
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from apis.dependencies import get_ripe_atlas_client
 from db.db import get_db
 from repositories.probe_repository import ProbeRepository
+from ripe_atlas_client import RipeAtlasClient
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 from services.probe_service import ProbeService
@@ -11,14 +15,17 @@ logger = logging.getLogger("ripe_atlas")
 
 router = APIRouter(prefix="/probes", tags=["probes"])
 
-def get_probe_service() -> ProbeService:
-    return ProbeService()
+def get_probe_service(client: Optional[RipeAtlasClient] = Depends(get_ripe_atlas_client)) -> ProbeService:
+    return ProbeService(client=client)
 
 
-def get_probe_service_with_db(session: AsyncSession = Depends(get_db)) -> ProbeService:
+def get_probe_service_with_db(
+    session: AsyncSession = Depends(get_db),
+    client: Optional[RipeAtlasClient] = Depends(get_ripe_atlas_client),
+) -> ProbeService:
     """Get ProbeService instance with database repository."""
     repo = ProbeRepository(session=session)
-    return ProbeService(probe_repository=repo)
+    return ProbeService(probe_repository=repo, client=client)
 
 @router.get("/")
 async def get_all_probes(
@@ -36,6 +43,84 @@ async def get_all_probes(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/sync")
+async def sync_probes(
+    full: bool = False,
+    probe_service: ProbeService = Depends(get_probe_service),
+):
+    """Fetch probes changed since the last sync (or all probes with full=true)."""
+    try:
+        return await probe_service.sync_probes(full=full)
+    except Exception as e:
+        logger.error(f"Error syncing probes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/select")
+async def select_probes(
+    selection: Dict[str, Any],
+    probe_service: ProbeService = Depends(get_probe_service),
+):
+    """Select probe IDs with a chain of policies.
+
+    Body: {"continent": "AF", "policies": [{"name": "k_per_asn", "params": {"k": 2}}, ...]}
+    """
+    try:
+        policies = [
+            (policy["name"], policy.get("params") or {}) if isinstance(policy, dict) else policy
+            for policy in selection.get("policies") or []
+        ]
+        probe_ids = await probe_service.select_probes(policies, continent_code=selection.get("continent"))
+        return {
+            "status": "success",
+            "total": len(probe_ids),
+            "probe_ids": probe_ids.tolist(),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid selection: {e}")
+    except Exception as e:
+        logger.error(f"Error selecting probes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/nearest")
+async def get_nearest_probes(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=1000),
+    probe_service: ProbeService = Depends(get_probe_service),
+):
+    """Get the k probes closest to a location."""
+    try:
+        probes = await probe_service.nearest_probes(lat, lon, k)
+        return {
+            "total": len(probes),
+            "probes": probes,
+        }
+    except Exception as e:
+        logger.error(f"Error finding probes near ({lat}, {lon}): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/within")
+async def get_probes_within(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=20040),
+    probe_service: ProbeService = Depends(get_probe_service),
+):
+    """Get all probes within radius_km of a location."""
+    try:
+        probes = await probe_service.probes_within(lat, lon, radius_km)
+        return {
+            "total": len(probes),
+            "probes": probes,
+        }
+    except Exception as e:
+        logger.error(f"Error finding probes within {radius_km} km of ({lat}, {lon}): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/probes/{continent}")
 async def get_continent_probes(
     continent: str,
@@ -59,14 +144,17 @@ async def get_continent_probes(
 
 @router.get("/db/all")
 async def get_all_probes_from_db(
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
     probe_service: ProbeService = Depends(get_probe_service_with_db),
 ):
-    """Get all probes from database."""
+    """Get one page of probes from database (keyset pagination on id)."""
     try:
-        probes = await probe_service.get_all_probes_from_db()
+        probes = await probe_service.get_all_probes_from_db(after_id=after_id, limit=limit)
         return {
             "status": "success",
             "count": len(probes),
+            "next_after_id": probes[-1].id if len(probes) == limit else None,
             "probes": [
                 {
                     "id": p.id,
@@ -0,0 +1,69 @@
+"""Streaming responses for bulk read endpoints (NDJSON or CSV)."""
+import csv
+import io
+import json
+import logging
+from typing import Any, AsyncIterator, Literal
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger("ripe_atlas")
+
+StreamFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value: Any) -> str:
+    """Encode datetimes, IP addresses and decimals coming back from the DB."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+async def _ndjson_lines(chunks: AsyncIterator[list[dict]]) -> AsyncIterator[str]:
+    try:
+        async for rows in chunks:
+            yield "".join(json.dumps(row, default=_json_default) + "\n" for row in rows)
+    except Exception as e:
+        # The 200 status is already sent; a last line tells the client the body is incomplete
+        logger.error(f"Stream failed midway: {e}")
+        yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+
+
+async def _csv_lines(chunks: AsyncIterator[list[dict]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = None
+    try:
+        async for rows in chunks:
+            if not rows:
+                continue
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    except Exception as e:
+        logger.error(f"Stream failed midway: {e}")
+        yield f"# error: {' '.join(str(e).split())}\n"
+
+
+def stream_rows(chunks: AsyncIterator[list[dict]], fmt: StreamFormat, filename: str) -> StreamingResponse:
+    """Wrap an async iterator of row chunks into a streamed NDJSON or CSV response.
+
+    Only one chunk is held in memory at a time, so memory stays bounded
+    regardless of how many rows the query returns. If the rows stop with
+    an error the body ends with an error line: {"status": "error", ...}
+    for NDJSON and "# error: ..." for CSV.
+    """
+    body = _csv_lines(chunks) if fmt == "csv" else _ndjson_lines(chunks)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
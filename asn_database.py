@@ -0,0 +1,320 @@
+"""Local prefix-to-AS and AS-to-organization database with longest-prefix matching.
+
+Built from CAIDA RouteViews prefix2as dumps (IPv4 and IPv6) and the CAIDA
+AS-to-organization dataset, saved as one .npz file and looked up in
+batches without any network calls.
+
+Usage:
+    python -m asn_database build --pfx2as routeviews-rv2-20251008-1200.pfx2as.gz \\
+        --pfx2as routeviews-rv6-20251008-1200.pfx2as.gz --as2org 20251001.as-org2info.txt.gz
+    python -m asn_database lookup 8.8.8.8 2001:4860:4860::8888
+"""
+import argparse
+import gzip
+import ipaddress
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from prefix_index import ipv4_to_int, ipv6_key, ipv6_to_bytes, split_families
+
+logger = logging.getLogger("ripe_atlas")
+
+ASN_DB_PATH = os.getenv("ASN_DB_PATH", "data/asn/asn_db.npz")
+
+def read_pfx2as(path: str) -> pd.DataFrame:
+    """Read a prefix2as dump (network, length, ASN per line, tab-separated).
+
+    Multi-origin ('13335_209242') and AS-set ('64512,64513') origins keep
+    their first ASN.
+    """
+    df = pd.read_csv(
+        path, sep="\t", header=None, names=["network", "length", "origin"],
+        dtype={"network": str, "length": "int64", "origin": str}, comment="#",
+    )
+    first = df["origin"].str.extract(r"^(\d+)", expand=False)
+    skipped = int(first.isna().sum())
+    if skipped:
+        logger.warning(f"Skipping {skipped} prefix2as rows without a numeric origin in {path}")
+    df = df[first.notna()]
+    return pd.DataFrame({
+        "network": df["network"].to_numpy(),
+        "length": df["length"].to_numpy(),
+        "asn": first[first.notna()].astype("int64").to_numpy(),
+    })
+
+
+def read_as2org(path: str) -> pd.DataFrame:
+    """Read a CAIDA as-org2info.txt dump into asn, as_name, org_name, country."""
+    opener = gzip.open if path.endswith(".gz") else open
+    orgs: dict[str, tuple[str, str]] = {}
+    ases: list[tuple[int, str, str]] = []
+    section = None
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("# format:"):
+                section = "org" if line.startswith("# format:org_id") else "aut"
+                continue
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split("|")
+            if section == "org" and len(fields) >= 4:
+                # org_id|changed|org_name|country|source
+                orgs[fields[0]] = (fields[2], fields[3])
+            elif section == "aut" and len(fields) >= 4 and fields[0].isdigit():
+                # aut|changed|aut_name|org_id|opaque_id|source
+                ases.append((int(fields[0]), fields[2], fields[3]))
+
+    rows = [(asn, as_name, *orgs.get(org_id, ("", ""))) for asn, as_name, org_id in ases]
+    return pd.DataFrame(rows, columns=["asn", "as_name", "org_name", "country"])
+
+
+@dataclass(slots=True)
+class AsnRecord:
+    """Origin AS of the most specific announced prefix covering an IP."""
+
+    asn: int
+    network: str
+    as_name: Optional[str] = None
+    org_name: Optional[str] = None
+    country: Optional[str] = None
+
+
+class _Levels:
+    """Sorted prefix keys per length, longest first, for one address family."""
+
+    def __init__(self, lengths: np.ndarray, offsets: np.ndarray, keys: np.ndarray, asns: np.ndarray):
+        self.lengths = lengths
+        self.offsets = offsets
+        self.keys = keys
+        self.asns = asns
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def levels(self):
+        for level, length in enumerate(self.lengths.tolist()):
+            start, end = self.offsets[level], self.offsets[level + 1]
+            yield length, self.keys[start:end], self.asns[start:end]
+
+    @classmethod
+    def build(cls, lengths: np.ndarray, keys_by_length, asns: np.ndarray) -> "_Levels":
+        """keys_by_length(length, positions) gives the keys of those prefixes at that length."""
+        all_lengths, all_keys, all_asns, offsets = [], [], [], [0]
+        for length in sorted(set(lengths.tolist()), reverse=True):
+            positions = np.nonzero(lengths == length)[0]
+            keys = keys_by_length(length, positions)
+            # Sort by key; for duplicate prefixes the last row wins
+            order = np.argsort(keys, kind="stable")[::-1]
+            keys, level_asns = keys[order], asns[positions][order]
+            keys, first = np.unique(keys, return_index=True)
+            all_lengths.append(length)
+            all_keys.append(keys)
+            all_asns.append(level_asns[first])
+            offsets.append(offsets[-1] + len(keys))
+        return cls(
+            np.array(all_lengths, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            np.concatenate(all_keys) if all_keys else np.array([], dtype=np.int64),
+            np.concatenate(all_asns) if all_asns else np.array([], dtype=np.uint32),
+        )
+
+
+def _v4_key(networks: np.ndarray, length: int) -> np.ndarray:
+    return networks >> (32 - length)
+
+
+class AsnDatabase:
+    """Longest-prefix match of IPv4/IPv6 addresses to origin ASN and organization.
+
+    Like PrefixIndex, every prefix length has a sorted key array that is
+    binary searched with np.searchsorted, most specific length first.
+    IPv4 keys are the network bits as integers, IPv6 keys the masked
+    16-byte addresses. Organizations are a sorted ASN array with parallel
+    name columns.
+    """
+
+    def __init__(self, v4: _Levels, v6: _Levels, orgs: Optional[pd.DataFrame] = None):
+        self.v4 = v4
+        self.v6 = v6
+        orgs = orgs if orgs is not None else pd.DataFrame(columns=["asn", "as_name", "org_name", "country"])
+        orgs = orgs.drop_duplicates("asn", keep="last").sort_values("asn")
+        self._org_asns = orgs["asn"].to_numpy(dtype=np.int64)
+        self._org_columns = {
+            column: orgs[column].fillna("").astype(str).to_numpy(dtype=str)
+            for column in ("as_name", "org_name", "country")
+        }
+
+    def __len__(self) -> int:
+        return len(self.v4) + len(self.v6)
+
+    @classmethod
+    def from_frames(cls, prefixes: pd.DataFrame, orgs: Optional[pd.DataFrame] = None) -> "AsnDatabase":
+        """Build from network/length/asn rows (both families) and optional as2org rows."""
+        is_v6 = prefixes["network"].str.contains(":", regex=False).to_numpy()
+
+        v4 = prefixes[~is_v6]
+        networks = ipv4_to_int(v4["network"])
+        lengths = v4["length"].to_numpy(dtype=np.int64)
+        valid = (networks >= 0) & (lengths >= 0) & (lengths <= 32)
+        if not valid.all():
+            logger.warning(f"Skipping {int((~valid).sum())} invalid IPv4 prefixes")
+        networks, lengths = networks[valid], lengths[valid]
+        v4_levels = _Levels.build(
+            lengths,
+            lambda length, positions: _v4_key(networks[positions], length),
+            v4["asn"].to_numpy(dtype=np.uint32)[valid],
+        )
+
+        v6 = prefixes[is_v6]
+        addresses, valid = ipv6_to_bytes(v6["network"])
+        lengths = v6["length"].to_numpy(dtype=np.int64)
+        valid &= (lengths >= 0) & (lengths <= 128)
+        if not valid.all():
+            logger.warning(f"Skipping {int((~valid).sum())} invalid IPv6 prefixes")
+        addresses, lengths = addresses[valid], lengths[valid]
+        v6_levels = _Levels.build(
+            lengths,
+            lambda length, positions: ipv6_key(addresses[positions], length),
+            v6["asn"].to_numpy(dtype=np.uint32)[valid],
+        )
+        return cls(v4_levels, v6_levels, orgs)
+
+    @classmethod
+    def build(cls, pfx2as_paths: Sequence[str], as2org_path: Optional[str] = None) -> "AsnDatabase":
+        prefixes = pd.concat([read_pfx2as(path) for path in pfx2as_paths], ignore_index=True)
+        orgs = read_as2org(as2org_path) if as2org_path else None
+        return cls.from_frames(prefixes, orgs)
+
+    def save(self, path: str = ASN_DB_PATH) -> str:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        arrays = {"org_asns": self._org_asns}
+        arrays.update({f"org_{column}": values for column, values in self._org_columns.items()})
+        for family, levels in (("v4", self.v4), ("v6", self.v6)):
+            arrays.update({
+                f"{family}_lengths": levels.lengths,
+                f"{family}_offsets": levels.offsets,
+                f"{family}_keys": levels.keys,
+                f"{family}_asns": levels.asns,
+            })
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = ASN_DB_PATH) -> "AsnDatabase":
+        with np.load(path, allow_pickle=False) as data:
+            levels = {
+                family: _Levels(
+                    data[f"{family}_lengths"], data[f"{family}_offsets"], data[f"{family}_keys"], data[f"{family}_asns"]
+                )
+                for family in ("v4", "v6")
+            }
+            database = cls.__new__(cls)
+            database.v4, database.v6 = levels["v4"], levels["v6"]
+            database._org_asns = data["org_asns"]
+            database._org_columns = {column: data[f"org_{column}"] for column in ("as_name", "org_name", "country")}
+        return database
+
+    def _match(self, levels: _Levels, addresses: np.ndarray, valid: np.ndarray, key) -> tuple[np.ndarray, np.ndarray]:
+        asns = np.zeros(len(valid), dtype=np.int64)
+        matched_lengths = np.full(len(valid), -1, dtype=np.int64)
+        for length, keys, level_asns in levels.levels():
+            pending = np.nonzero(valid & (matched_lengths < 0))[0]
+            if not len(pending):
+                break
+            wanted = key(addresses[pending], length)
+            slots = np.searchsorted(keys, wanted)
+            slots[slots == len(keys)] = 0
+            hit = keys[slots] == wanted
+            asns[pending[hit]] = level_asns[slots[hit]]
+            matched_lengths[pending[hit]] = length
+        return asns, matched_lengths
+
+    def lookup_asns(self, ips: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Origin ASN (0 if unrouted or invalid) and matched prefix length (-1) per IP."""
+        ips = ips.tolist() if isinstance(ips, pd.Series) else list(ips)
+        v4_positions, v6_positions = split_families(ips)
+        asns = np.zeros(len(ips), dtype=np.int64)
+        lengths = np.full(len(ips), -1, dtype=np.int64)
+
+        if len(v4_positions):
+            networks = ipv4_to_int([ips[position] for position in v4_positions.tolist()])
+            asns[v4_positions], lengths[v4_positions] = self._match(self.v4, networks, networks >= 0, _v4_key)
+
+        if len(v6_positions):
+            addresses, valid = ipv6_to_bytes([ips[position] for position in v6_positions.tolist()])
+            asns[v6_positions], lengths[v6_positions] = self._match(self.v6, addresses, valid, ipv6_key)
+        return asns, lengths
+
+    def lookup_many(self, ips: Iterable[str]) -> dict[str, Optional[AsnRecord]]:
+        """AsnRecord (or None if unrouted) per distinct IP."""
+        ips = list(dict.fromkeys(ips))
+        asns, lengths = self.lookup_asns(ips)
+        slots = np.searchsorted(self._org_asns, asns)
+        slots[slots == len(self._org_asns)] = 0
+        has_org = (self._org_asns[slots] == asns) if len(self._org_asns) else np.zeros(len(asns), dtype=bool)
+
+        results: dict[str, Optional[AsnRecord]] = {}
+        for position, ip in enumerate(ips):
+            length = int(lengths[position])
+            if length < 0:
+                results[ip] = None
+                continue
+            network = ipaddress.ip_network(f"{ip}/{length}", strict=False)
+            record = AsnRecord(asn=int(asns[position]), network=str(network))
+            if has_org[position]:
+                slot = slots[position]
+                record.as_name = str(self._org_columns["as_name"][slot]) or None
+                record.org_name = str(self._org_columns["org_name"][slot]) or None
+                record.country = str(self._org_columns["country"][slot]) or None
+            results[ip] = record
+        return results
+
+    def lookup(self, ip: str) -> Optional[AsnRecord]:
+        return self.lookup_many([ip])[ip]
+
+
+_databases: dict[str, tuple[float, AsnDatabase]] = {}
+
+
+def get_asn_database(path: str = ASN_DB_PATH) -> AsnDatabase:
+    """Shared database for path, reloaded when the file is replaced."""
+    mtime = os.path.getmtime(path)
+    cached = _databases.get(path)
+    if cached is None or cached[0] != mtime:
+        _databases[path] = (mtime, AsnDatabase.load(path))
+        logger.info(f"Loaded ASN database {path} ({len(_databases[path][1])} prefixes)")
+    return _databases[path][1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Import prefix2as and as2org dumps")
+    build.add_argument("--pfx2as", action="append", required=True, help="prefix2as dump (repeat for IPv4 and IPv6)")
+    build.add_argument("--as2org", help="CAIDA as-org2info.txt dump")
+    build.add_argument("--out", default=ASN_DB_PATH)
+    lookup = commands.add_parser("lookup", help="Look up IPs in a built database")
+    lookup.add_argument("ips", nargs="+")
+    lookup.add_argument("--db", default=ASN_DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        database = AsnDatabase.build(args.pfx2as, args.as2org)
+        path = database.save(args.out)
+        print(f"{len(database.v4)} IPv4 and {len(database.v6)} IPv6 prefixes written to {path}")
+    else:
+        for ip, record in AsnDatabase.load(args.db).lookup_many(args.ips).items():
+            print(ip, record)
+
+
+if __name__ == "__main__":
+    main()
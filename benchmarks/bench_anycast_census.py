@@ -0,0 +1,112 @@
+"""Compare the legacy census-to-targets path with the one the service uses.
+
+The legacy path built a /24 dict with iterrows and scanned the hitlist
+line by line. The current path is build_anycast_targets (census filter,
+match_hitlist over a prefix index) followed by an AnycastTargetRepository
+snapshot write and read. Runs on a synthetic census table and FSDB
+hitlist in a temporary directory.
+
+Usage:
+    python -m benchmarks.bench_anycast_census --rows 50000 --hitlist 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from unittest import mock
+
+import pandas as pd
+
+import anycast_ip_collection
+from anycast_ip_collection import build_anycast_targets
+from repositories.anycast_target_repository import AnycastTargetRepository
+
+CENSUS_DATE = "2025/10/08"
+
+
+def build_census(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "prefix": [
+            f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.0/24"
+            for _ in range(rows)
+        ],
+        "number_of_sites": [random.randint(1, 120) for _ in range(rows)],
+    })
+
+
+def write_hitlist(path: str, census: pd.DataFrame, lines: int) -> None:
+    """FSDB hitlist where about half of the lines fall inside a census prefix."""
+    bases = [prefix.rsplit(".", 1)[0] for prefix in census["prefix"]]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("#fsdb -F s address_hex score ip\n")
+        for _ in range(lines):
+            if random.random() < 0.5:
+                ip = f"{random.choice(bases)}.{random.randint(1, 254)}"
+            else:
+                ip = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+            f.write(f"00000000 {random.randint(-2, 99)} {ip}\n")
+
+
+def legacy_targets(census: pd.DataFrame, hitlist_path: str) -> set[str]:
+    """The previous iterrows dict plus line-by-line hitlist scan; returns the matched prefixes."""
+    anycast_dict = {}
+    for _, row in census.iterrows():
+        prefix = row["prefix"]
+        anycast_dict[".".join(prefix.split(".")[:3])] = {"prefix": prefix, "num_sites": row["number_of_sites"]}
+
+    with open(hitlist_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            try:
+                if int(parts[1]) > 0:
+                    base = ".".join(parts[2].split(".")[:3])
+                    if base in anycast_dict:
+                        anycast_dict[base]["ip"] = parts[2]
+            except ValueError:
+                continue
+    return {value["prefix"] for value in anycast_dict.values() if "ip" in value}
+
+
+def current_targets(census: pd.DataFrame, hitlist_path: str, repo: AnycastTargetRepository) -> pd.DataFrame:
+    """build_anycast_targets on the synthetic census, stored and read back as a snapshot."""
+    with mock.patch.object(anycast_ip_collection, "get_anycast_list", return_value=census):
+        targets = build_anycast_targets(CENSUS_DATE, 0, fsdb_path=hitlist_path)
+    repo.write_snapshot(CENSUS_DATE, 0, targets)
+    return repo.read_snapshot(CENSUS_DATE, 0)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000, help="census prefixes")
+    parser.add_argument("--hitlist", type=int, default=1_000_000, help="hitlist lines")
+    args = parser.parse_args()
+
+    random.seed(42)
+    census = build_census(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        hitlist_path = os.path.join(tmp, "hitlist.fsdb")
+        write_hitlist(hitlist_path, census, args.hitlist)
+        repo = AnycastTargetRepository(base_dir=os.path.join(tmp, "targets"))
+
+        legacy_time, legacy = timed(lambda: legacy_targets(census, hitlist_path))
+        current_time, current = timed(lambda: current_targets(census, hitlist_path, repo))
+
+    assert legacy == set(current["prefix"])
+
+    print(f"census rows: {len(census)}, hitlist lines: {args.hitlist}, targets: {len(current)}")
+    print(f"legacy:  {legacy_time * 1000:9.1f} ms")
+    print(f"current: {current_time * 1000:9.1f} ms  ({legacy_time / current_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare ORM executemany and binary COPY ingestion into the measurements table.
+
+Needs a reachable database configured through the usual DB_* variables.
+Rows are written with negative measurement IDs and deleted afterwards.
+Both paths include the target_latency_stats refresh that ingestion runs
+for the targets it touched.
+
+Usage:
+    python -m benchmarks.bench_measurement_ingest --rows 200000 --per-measurement 500
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import delete
+
+from db.db import AsyncSessionLocal, close_db_connection
+from models.measurement import PingResult, PingResultDB
+from repositories.measurement_repository import MeasurementRepository
+
+
+def build_results(rows: int, per_measurement: int) -> list[PingResult]:
+    """Build synthetic ping results spread over several fake measurements."""
+    now = int(time.time())
+    results = []
+    for index in range(rows):
+        rtts = [round(random.uniform(1, 300), 3) for _ in range(3)]
+        results.append(
+            PingResult(
+                measurement_id=-(index // per_measurement + 1),
+                probe_id=index % per_measurement + 1,
+                target=f"10.{index % 256}.{(index // 256) % 256}.1",
+                source_address="192.0.2.1",
+                timestamp=now + index,
+                sent=3,
+                received=3,
+                loss_percentage=0.0,
+                continent_code="AF",
+                min_rtt=min(rtts),
+                avg_rtt=sum(rtts) / 3,
+                max_rtt=max(rtts),
+                rtt1=rtts[0],
+                rtt2=rtts[1],
+                rtt3=rtts[2],
+            )
+        )
+    return results
+
+
+async def cleanup(session) -> None:
+    await session.execute(delete(PingResultDB).where(PingResultDB.measurement_id < 0))
+    await session.commit()
+
+
+async def run_orm(results: list[PingResult], per_measurement: int) -> float:
+    async with AsyncSessionLocal() as session:
+        repo = MeasurementRepository(session=session)
+        start = time.perf_counter()
+        # Same shape as the old path: one insert + commit per measurement
+        for offset in range(0, len(results), per_measurement):
+            await repo.write_ping_results_to_db(results[offset:offset + per_measurement])
+        elapsed = time.perf_counter() - start
+        await cleanup(session)
+    return elapsed
+
+
+async def run_copy(results: list[PingResult], batch_rows: int) -> float:
+    async with AsyncSessionLocal() as session:
+        repo = MeasurementRepository(session=session)
+        start = time.perf_counter()
+        for offset in range(0, len(results), batch_rows):
+            await repo.copy_ping_results_to_db(results[offset:offset + batch_rows])
+        elapsed = time.perf_counter() - start
+        await cleanup(session)
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--per-measurement", type=int, default=500)
+    parser.add_argument("--copy-batch-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    results = build_results(args.rows, args.per_measurement)
+    try:
+        orm_seconds = await run_orm(results, args.per_measurement)
+        copy_seconds = await run_copy(results, args.copy_batch_rows)
+    finally:
+        await close_db_connection()
+
+    print(f"rows={args.rows} per_measurement={args.per_measurement}")
+    print(f"ORM executemany: {orm_seconds:8.2f}s  {args.rows / orm_seconds:12,.0f} rows/s")
+    print(f"binary COPY:     {copy_seconds:8.2f}s  {args.rows / copy_seconds:12,.0f} rows/s")
+    print(f"speedup:         {orm_seconds / copy_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Compare dict bucketing and the columnar engine for probe selection.
+
+Runs on synthetic probes, no network or database needed. The per-call
+comparison goes through ProbeService.filter_max_two_probes_per_country_asn,
+the entry point measurement creation uses, so table build costs count.
+
+Usage:
+    python -m benchmarks.bench_probe_selection --probes 12000 --repeat 20
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from models.probe import Probe
+from services.probe_registry import get_probe_registry
+from services.probe_selection import ProbeSelector, probes_frame
+from services.probe_service import ProbeService
+
+COUNTRIES = [f"{chr(65 + a)}{chr(65 + b)}" for a in range(26) for b in range(8)]
+
+
+def build_probes(count: int) -> list[dict]:
+    """Build CSV-like, string-typed probe dicts."""
+    now = int(time.time())
+    return [
+        {
+            "id": str(probe_id),
+            "country_code": random.choice(COUNTRIES) if random.random() > 0.01 else "",
+            "asn_v4": str(random.randint(1, count // 3)),
+            "latitude": str(random.uniform(-60, 70)),
+            "longitude": str(random.uniform(-180, 180)),
+            "last_connected": str(now - random.randint(0, 86400)),
+            "total_uptime": str(random.randint(0, 10**8)),
+            "is_anchor": str(random.random() < 0.05),
+        }
+        for probe_id in range(1, count + 1)
+    ]
+
+
+def legacy_one_per_country_asn(probes: list[dict]) -> list[dict]:
+    """The previous bucket-and-sort implementation."""
+    def as_int(v, default=0):
+        try:
+            return int(v)
+        except Exception:
+            return default
+
+    buckets = defaultdict(list)
+    for p in probes:
+        cc = p.get("country_code")
+        asn = p.get("asn_v4")
+        if not cc or asn is None:
+            continue
+        asn_i = as_int(asn, -1)
+        if asn_i == -1:
+            continue
+        buckets[(cc, asn_i)].append(p)
+
+    selected = []
+    for items in buckets.values():
+        items_sorted = sorted(
+            items,
+            key=lambda x: (
+                -as_int(x.get("last_connected"), 0),
+                -as_int(x.get("total_uptime"), 0),
+                as_int(x.get("id"), 10**18),
+            ),
+        )
+        selected.extend(items_sorted[:1])
+    return selected
+
+
+def timed(func, repeat: int) -> tuple[float, object]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--probes", type=int, default=12_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(42)
+    probes = build_probes(args.probes)
+
+    build_time, frame = timed(lambda: probes_frame(probes), 1)
+    selector = ProbeSelector(frame)
+
+    # The production input: registry probes rendered as dicts
+    registry = get_probe_registry()
+    registry._set_probes([Probe.from_dict(probe) for probe in probes])
+    registry_probes = registry.all_as_dicts()
+    registry.as_frame()  # built once per catalog load, like in the API
+    service = ProbeService()
+
+    legacy_time, legacy = timed(lambda: legacy_one_per_country_asn(registry_probes), args.repeat)
+    service_time, selected_probes = timed(lambda: service.filter_max_two_probes_per_country_asn(registry_probes), args.repeat)
+    rebuild_time, rebuilt = timed(lambda: ProbeSelector(registry_probes).select(("k_per_country_asn", {"k": 1})), args.repeat)
+    columnar_time, selected = timed(lambda: selector.select(("k_per_country_asn", {"k": 1})), args.repeat)
+    expected = sorted(int(p["id"]) for p in legacy)
+    assert expected == sorted(int(p["id"]) for p in selected_probes) == sorted(rebuilt.tolist())
+
+    print(f"probes: {args.probes}, table build: {build_time * 1000:.1f} ms (once per catalog load)")
+    print(f"{'one per (country, asn), per call':48} {'ms/run':>8} {'selected':>9}")
+    print(f"{'legacy dict buckets':48} {legacy_time * 1000:8.2f} {len(legacy):9}")
+    print(f"{'ProbeService entry point':48} {service_time * 1000:8.2f} {len(selected_probes):9}")
+    print(f"{'ProbeSelector(probes), table built per call':48} {rebuild_time * 1000:8.2f} {len(rebuilt):9}")
+    print()
+    print(f"{'policy chain on a prebuilt table':48} {'ms/run':>8} {'selected':>9}")
+    print(f"{'k_per_country_asn k=1':48} {columnar_time * 1000:8.2f} {len(selected):9}")
+
+    chains = {
+        "k_per_asn k=2": [("k_per_asn", {"k": 2})],
+        "grid_spread 2deg": [("grid_spread", {"cell_degrees": 2.0})],
+        "country_cap 5": [("country_cap", {"max_per_country": 5})],
+        "k_per_asn k=1 -> grid_spread 1deg -> country_cap 3": [
+            ("k_per_asn", {"k": 1}),
+            ("grid_spread", {"cell_degrees": 1.0}),
+            ("country_cap", {"max_per_country": 3}),
+        ],
+    }
+    for label, chain in chains.items():
+        elapsed, selected = timed(lambda: selector.select(chain), args.repeat)
+        print(f"{label:48} {elapsed * 1000:8.2f} {len(selected):9}")
+
+
+if __name__ == "__main__":
+    main()
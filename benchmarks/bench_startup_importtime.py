@@ -0,0 +1,94 @@
+"""Measure API cold-start import time with `python -X importtime`.
+
+Imports the app module in fresh interpreters, reports the median total
+import time and where it goes per top-level package, and checks that the
+heavy analysis libraries stay out of startup (they are imported lazily by
+the handlers that need them). Pass --output to rewrite the tracked report
+in benchmarks/results/.
+
+Usage:
+    python -m benchmarks.bench_startup_importtime --repeat 5 --output benchmarks/results/startup_importtime.md
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("pandas", "numpy", "matplotlib", "maxminddb")
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_once(module: str) -> dict[str, tuple[int, int, int]]:
+    """(self us, cumulative us, nesting depth) per module imported by a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            timings[match.group(4)] = (int(match.group(1)), int(match.group(2)), len(match.group(3)))
+    return timings
+
+
+def by_package(timings: dict[str, tuple[int, int, int]]) -> dict[str, int]:
+    """Self time summed per top-level package, in microseconds."""
+    totals = defaultdict(int)
+    for name, (self_us, _, _) in timings.items():
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def report(module: str, runs: list[dict[str, tuple[int, int, int]]], top: int) -> str:
+    totals = [run[module][1] for run in runs]
+    packages = defaultdict(list)
+    for run in runs:
+        for package, self_us in by_package(run).items():
+            packages[package].append(self_us)
+    ranked = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    loaded = [name for name in LAZY_MODULES if any(name in run for run in runs)]
+
+    lines = [
+        f"# Startup import time: `import {module}`",
+        "",
+        f"Python {sys.version.split()[0]}, {len(runs)} fresh interpreters, median of `-X importtime` cumulative time.",
+        "",
+        f"Total: {statistics.median(totals) / 1000:.0f} ms (min {min(totals) / 1000:.0f} ms, max {max(totals) / 1000:.0f} ms)",
+        "",
+        f"Lazily imported, must not load at startup: {', '.join(LAZY_MODULES)} -> "
+        + (f"LOADED: {', '.join(loaded)}" if loaded else "none loaded"),
+        "",
+        "| package | self time (ms) |",
+        "|---|---:|",
+    ]
+    lines += [f"| {package} | {statistics.median(values) / 1000:.1f} |" for package, values in ranked[:top]]
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="api", help="Module to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters to run")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    import_once(args.module)  # warm the bytecode and filesystem caches
+    runs = [import_once(args.module) for _ in range(args.repeat)]
+    text = report(args.module, runs, args.top)
+    print(text, end="")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    if any(name in run for run in runs for name in LAZY_MODULES):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Count upstream enrichment calls under concurrent /upload load, with and without coalescing.
+
+Posts synthetic traceroute files with overlapping hop IPs to the /upload
+route in-process. ipinfo and GeoLite are replaced by a fake upstream with
+fixed latency, so no network or credentials are needed. Every run starts
+with empty caches.
+
+Usage:
+    python -m benchmarks.bench_upload_coalescing --uploads 20 --hops 30 --pool 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("IP_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "ip_cache.sqlite"))
+os.environ.setdefault("IP_INFO_BASE_URL", "https://ipinfo.invalid")
+os.environ.setdefault("IP_INFO_TOKEN", "benchmark")
+os.environ.setdefault("GEO_LITE_BASE_URL", "https://geolite.invalid")
+os.environ.setdefault("GEO_LITE_ACCOUNT_ID", "benchmark")
+os.environ.setdefault("GEO_LITE_LICENSE_KEY", "benchmark")
+os.environ["GEO_LITE_BACKEND"] = "web"
+
+import httpx
+
+import api
+import ip_lookup_cache
+from geo_lite_client import GeoLiteClient
+from ip_info_client import IpinfoClient
+from ip_lookup_cache import CachedGeoLiteClient, CachedIpinfoClient
+from services import enrichment_service
+from services.enrichment_service import GeoLiteSource, IpinfoSource
+
+
+class FakeUpstream:
+    """Answers ipinfo and GeoLite requests after `latency` seconds and counts them."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency)
+        path = request.url.path
+        if path == "/batch":
+            self.calls["ipinfo_batch"] += 1
+            return httpx.Response(200, json={key: {"ip": key.split("/")[-1], "country": "NL"} for key in json.loads(request.content)})
+        if path.startswith("/lite/"):
+            self.calls["ipinfo"] += 1
+            return httpx.Response(200, json={"ip": path.split("/")[-1], "country": "NL"})
+        self.calls["geolite"] += 1
+        return httpx.Response(200, json={"country": {"iso_code": "NL"}, "traits": {"ip_address": path.split("/")[-1], "autonomous_system_number": 1136}})
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url=base_url, transport=httpx.MockTransport(self.handle))
+
+
+def build_upload(hops: int, pool: list[str]) -> bytes:
+    """One traceroute measurement per line, hop addresses drawn from a shared pool."""
+    lines = []
+    for probe_id in range(5):
+        result = [{"hop": hop, "result": [{"from": random.choice(pool), "rtt": 1.0}]} for hop in range(1, hops + 1)]
+        lines.append(json.dumps({"src_addr": "192.0.2.1", "dst_addr": "198.51.100.1", "prb_id": probe_id, "result": result}))
+    return "\n".join(lines).encode()
+
+
+def reset_caches(coalesce: bool) -> None:
+    ip_lookup_cache.COALESCE_LOOKUPS = coalesce
+    ip_lookup_cache._memory.clear()
+    ip_lookup_cache._metrics.clear()
+    ip_lookup_cache._inflight.clear()
+    ip_lookup_cache.get_persistent_cache()._conn.execute("DELETE FROM ip_cache")
+    ip_lookup_cache.get_persistent_cache()._conn.commit()
+
+
+async def run(uploads: list[bytes], upstream: FakeUpstream) -> float:
+    def cached_ipinfo():
+        client = IpinfoClient()
+        client._client = upstream.client("https://ipinfo.invalid")
+        return CachedIpinfoClient(client=client)
+
+    def cached_geolite():
+        client = GeoLiteClient()
+        client._client = upstream.client("https://geolite.invalid")
+        return CachedGeoLiteClient(client=client)
+
+    # /upload also returns the per-source answers through these clients
+    api.CachedIpinfoClient = cached_ipinfo
+    api.CachedGeoLiteClient = cached_geolite
+    # GeoLite answers without a continent, so every IP also goes on to ipinfo
+    enrichment_service.create_sources = lambda names=None: [
+        GeoLiteSource(client_factory=cached_geolite),
+        IpinfoSource(client_factory=cached_ipinfo),
+    ]
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/upload", files={"file": (f"upload{n}.json", body)}) for n, body in enumerate(uploads)
+        ))
+        elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=20, help="Concurrent /upload requests")
+    parser.add_argument("--hops", type=int, default=30, help="Hops per traceroute (5 traceroutes per upload)")
+    parser.add_argument("--pool", type=int, default=200, help="Distinct public hop IPs shared by all uploads")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake upstream latency in seconds")
+    args = parser.parse_args()
+
+    random.seed(42)
+    pool = [f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}" for _ in range(args.pool)]
+    pool = [ip for ip in pool if not ip_lookup_cache.is_bogon(ip)]
+    uploads = [build_upload(args.hops, pool) for _ in range(args.uploads)]
+    distinct = len({hop["result"][0]["from"] for body in uploads for line in body.splitlines() for hop in json.loads(line)["result"]})
+    print(f"uploads: {args.uploads}, distinct hop IPs: {distinct}")
+
+    for label, coalesce in (("independent", False), ("coalesced", True)):
+        reset_caches(coalesce)
+        upstream = FakeUpstream(args.latency)
+        elapsed = asyncio.run(run(uploads, upstream))
+        coalesced = sum(metrics.coalesced for metrics in ip_lookup_cache._metrics.values())
+        calls = ", ".join(f"{name}={count}" for name, count in sorted(upstream.calls.items()))
+        print(f"{label:12} upstream calls: {sum(upstream.calls.values()):5} ({calls}), coalesced: {coalesced:5}, {elapsed * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
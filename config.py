@@ -0,0 +1,16 @@
+"""Process environment loading shared by the API, Alembic and scripts."""
+from dotenv import load_dotenv
+
+_loaded = False
+
+
+def load_environment() -> None:
+    """Load .env into os.environ once per process; variables already set are kept.
+
+    Call it before importing modules that read settings at import time
+    (db.db, ripe_atlas_client, ...).
+    """
+    global _loaded
+    if not _loaded:
+        load_dotenv()
+        _loaded = True
@@ -1,13 +1,18 @@
 # db/db.py
 import os
+import time
 from typing import AsyncGenerator
 
-from dotenv import load_dotenv
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy import text
 
+from config import load_environment
+from metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_CHECKOUT_TIMEOUTS, DB_POOL_CONNECTIONS
+
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Database configuration
 DATABASE_USER = os.getenv("DB_USER", "postgres")
@@ -19,9 +24,25 @@ DATABASE_NAME = os.getenv("DB_NAME", "ripe_geolocation")
 # Construct the DATABASE_URL
 DATABASE_URL = f"postgresql+asyncpg://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
 
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
 # Create async engine with connection pooling
 engine = create_async_engine(
     DATABASE_URL,
+    poolclass=TimedAsyncQueuePool,
     echo=os.getenv("SQL_ECHO", "False").lower() == "true",  # SQL query logging
     pool_size=20,  # Number of connections to keep in the pool
     max_overflow=10,  # Maximum overflow connections
@@ -29,6 +50,12 @@ engine = create_async_engine(
     pool_recycle=3600,  # Recycle connections after 1 hour
 )
 
+# Pool state is read when /metrics is scraped; callback gauges don't work in multiprocess mode
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    DB_POOL_CONNECTIONS.labels("checked_out").set_function(lambda: engine.pool.checkedout())
+    DB_POOL_CONNECTIONS.labels("idle").set_function(lambda: engine.pool.checkedin())
+    DB_POOL_CONNECTIONS.labels("overflow").set_function(lambda: max(engine.pool.overflow(), 0))
+
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
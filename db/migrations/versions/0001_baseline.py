@@ -0,0 +1,124 @@
+"""Baseline schema: ip_info and measurements with the natural key.
+
+Safe to run on a database created from the old sql/geolite_setup.sql:
+existing tables are kept, the columns that schema lacks are added,
+duplicate rows are removed and the unique keys are added if missing.
+
+Rows from the old schema carry no continent, so they are backfilled
+with continent_code 'XX' (unknown) and end up in the default partition
+after 0002. Rows without a measurement_id or probe_id cannot be keyed
+and are dropped.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# continent_code backfilled into rows that predate the column
+UNKNOWN_CONTINENT = "XX"
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS ip_info (
+            id SERIAL PRIMARY KEY,
+            ip_address INET NOT NULL,
+            asn TEXT,
+            as_name TEXT,
+            as_domain TEXT,
+            as_org TEXT,
+            country_code CHAR(2),
+            country TEXT,
+            continent TEXT,
+            continent_code CHAR(2)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_ip_info_ip ON ip_info USING gist (ip_address inet_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_ip_info_asn ON ip_info (asn)")
+
+    # One row per IP so joins on ip_address never fan out
+    op.execute("""
+        DELETE FROM ip_info AS i
+        USING ip_info AS d
+        WHERE i.ip_address = d.ip_address
+          AND i.id > d.id
+    """)
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_ip_info_ip_address ON ip_info (ip_address)")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS measurements (
+            id                BIGSERIAL PRIMARY KEY,
+            serial_no         INTEGER,
+            measurement_id    BIGINT NOT NULL,
+            probe_id          INTEGER NOT NULL,
+            dst_addr          INET,
+            src_addr          INET,
+            timestamp_unix    BIGINT,
+            timestamp_iso     TIMESTAMPTZ,
+            sent              INTEGER,
+            rcvd              INTEGER,
+            loss_pct          REAL,
+            min_ms            REAL,
+            avg_ms            REAL,
+            max_ms            REAL,
+            rtt1              REAL,
+            rtt2              REAL,
+            rtt3              REAL,
+            continent_code    VARCHAR(10) NOT NULL,
+            continent_id      INTEGER
+        )
+    """)
+
+    # Bring a measurements table from sql/geolite_setup.sql up to this schema
+    op.execute("ALTER TABLE measurements ADD COLUMN IF NOT EXISTS serial_no INTEGER")
+    op.execute(f"""
+        ALTER TABLE measurements
+            ADD COLUMN IF NOT EXISTS continent_code VARCHAR(10) NOT NULL DEFAULT '{UNKNOWN_CONTINENT}'
+    """)
+    op.execute("ALTER TABLE measurements ALTER COLUMN continent_code DROP DEFAULT")
+    op.execute("ALTER TABLE measurements ADD COLUMN IF NOT EXISTS continent_id INTEGER")
+    op.execute("DELETE FROM measurements WHERE measurement_id IS NULL OR probe_id IS NULL")
+    op.execute("ALTER TABLE measurements ALTER COLUMN measurement_id SET NOT NULL")
+    op.execute("ALTER TABLE measurements ALTER COLUMN probe_id SET NOT NULL")
+
+    # Keep the first stored copy of every ping result, then add the natural key
+    op.execute("""
+        DELETE FROM measurements AS m
+        USING measurements AS d
+        WHERE m.measurement_id = d.measurement_id
+          AND m.probe_id = d.probe_id
+          AND m.timestamp_unix IS NOT DISTINCT FROM d.timestamp_unix
+          AND m.id > d.id
+    """)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint WHERE conname = 'uq_measurements_natural_key'
+            ) THEN
+                ALTER TABLE measurements
+                    ADD CONSTRAINT uq_measurements_natural_key
+                    UNIQUE (measurement_id, probe_id, timestamp_unix);
+            END IF;
+        END
+        $$
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_measurements_probe_id ON measurements (probe_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_measurements_dst_addr ON measurements (dst_addr)")
+
+
+def downgrade() -> None:
+    # Data tables are left in place; only the keys added here are removed
+    op.execute("ALTER TABLE measurements DROP CONSTRAINT IF EXISTS uq_measurements_natural_key")
+    op.execute("DROP INDEX IF EXISTS uq_ip_info_ip_address")
@@ -0,0 +1,118 @@
+"""Partition measurements by continent and add covering indexes.
+
+Every repository query filters on one continent, so LIST partitions on
+continent_code let the planner prune all other continents. Indexes:
+- the natural key leads with measurement_id and serves the
+  measurement_id lookups and per-measurement counts;
+- idx_measurements_probe_id serves the probe-level joins;
+- idx_measurements_dst_addr_rcvd is a partial covering index for the
+  per-target latency statistics (rcvd > 0, grouped by dst_addr on avg_ms).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONTINENT_PARTITIONS = ("AF", "SA", "NA", "AS")
+
+COLUMNS = """
+    id, serial_no, measurement_id, probe_id, dst_addr, src_addr,
+    timestamp_unix, timestamp_iso, sent, rcvd, loss_pct,
+    min_ms, avg_ms, max_ms, rtt1, rtt2, rtt3,
+    continent_code, continent_id
+"""
+
+COLUMN_DEFINITIONS = """
+    id                BIGINT NOT NULL DEFAULT nextval('measurements_id_seq'),
+    serial_no         INTEGER,
+    measurement_id    BIGINT NOT NULL,
+    probe_id          INTEGER NOT NULL,
+    dst_addr          INET,
+    src_addr          INET,
+    timestamp_unix    BIGINT,
+    timestamp_iso     TIMESTAMPTZ,
+    sent              INTEGER,
+    rcvd              INTEGER,
+    loss_pct          REAL,
+    min_ms            REAL,
+    avg_ms            REAL,
+    max_ms            REAL,
+    rtt1              REAL,
+    rtt2              REAL,
+    rtt3              REAL,
+    continent_code    VARCHAR(10) NOT NULL,
+    continent_id      INTEGER
+"""
+
+
+def _move_old_table_aside() -> None:
+    op.execute("ALTER TABLE measurements RENAME TO measurements_old")
+    op.execute("ALTER TABLE measurements_old DROP CONSTRAINT IF EXISTS uq_measurements_natural_key")
+    op.execute("ALTER TABLE measurements_old DROP CONSTRAINT IF EXISTS measurements_pkey")
+    op.execute("DROP INDEX IF EXISTS idx_measurements_measurement_id")
+    op.execute("DROP INDEX IF EXISTS idx_measurements_probe_id")
+    op.execute("DROP INDEX IF EXISTS idx_measurements_dst_addr")
+    op.execute("DROP INDEX IF EXISTS idx_measurements_dst_addr_rcvd")
+
+
+def _copy_and_drop_old_table() -> None:
+    op.execute(f"INSERT INTO measurements ({COLUMNS}) SELECT {COLUMNS} FROM measurements_old")
+    op.execute("ALTER SEQUENCE measurements_id_seq OWNED BY measurements.id")
+    op.execute("DROP TABLE measurements_old")
+    op.execute("ANALYZE measurements")
+
+
+def upgrade() -> None:
+    _move_old_table_aside()
+
+    op.execute(f"""
+        CREATE TABLE measurements (
+            {COLUMN_DEFINITIONS},
+            CONSTRAINT measurements_pkey PRIMARY KEY (id, continent_code),
+            CONSTRAINT uq_measurements_natural_key
+                UNIQUE (measurement_id, probe_id, timestamp_unix, continent_code)
+        ) PARTITION BY LIST (continent_code)
+    """)
+    for continent_code in CONTINENT_PARTITIONS:
+        op.execute(f"""
+            CREATE TABLE measurements_{continent_code.lower()}
+            PARTITION OF measurements FOR VALUES IN ('{continent_code}')
+        """)
+    op.execute("CREATE TABLE measurements_default PARTITION OF measurements DEFAULT")
+
+    op.execute("CREATE INDEX idx_measurements_probe_id ON measurements (probe_id)")
+    op.execute("""
+        CREATE INDEX idx_measurements_dst_addr_rcvd
+        ON measurements (dst_addr) INCLUDE (probe_id, avg_ms)
+        WHERE rcvd > 0
+    """)
+
+    _copy_and_drop_old_table()
+
+
+def downgrade() -> None:
+    _move_old_table_aside()
+
+    op.execute(f"""
+        CREATE TABLE measurements (
+            {COLUMN_DEFINITIONS},
+            CONSTRAINT measurements_pkey PRIMARY KEY (id),
+            CONSTRAINT uq_measurements_natural_key
+                UNIQUE (measurement_id, probe_id, timestamp_unix)
+        )
+    """)
+    op.execute("CREATE INDEX idx_measurements_probe_id ON measurements (probe_id)")
+    op.execute("CREATE INDEX idx_measurements_dst_addr ON measurements (dst_addr)")
+
+    _copy_and_drop_old_table()
@@ -0,0 +1,44 @@
+"""Per-target latency statistics table.
+
+Holds the aggregates served by /measurements/get_measurments_for_target_analysis.
+MeasurementRepository.refresh_target_stats keeps it current: ingestion
+recomputes only the targets it touched.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE target_latency_stats (
+            dst_addr          INET PRIMARY KEY,
+            n_samples         BIGINT NOT NULL,
+            min_rtt_ms        DOUBLE PRECISION,
+            max_rtt_ms        DOUBLE PRECISION,
+            mean_rtt_ms       DOUBLE PRECISION,
+            stddev_rtt_ms     DOUBLE PRECISION,
+            p5_rtt_ms         DOUBLE PRECISION,
+            p50_rtt_ms        DOUBLE PRECISION,
+            p75_rtt_ms        DOUBLE PRECISION,
+            p95_rtt_ms        DOUBLE PRECISION,
+            ipr_95_5_ms       DOUBLE PRECISION,
+            refreshed_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS target_latency_stats")
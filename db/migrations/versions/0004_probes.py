@@ -0,0 +1,42 @@
+"""Probes table backing ProbeRepository.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS probes (
+            id            INTEGER PRIMARY KEY,
+            country_code  VARCHAR(2),
+            asn_v4        BIGINT,
+            asn_v6        BIGINT,
+            status        INTEGER,
+            latitude      DOUBLE PRECISION,
+            longitude     DOUBLE PRECISION,
+            address_v4    INET,
+            address_v6    INET,
+            prefix_v4     CIDR,
+            prefix_v6     CIDR,
+            is_anchor     BOOLEAN NOT NULL DEFAULT FALSE,
+            is_public     BOOLEAN NOT NULL DEFAULT TRUE
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_probes_country_code ON probes (country_code)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS probes")
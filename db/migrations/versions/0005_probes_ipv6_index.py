@@ -0,0 +1,35 @@
+"""Index IPv6-capable probes for IPv6 probe selection.
+
+INET columns (measurements.dst_addr/src_addr, ip_info.ip_address,
+target_latency_stats.dst_addr) already store both address families and
+their btree/GiST indexes serve IPv6 lookups unchanged. Probe selection
+for IPv6 campaigns filters on address_v6 and groups by (country_code,
+asn_v6), which gets a partial index here.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_probes_v6_country_asn
+        ON probes (country_code, asn_v6)
+        WHERE address_v6 IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_probes_v6_country_asn")
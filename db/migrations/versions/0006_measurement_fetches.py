@@ -0,0 +1,37 @@
+"""Measurements whose results were fetched after they finished.
+
+The measurement tracker re-fetches finished measurements that have fewer
+stored rows than participants, since they may have been fetched while
+still running. Probes that never report keep the count short for good,
+so a fetch after the final status is recorded here and ends re-fetching.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE measurement_fetches (
+            measurement_id    BIGINT NOT NULL,
+            continent_code    VARCHAR(10) NOT NULL,
+            final_fetched_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (measurement_id, continent_code)
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS measurement_fetches")
@@ -0,0 +1,31 @@
+"""Make measurements.timestamp_unix NOT NULL.
+
+timestamp_unix is part of uq_measurements_natural_key, and NULLs never
+conflict in a unique constraint, so re-ingesting a result without a
+timestamp stored it again. Such rows cannot be told apart and are
+deleted; ingestion drops them from now on.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DELETE FROM measurements WHERE timestamp_unix IS NULL")
+    op.execute("ALTER TABLE measurements ALTER COLUMN timestamp_unix SET NOT NULL")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE measurements ALTER COLUMN timestamp_unix DROP NOT NULL")
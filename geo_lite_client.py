@@ -1,6 +1,14 @@
+import asyncio
+import ipaddress
+import logging
 import os
+import time
 import httpx
 
+from metrics import InstrumentedTransport
+
+logger = logging.getLogger("ripe_atlas")
+
 GEO_LITE_BASE_URL = os.getenv("GEO_LITE_BASE_URL")
 GEO_LITE_ACCOUNT_ID = os.getenv("GEO_LITE_ACCOUNT_ID")
 GEO_LITE_LICENSE_KEY = os.getenv("GEO_LITE_LICENSE_KEY") ## put this in env for security
@@ -22,18 +30,34 @@ class GeoLiteClient:
             auth=(account_id, license_key),
             headers={"Accept": "application/json"},
             timeout=timeout,
+            transport=InstrumentedTransport("geolite", base_url),
             #http2=True,
         )
 
+    async def lookup_city(self, ip: str):
+        """GeoLiteResult for ip, or None when MaxMind has no data for it; other failures raise."""
+        r = await self._client.get(f"/geoip/v2.1/city/{ip}?pretty")
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return GeoLiteResult.from_response(r.json())
+
     async def city(self, ip: str):
         try:
-            r = await self._client.get(f"/geoip/v2.1/city/{ip}?pretty")
-            r.raise_for_status()
-            data = r.json()
-            return GeoLiteResult.from_response(data)
+            return await self.lookup_city(ip)
         except httpx.HTTPError as e:
-            print(f"Error fetching city data for {ip}: {e}")
-            return None         
+            logger.warning(f"Error fetching city data for {ip}: {e}")
+            return None
+
+    async def city_many(self, ips, concurrency: int = 16):
+        """Look up many IPs with at most `concurrency` requests in flight; returns {ip: GeoLiteResult or None}."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def city_one(ip):
+            async with semaphore:
+                return ip, await self.city(ip)
+
+        return dict(await asyncio.gather(*(city_one(ip) for ip in dict.fromkeys(ips))))
 
     async def aclose(self): await self._client.aclose()
     async def __aenter__(self): return self
@@ -80,3 +104,142 @@ class GeoLiteResult:
             time_zone=data.get("location", {}).get("time_zone"),
             accuracy_radius_km=data.get("location", {}).get("accuracy_radius"),
         )
+
+
+GEO_LITE_BACKEND = os.getenv("GEO_LITE_BACKEND", "web")  # "web" or "mmdb"
+GEO_LITE_CITY_MMDB = os.getenv("GEO_LITE_CITY_MMDB", "data/geolite/GeoLite2-City.mmdb")
+GEO_LITE_ASN_MMDB = os.getenv("GEO_LITE_ASN_MMDB", "data/geolite/GeoLite2-ASN.mmdb")
+
+
+class _MMDBFile:
+    """A memory-mapped .mmdb file that is reopened when the file changes on disk."""
+
+    def __init__(self, path: str, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self._reader = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._open()
+
+    def _open(self) -> None:
+        import maxminddb  # optional dependency, only needed for the mmdb backend
+
+        stat = os.stat(self.path)
+        reader = maxminddb.open_database(self.path, maxminddb.MODE_MMAP)
+        old_reader, self._reader = self._reader, reader
+        self._stat = (stat.st_mtime_ns, stat.st_size)
+        if old_reader is not None:
+            old_reader.close()
+            logger.info(f"Reloaded {self.path}")
+
+    def get(self, ip: str):
+        """(record, prefix_len) for ip; record is None when the IP is not in the DB."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                if (stat.st_mtime_ns, stat.st_size) != self._stat:
+                    self._open()
+            except OSError as e:
+                logger.warning(f"Keeping loaded {self.path}, reload failed: {e}")
+        return self._reader.get_with_prefix_len(ip)
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+class GeoLiteMMDBClient:
+    """
+    Local GeoLite2 lookups from memory-mapped City (and optional ASN) .mmdb files.
+    Same interface and GeoLiteResult as GeoLiteClient, without network calls.
+    The files are reopened when they are replaced on disk.
+    """
+    local = True  # answers come from memory; callers should not cache them
+
+    def __init__(self, city_path: str = GEO_LITE_CITY_MMDB, asn_path: str = GEO_LITE_ASN_MMDB,
+                 check_interval: float = 30.0):
+        self._city = _MMDBFile(city_path, check_interval)
+        self._asn = _MMDBFile(asn_path, check_interval) if asn_path and os.path.exists(asn_path) else None
+
+    def lookup(self, ip: str):
+        """Synchronous lookup; returns GeoLiteResult or None."""
+        try:
+            city, city_prefix_len = self._city.get(ip)
+            asn, asn_prefix_len = self._asn.get(ip) if self._asn else (None, None)
+        except ValueError as e:
+            logger.warning(f"Invalid IP for GeoLite lookup {ip}: {e}")
+            return None
+        if city is None and asn is None:
+            return None
+
+        data = dict(city or {})
+        network = None
+        prefix_len = city_prefix_len if city is not None else asn_prefix_len
+        if prefix_len is not None:
+            network = str(ipaddress.ip_network(f"{ip}/{prefix_len}", strict=False))
+        data["traits"] = {
+            "ip_address": ip,
+            "network": network,
+            "autonomous_system_number": (asn or {}).get("autonomous_system_number"),
+            "autonomous_system_organization": (asn or {}).get("autonomous_system_organization"),
+        }
+        return GeoLiteResult.from_response(data)
+
+    async def city(self, ip: str):
+        return self.lookup(ip)
+
+    async def city_many(self, ips, concurrency: int = 16):
+        """Look up many IPs; returns {ip: GeoLiteResult or None}. Local lookups don't need concurrency."""
+        return {ip: self.lookup(ip) for ip in dict.fromkeys(ips)}
+
+    async def aclose(self):
+        self._city.close()
+        if self._asn:
+            self._asn.close()
+    async def __aenter__(self): return self
+    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
+
+
+_mmdb_client = None
+
+
+def create_geolite_client(backend: Optional[str] = None):
+    """GeoLite client for the configured backend (GEO_LITE_BACKEND=web|mmdb).
+
+    The mmdb client is shared by the process, so closing it per request
+    would unmap the files; it is returned wrapped so aclose() is a no-op.
+    """
+    global _mmdb_client
+    backend = (backend or os.getenv("GEO_LITE_BACKEND") or GEO_LITE_BACKEND).lower()
+    if backend == "web":
+        return GeoLiteClient()
+    if backend == "mmdb":
+        if _mmdb_client is None:
+            _mmdb_client = GeoLiteMMDBClient(
+                os.getenv("GEO_LITE_CITY_MMDB") or GEO_LITE_CITY_MMDB,
+                os.getenv("GEO_LITE_ASN_MMDB") or GEO_LITE_ASN_MMDB,
+            )
+        return _SharedClient(_mmdb_client)
+    raise ValueError(f"Unknown GEO_LITE_BACKEND: {backend}")
+
+
+class _SharedClient:
+    """Forwards to a process-wide client but leaves it open on aclose()."""
+
+    def __init__(self, client):
+        self._client = client
+        self.local = getattr(client, "local", False)
+
+    async def city(self, ip: str):
+        return await self._client.city(ip)
+
+    async def city_many(self, ips, concurrency: int = 16):
+        return await self._client.city_many(ips, concurrency)
+
+    async def aclose(self): pass
+    async def __aenter__(self): return self
+    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
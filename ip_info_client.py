@@ -1,9 +1,25 @@
+import asyncio
+import logging
 import os
 import httpx
 
+from metrics import InstrumentedTransport
+
+logger = logging.getLogger("ripe_atlas")
+
 IP_INFO_BASE_URL = os.getenv("IP_INFO_BASE_URL")
 IP_INFO_TOKEN = os.getenv("IP_INFO_TOKEN") ## put this in env for security
 
+_FAILED = object()  # marks a lookup that errored, as opposed to one without data
+
+
+def _retry_after(response: httpx.Response):
+    """Seconds from a Retry-After header, or None if it is missing or not a number."""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
 class IpinfoClient:
     """HTTPS client for ipinfo.io with Bearer token auth."""
     def __init__(self, token: str = IP_INFO_TOKEN, base_url: str = IP_INFO_BASE_URL, timeout: float = 8.0):
@@ -13,14 +29,120 @@ class IpinfoClient:
             base_url=base_url.rstrip("/"),
             headers={"Authorization": f"Bearer {token}", "Accept": "application/json"},
             timeout=timeout,
+            transport=InstrumentedTransport("ipinfo", base_url),
             #http2=True,
         )
+        self._batch_available = True
+
+    BATCH_SIZE = 1000  # ipinfo batch endpoint limit per request
+    BATCH_RETRIES = 2  # retries of a batch after a 429, 5xx or network error
+    BATCH_BACKOFF = 1.0  # seconds before the first retry, doubled for each further one
+    MAX_BACKOFF = 30.0
 
     async def lookup(self, ip: str):
         r = await self._client.get(f"/lite/{ip}")
         r.raise_for_status()
         return r.json()
 
+    async def lookup_many(self, ips, concurrency: int = 10) -> dict:
+        """Look up many IPs; returns {ip: data or None}, leaving out IPs whose lookup failed.
+
+        Uses the /batch endpoint in chunks of BATCH_SIZE. A chunk that gets
+        a 429, a 5xx or a network error is retried with backoff, then looked
+        up with concurrent single lookups. If batch requests are not
+        available (e.g. not included in the plan), falls back to single
+        lookups and stays on that path for this client.
+        """
+        ips = list(dict.fromkeys(ip for ip in ips if ip))
+        results = {}
+        for start in range(0, len(ips), self.BATCH_SIZE):
+            chunk = ips[start:start + self.BATCH_SIZE]
+            if self._batch_available:
+                try:
+                    batch = await self._lookup_batch_with_retry(chunk)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in (400, 403, 404, 405):
+                        raise
+                    logger.warning(f"ipinfo batch endpoint unavailable ({e.response.status_code}), using single lookups")
+                    self._batch_available = False
+                    batch = None
+                if batch is not None:
+                    results.update(batch)
+                    continue
+            results.update(await self._lookup_concurrently(chunk, concurrency))
+        return results
+
+    async def _lookup_batch_with_retry(self, ips):
+        """Batch lookup retried on 429/5xx/network errors; None once the retries are used up."""
+        for attempt in range(self.BATCH_RETRIES + 1):
+            try:
+                return await self._lookup_batch(ips)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status != 429 and status < 500:
+                    raise
+                error, delay = e, _retry_after(e.response)
+            except httpx.TransportError as e:
+                error, delay = e, None
+            if attempt < self.BATCH_RETRIES:
+                delay = self.BATCH_BACKOFF * 2 ** attempt if delay is None else delay
+                logger.warning(f"ipinfo batch failed ({error}), retrying in {delay:.1f}s")
+                await asyncio.sleep(min(delay, self.MAX_BACKOFF))
+        logger.warning(f"ipinfo batch failed {self.BATCH_RETRIES + 1} times ({error}), using single lookups for {len(ips)} IPs")
+        return None
+
+    async def _lookup_batch(self, ips) -> dict:
+        r = await self._client.post("/batch", json=[f"lite/{ip}" for ip in ips])
+        r.raise_for_status()
+        data = r.json()
+        results = {}
+        for ip in ips:
+            value = data.get(f"lite/{ip}")
+            results[ip] = value if isinstance(value, dict) and "error" not in value else None
+        return results
+
+    async def _lookup_concurrently(self, ips, concurrency: int) -> dict:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup_one(ip):
+            async with semaphore:
+                try:
+                    return ip, await self.lookup(ip)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 404:
+                        return ip, None
+                    logger.warning(f"ipinfo lookup failed for {ip}: {e}")
+                except httpx.HTTPError as e:
+                    logger.warning(f"ipinfo lookup failed for {ip}: {e}")
+                return ip, _FAILED
+
+        results = await asyncio.gather(*(lookup_one(ip) for ip in ips))
+        return {ip: data for ip, data in results if data is not _FAILED}
+
+    async def aclose(self): await self._client.aclose()
+    async def __aenter__(self): return self
+    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
+
+
+IP_INFO_LEGACY_BASE_URL = os.getenv("IP_INFO_LEGACY_BASE_URL", "https://ipinfo.io")
+
+class IpinfoOldClient:
+    """HTTPS client for the full ipinfo.io JSON API (hostname, city, loc, ...)."""
+    def __init__(self, token: str = IP_INFO_TOKEN, base_url: str = IP_INFO_LEGACY_BASE_URL, timeout: float = 8.0):
+        base_url = os.getenv("IP_INFO_LEGACY_BASE_URL") or base_url
+        token = os.getenv("IP_INFO_TOKEN") ## put this in env for security
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {token}", "Accept": "application/json"},
+            timeout=timeout,
+            transport=InstrumentedTransport("ipinfo_legacy", base_url),
+        )
+
+    async def lookup(self, ip: str):
+        r = await self._client.get(f"/{ip}/json")
+        r.raise_for_status()
+        return r.json()
+
     async def aclose(self): await self._client.aclose()
     async def __aenter__(self): return self
-    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
\ No newline at end of file
+    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
@@ -0,0 +1,546 @@
+"""Two-tier cache (in-process LRU + SQLite) for IP enrichment lookups."""
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from geo_lite_client import GeoLiteClient, GeoLiteResult, create_geolite_client
+from ip_info_client import IpinfoClient
+
+logger = logging.getLogger("ripe_atlas")
+
+IP_CACHE_PATH = os.getenv("IP_CACHE_PATH", "data/enrichment/ip_cache.sqlite")
+# Share in-flight fetches between concurrent callers of the same source
+COALESCE_LOOKUPS = os.getenv("IP_LOOKUP_COALESCE", "1") != "0"
+
+# Marker for a cached negative result (no data, bogon address, or a recent error)
+NEGATIVE = object()
+
+
+def is_bogon(ip: str) -> bool:
+    """True for invalid, private, reserved and other non-routable addresses."""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return True
+    return not address.is_global or address.is_multicast
+
+
+@dataclass
+class CacheMetrics:
+    """Counters and lookup latency for one cached source."""
+
+    memory_hits: int = 0
+    persistent_hits: int = 0
+    misses: int = 0
+    negative_hits: int = 0
+    bogons: int = 0
+    errors: int = 0
+    fetches: int = 0
+    coalesced: int = 0
+    fetch_seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.persistent_hits) / lookups, 4) if lookups else None,
+            "negative_hits": self.negative_hits,
+            "bogons": self.bogons,
+            "errors": self.errors,
+            "fetches": self.fetches,
+            "coalesced": self.coalesced,
+            "avg_fetch_ms": round(self.fetch_seconds / self.fetches * 1000, 2) if self.fetches else None,
+        }
+
+
+class LRUCache:
+    """Bounded in-process cache with per-entry expiry."""
+
+    def __init__(self, maxsize: int = 50_000):
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple[str, str], tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: tuple[str, str], value: Any, expires_at: float) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class PersistentCache:
+    """SQLite-backed cache shared across runs, keyed by (source, ip).
+
+    CachedLookup calls it from worker threads so reads and commits stay
+    off the event loop; a lock serializes use of the one connection.
+    """
+
+    def __init__(self, path: str = IP_CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A lost last write only costs a refetch; skip the fsync on every commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ip_cache (
+                source TEXT NOT NULL,
+                ip TEXT NOT NULL,
+                data TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (source, ip)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, source: str, ip: str) -> tuple[Optional[Any], float]:
+        """Cached value (NEGATIVE for a negative entry) and its expiry, or (None, 0)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM ip_cache WHERE source = ? AND ip = ? AND expires_at > ?",
+                (source, ip, time.time()),
+            ).fetchone()
+        if row is None:
+            return None, 0.0
+        data, expires_at = row
+        return (NEGATIVE if data is None else json.loads(data)), expires_at
+
+    def get_many(self, source: str, ips: list[str], chunk_size: int = 500) -> dict[str, tuple[Any, float]]:
+        """{ip: (value, expires_at)} for the IPs that have a live entry."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for start in range(0, len(ips), chunk_size):
+                chunk = ips[start:start + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT ip, data, expires_at FROM ip_cache WHERE source = ? AND expires_at > ? AND ip IN ({placeholders})",
+                    (source, now, *chunk),
+                ).fetchall()
+                for ip, data, expires_at in rows:
+                    found[ip] = (NEGATIVE if data is None else json.loads(data)), expires_at
+        return found
+
+    def put(self, source: str, ip: str, value: Any, expires_at: float) -> None:
+        self.put_many(source, [(ip, value, expires_at)])
+
+    def put_many(self, source: str, entries: list[tuple[str, Any, float]]) -> None:
+        """Store (ip, value, expires_at) entries in one transaction."""
+        rows = [(source, ip, None if value is NEGATIVE else json.dumps(value), expires_at) for ip, value, expires_at in entries]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ip_cache (source, ip, data, expires_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM ip_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+        return cursor.rowcount
+
+
+class SingleFlight:
+    """Coalesces concurrent fetches of the same key into one in-flight future.
+
+    The first caller for a key (the leader) runs the fetch; callers that
+    arrive while it is running await the leader's result instead of
+    fetching again. The key is released as soon as the fetch finishes.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def pending(self, key: str) -> Optional[asyncio.Future]:
+        return self._inflight.get(key)
+
+    def claim(self, keys) -> dict[str, asyncio.Future]:
+        """Register the caller as leader for keys that are not in flight yet."""
+        loop = asyncio.get_running_loop()
+        claimed = {}
+        for key in keys:
+            if key not in self._inflight:
+                future = loop.create_future()
+                # Nobody may be waiting; don't warn about an unretrieved exception
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._inflight[key] = claimed[key] = future
+        return claimed
+
+    def resolve(self, claimed: dict[str, asyncio.Future], results: dict[str, Any], error: Optional[BaseException] = None) -> None:
+        """Hand the leader's results (or error) to all waiters and release the keys."""
+        for key, future in claimed.items():
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error if isinstance(error, Exception) else RuntimeError(f"Fetch of {key} was cancelled"))
+            else:
+                future.set_result(results.get(key))
+
+    async def do(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Result of fetch() for key and whether it was shared with another caller."""
+        future = self.pending(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        claimed = self.claim([key])
+        try:
+            result = await fetch()
+        except BaseException as e:
+            self.resolve(claimed, {}, e)
+            raise
+        self.resolve(claimed, {key: result})
+        return result, False
+
+
+class CachedLookup:
+    """Memoizes one lookup source through the LRU and the persistent store.
+
+    Bogon addresses are answered negatively without a network call.
+    Lookups the source answered without data are cached for negative_ttl
+    seconds. Failed lookups (timeouts, 5xx, ...) are only remembered in
+    memory for error_ttl seconds, so an upstream outage doesn't hide good
+    answers for long; errors are not raised.
+    With an `inflight` SingleFlight, concurrent misses for the same IP
+    share one fetch. The persistent store is read and written in worker
+    threads, one read and one commit per get() or get_many() call.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        fetch: Callable[[str], Awaitable[Optional[dict]]],
+        ttl: float,
+        negative_ttl: float = 3600,
+        error_ttl: float = 60,
+        memory: Optional[LRUCache] = None,
+        persistent: Optional[PersistentCache] = None,
+        metrics: Optional[CacheMetrics] = None,
+        inflight: Optional[SingleFlight] = None,
+    ):
+        self.source = source
+        self.fetch = fetch
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.memory = memory if memory is not None else LRUCache()
+        self.persistent = persistent
+        self.metrics = metrics if metrics is not None else CacheMetrics()
+        self.inflight = inflight
+
+    async def _fetch_one(self, ip: str) -> Any:
+        """Fetch and remember one IP; returns the value or NEGATIVE, never raises."""
+        started = time.perf_counter()
+        try:
+            value = await self.fetch(ip) or NEGATIVE
+        except Exception as e:
+            logger.warning(f"{self.source} lookup failed for {ip}: {e}")
+            self.metrics.errors += 1
+            value = None
+        self.metrics.fetches += 1
+        self.metrics.fetch_seconds += time.perf_counter() - started
+        if value is None:
+            self._remember_error(ip)
+            return NEGATIVE
+        writes = []
+        self._remember(ip, value, self.negative_ttl if value is NEGATIVE else self.ttl, writes)
+        await self._store(writes)
+        return value
+
+    def _remember_error(self, ip: str) -> None:
+        if self.error_ttl > 0:
+            self.memory.put((self.source, ip), NEGATIVE, time.time() + self.error_ttl)
+
+    def _remember(self, ip: str, value: Any, ttl: float, writes: list) -> None:
+        """Cache value in memory and queue its store write on writes (see _store)."""
+        expires_at = time.time() + ttl
+        self.memory.put((self.source, ip), value, expires_at)
+        if self.persistent is not None:
+            writes.append((ip, value, expires_at))
+
+    async def get(self, ip: str) -> Optional[dict]:
+        key = (self.source, ip)
+        value = self.memory.get(key)
+        if value is not None:
+            self.metrics.memory_hits += 1
+        elif self.persistent is not None:
+            value, expires_at = await asyncio.to_thread(self.persistent.get, self.source, ip)
+            if value is not None:
+                self.metrics.persistent_hits += 1
+                self.memory.put(key, value, expires_at)
+
+        if value is None:
+            self.metrics.misses += 1
+            if is_bogon(ip):
+                self.metrics.bogons += 1
+                writes = []
+                self._remember(ip, NEGATIVE, self.ttl, writes)
+                await self._store(writes)
+                return None
+
+            if self.inflight is None:
+                value = await self._fetch_one(ip)
+            else:
+                try:
+                    value, shared = await self.inflight.do(ip, lambda: self._fetch_one(ip))
+                except Exception:  # the leader was cancelled
+                    value, shared = NEGATIVE, True
+                if shared:
+                    self.metrics.coalesced += 1
+            return None if value is NEGATIVE else value
+
+        if value is NEGATIVE:
+            self.metrics.negative_hits += 1
+            return None
+        return value
+
+    async def get_many(self, ips, fetch_many: Callable[[list[str]], Awaitable[dict]]) -> dict[str, Optional[dict]]:
+        """Like get() for many IPs; all misses are fetched with one fetch_many call.
+
+        IPs not in memory are read from the store in one query and new
+        entries are written to it in one transaction.
+        """
+        results: dict[str, Optional[dict]] = dict.fromkeys(ips)
+        cached: dict[str, Any] = {}
+        for ip in results:
+            value = self.memory.get((self.source, ip))
+            if value is not None:
+                self.metrics.memory_hits += 1
+                cached[ip] = value
+        unseen = [ip for ip in results if ip not in cached]
+        if unseen and self.persistent is not None:
+            stored = await asyncio.to_thread(self.persistent.get_many, self.source, unseen)
+            for ip, (value, expires_at) in stored.items():
+                self.metrics.persistent_hits += 1
+                self.memory.put((self.source, ip), value, expires_at)
+                cached[ip] = value
+
+        missing = []
+        writes = []
+        for ip in results:
+            value = cached.get(ip)
+            if value is None:
+                self.metrics.misses += 1
+                if is_bogon(ip):
+                    self.metrics.bogons += 1
+                    self._remember(ip, NEGATIVE, self.ttl, writes)
+                    results[ip] = None
+                else:
+                    missing.append(ip)
+                continue
+            if value is NEGATIVE:
+                self.metrics.negative_hits += 1
+                value = None
+            results[ip] = value
+
+        if not missing:
+            await self._store(writes)
+            return results
+
+        # IPs another caller is already fetching are awaited, the rest fetched in one batch
+        waiting = {}
+        claimed = {}
+        if self.inflight is not None:
+            waiting = {ip: future for ip in missing if (future := self.inflight.pending(ip)) is not None}
+            claimed = self.inflight.claim(ip for ip in missing if ip not in waiting)
+            self.metrics.coalesced += len(waiting)
+        to_fetch = [ip for ip in missing if ip not in waiting]
+
+        if to_fetch:
+            fetched: dict[str, Any] = {}
+            try:
+                fetched = await self._fetch_batch(to_fetch, fetch_many, writes)
+            finally:
+                if self.inflight is not None:
+                    self.inflight.resolve(claimed, fetched)
+            for ip, value in fetched.items():
+                results[ip] = None if value is NEGATIVE else value
+        await self._store(writes)
+
+        for ip, future in waiting.items():
+            try:
+                value = await asyncio.shield(future)
+            except Exception:
+                value = NEGATIVE
+            results[ip] = None if value is NEGATIVE else value
+        return results
+
+    async def _store(self, writes: list[tuple[str, Any, float]]) -> None:
+        """Write queued entries to the store in one transaction, in a worker thread."""
+        if writes and self.persistent is not None:
+            await asyncio.to_thread(self.persistent.put_many, self.source, writes)
+
+    async def _fetch_batch(self, ips: list[str], fetch_many: Callable[[list[str]], Awaitable[dict]], writes: list) -> dict[str, Any]:
+        """Fetch and remember many IPs; values are data or NEGATIVE, never raises.
+
+        IPs that fetch_many leaves out of its result count as failed lookups.
+        """
+        started = time.perf_counter()
+        try:
+            fetched = await fetch_many(ips)
+        except Exception as e:
+            logger.warning(f"{self.source} batch lookup failed for {len(ips)} IPs: {e}")
+            fetched = {}
+        self.metrics.fetches += 1
+        self.metrics.fetch_seconds += time.perf_counter() - started
+        values = {}
+        for ip in ips:
+            if ip not in fetched:
+                self.metrics.errors += 1
+                self._remember_error(ip)
+                values[ip] = NEGATIVE
+                continue
+            values[ip] = fetched[ip] or NEGATIVE
+            self._remember(ip, values[ip], self.negative_ttl if values[ip] is NEGATIVE else self.ttl, writes)
+        return values
+
+
+_persistent_cache: Optional[PersistentCache] = None
+_memory: dict[str, LRUCache] = {}
+_metrics: dict[str, CacheMetrics] = {}
+_inflight: dict[str, SingleFlight] = {}
+
+
+def get_persistent_cache() -> PersistentCache:
+    global _persistent_cache
+    if _persistent_cache is None:
+        _persistent_cache = PersistentCache()
+    return _persistent_cache
+
+
+def _cached_lookup(source: str, fetch, ttl: float, negative_ttl: float) -> CachedLookup:
+    """CachedLookup for one client that shares the process-wide LRU, store, metrics and in-flight fetches of its source."""
+    return CachedLookup(
+        source,
+        fetch,
+        ttl,
+        negative_ttl,
+        memory=_memory.setdefault(source, LRUCache()),
+        persistent=get_persistent_cache(),
+        metrics=_metrics.setdefault(source, CacheMetrics()),
+        inflight=_inflight.setdefault(source, SingleFlight()) if COALESCE_LOOKUPS else None,
+    )
+
+
+def cache_metrics() -> dict[str, dict]:
+    """Hit/miss/latency metrics of all cached sources in this process."""
+    return {source: metrics.as_dict() for source, metrics in _metrics.items()}
+
+
+class CachedIpinfoClient:
+    """Drop-in IpinfoClient with two-tier caching of lookup()."""
+
+    SOURCE = "ipinfo_lite"
+
+    def __init__(self, client: Optional[IpinfoClient] = None, ttl: float = 7 * 24 * 3600, negative_ttl: float = 3600):
+        self._client = client or IpinfoClient()
+        self._cache = _cached_lookup(self.SOURCE, self._fetch, ttl, negative_ttl)
+
+    async def _fetch(self, ip: str) -> Optional[dict]:
+        try:
+            return await self._client.lookup(ip)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
+    @property
+    def metrics(self) -> CacheMetrics:
+        return self._cache.metrics
+
+    async def lookup(self, ip: str) -> Optional[dict]:
+        return await self._cache.get(ip)
+
+    async def lookup_many(self, ips, concurrency: int = 10) -> dict[str, Optional[dict]]:
+        """Cached results first; the remaining IPs go through IpinfoClient.lookup_many.
+
+        Without the batch endpoint every IP is its own request, so each answer
+        is cached as it arrives and a cancelled call keeps the ones it got.
+        """
+        if not getattr(self._client, "_batch_available", True):
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def lookup_one(ip):
+                async with semaphore:
+                    return ip, await self._cache.get(ip)
+
+            return dict(await asyncio.gather(*(lookup_one(ip) for ip in dict.fromkeys(ip for ip in ips if ip))))
+        return await self._cache.get_many(ips, lambda missing: self._client.lookup_many(missing, concurrency))
+
+    async def aclose(self): await self._client.aclose()
+    async def __aenter__(self): return self
+    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
+
+
+class CachedGeoLiteClient:
+    """Drop-in GeoLiteClient with two-tier caching of city().
+
+    Local mmdb backends are not cached: a lookup is cheaper than the cache,
+    and cached answers would outlive a database reload.
+    """
+
+    SOURCE = "geolite_city"
+
+    def __init__(self, client: Optional[GeoLiteClient] = None, ttl: float = 30 * 24 * 3600, negative_ttl: float = 3600):
+        self._client = client or create_geolite_client()
+        self._local = getattr(self._client, "local", False)
+        self._cache = _cached_lookup(self.SOURCE, self._fetch, ttl, negative_ttl)
+
+    async def _fetch(self, ip: str) -> Optional[dict]:
+        # lookup_city raises on errors, so they are not cached as "no data"
+        lookup = getattr(self._client, "lookup_city", self._client.city)
+        result = await lookup(ip)
+        return asdict(result) if result is not None else None
+
+    @property
+    def metrics(self) -> CacheMetrics:
+        return self._cache.metrics
+
+    async def city(self, ip: str) -> Optional[GeoLiteResult]:
+        if self._local:
+            return await self._client.city(ip)
+        data = await self._cache.get(ip)
+        return GeoLiteResult(**data) if data is not None else None
+
+    async def city_many(self, ips, concurrency: int = 16) -> dict[str, Optional[GeoLiteResult]]:
+        """Look up many IPs with at most `concurrency` lookups in flight; returns {ip: GeoLiteResult or None}."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def city_one(ip):
+            async with semaphore:
+                return ip, await self.city(ip)
+
+        return dict(await asyncio.gather(*(city_one(ip) for ip in dict.fromkeys(ips))))
+
+    async def aclose(self): await self._client.aclose()
+    async def __aenter__(self): return self
+    async def __aexit__(self, exc_type, exc, tb): await self.aclose()
@@ -2,7 +2,9 @@ import logging
 from logging.handlers import RotatingFileHandler
 import os
 
-def setup_logger(log_file: str = "logs/ripe_atlas.log"):
+LOG_FILE = os.getenv("LOG_FILE", "logs/ripe_atlas.log")
+
+def setup_logger(log_file: str = LOG_FILE):
     os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
     logger = logging.getLogger("ripe_atlas")
@@ -0,0 +1,163 @@
+"""Prometheus metrics: route latency, upstream calls, DB pool checkouts and B-root scans.
+
+Metrics live in the prometheus_client default registry and are served by
+GET /metrics. Each uvicorn worker keeps its own values unless
+PROMETHEUS_MULTIPROC_DIR is set (see prometheus_client multiprocess mode).
+"""
+import os
+import time
+import urllib.request
+from typing import Optional
+
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, including the response body.",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of outbound HTTP requests until response headers, by upstream.",
+    ["upstream"],
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_request_errors_total",
+    "Outbound HTTP requests that raised or returned a 4xx/5xx status, by upstream.",
+    ["upstream", "error"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to check a connection out of the SQLAlchemy pool, including waiting and connecting.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Pool checkouts that gave up after the pool timeout.",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "SQLAlchemy pool connections by state.",
+    ["state"],
+)
+BROOT_FILES = Counter("broot_files_scanned_total", "B-root capture files scanned.")
+BROOT_LINES = Counter("broot_lines_scanned_total", "B-root capture lines scanned.")
+BROOT_BYTES = Counter("broot_bytes_scanned_total", "Compressed bytes of scanned B-root capture files.")
+BROOT_MATCHES = Counter("broot_matches_total", "B-root queries for the target hostnames.")
+BROOT_SCAN_SECONDS = Histogram(
+    "broot_file_scan_seconds",
+    "Time to scan one B-root capture file, excluding IP enrichment.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, and its content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template.
+
+    Labels use the matched route's path template (e.g. /probes/{probe_id}),
+    so the number of series stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
+
+
+def _observe(upstream_seconds, upstream: str, started: float, status: Optional[int] = None, error: Optional[Exception] = None) -> None:
+    upstream_seconds.observe(time.perf_counter() - started)
+    if error is not None:
+        UPSTREAM_ERRORS.labels(upstream, type(error).__name__).inc()
+    elif status >= 400:
+        UPSTREAM_ERRORS.labels(upstream, f"http_{status}").inc()
+
+
+def env_proxy(url: Optional[str]) -> Optional[str]:
+    """Proxy for url from HTTP(S)_PROXY / ALL_PROXY, honouring NO_PROXY, as httpx would pick it.
+
+    httpx ignores these variables once a client gets an explicit transport,
+    so the instrumented transports apply them themselves.
+    """
+    if not url:
+        return None
+    target = httpx.URL(url)
+    proxies = urllib.request.getproxies_environment()
+    if target.host and urllib.request.proxy_bypass_environment(target.host, proxies):
+        return None
+    return proxies.get(target.scheme) or proxies.get("all")
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport recording latency and errors of one upstream (ripe_atlas, ipinfo, ...).
+
+    url is the upstream's base URL, used to pick the proxy from the environment.
+    """
+
+    def __init__(self, upstream: str, url: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.upstream = upstream
+        self._transport = transport or httpx.AsyncHTTPTransport(proxy=env_proxy(url))
+        self._seconds = UPSTREAM_SECONDS.labels(upstream)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            _observe(self._seconds, self.upstream, started, error=e)
+            raise
+        _observe(self._seconds, self.upstream, started, status=response.status_code)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class InstrumentedSyncTransport(httpx.BaseTransport):
+    """Synchronous counterpart of InstrumentedTransport for httpx.Client."""
+
+    def __init__(self, upstream: str, url: Optional[str] = None, transport: Optional[httpx.BaseTransport] = None):
+        self.upstream = upstream
+        self._transport = transport or httpx.HTTPTransport(proxy=env_proxy(url))
+        self._seconds = UPSTREAM_SECONDS.labels(upstream)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception as e:
+            _observe(self._seconds, self.upstream, started, error=e)
+            raise
+        _observe(self._seconds, self.upstream, started, status=response.status_code)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
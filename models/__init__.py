@@ -1,13 +1,17 @@
 """Domain models."""
-from .probe import Probe
-from .measurement import Measurement, MeasurementResult, PingResult
+from .base import Base
+from .probe import Probe, ProbeDB
+from .measurement import Measurement, MeasurementResult, PingResult, PingResultDB
 from .anycast_ip import AnycastIP, AnycastIPDetails
 
 __all__ = [
+    "Base",
     "Probe",
+    "ProbeDB",
     "Measurement",
     "MeasurementResult",
     "PingResult",
+    "PingResultDB",
     "AnycastIP",
     "AnycastIPDetails",
 ]
\ No newline at end of file
@@ -1,13 +1,13 @@
 """Measurement domain models."""
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional, Literal
+from datetime import datetime, timezone
+from typing import ClassVar, Optional, Literal
 
-from sqlalchemy import BigInteger, Float, Integer, String, TIMESTAMP
+from sqlalchemy import BigInteger, Float, Index, Integer, String, TIMESTAMP, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import INET
-from sqlalchemy.orm import Mapped, declarative_base, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column
 
-Base = declarative_base()
+from .base import Base
 
 
 @dataclass
@@ -63,6 +63,14 @@ class PingResult:
     rtt2: Optional[float] = None
     rtt3: Optional[float] = None
     
+    # Column order of to_db_row(), used for COPY ingestion
+    DB_COLUMNS: ClassVar[tuple[str, ...]] = (
+        "serial_no", "measurement_id", "probe_id", "dst_addr", "src_addr",
+        "timestamp_unix", "timestamp_iso", "sent", "rcvd", "loss_pct",
+        "min_ms", "avg_ms", "max_ms", "rtt1", "rtt2", "rtt3",
+        "continent_code", "continent_id",
+    )
+    
     @property
     def timestamp_iso(self) -> str:
         """Get ISO formatted timestamp."""
@@ -150,18 +158,63 @@ class PingResult:
             "continent_id": self.continent_id,
         }
 
+    def to_db_row(self, serial_no: Optional[int] = None) -> tuple:
+        """Convert ping result to a tuple in DB_COLUMNS order for COPY ingestion.
+        
+        Args:
+            serial_no: Optional serial number for this result in batch
+        """
+        return (
+            serial_no,
+            self.measurement_id,
+            self.probe_id,
+            self.target,
+            self.source_address,
+            self.timestamp,
+            datetime.fromtimestamp(self.timestamp, tz=timezone.utc) if self.timestamp else None,
+            self.sent,
+            self.received,
+            self.loss_percentage,
+            self.min_rtt,
+            self.avg_rtt,
+            self.max_rtt,
+            self.rtt1,
+            self.rtt2,
+            self.rtt3,
+            self.continent_code,
+            self.continent_id,
+        )
+
 
 class PingResultDB(Base):
-    """ORM mapping for ping results stored in the measurements table."""
+    """ORM mapping for ping results stored in the measurements table.
+    
+    The table is LIST-partitioned by continent_code (see db/migrations), so
+    the partition key is part of the primary key and the natural key.
+    """
     __tablename__ = "measurements"
+    
+    # Natural key of a ping result; makes re-ingestion idempotent
+    NATURAL_KEY = ("measurement_id", "probe_id", "timestamp_unix", "continent_code")
+    __table_args__ = (
+        UniqueConstraint(*NATURAL_KEY, name="uq_measurements_natural_key"),
+        Index("idx_measurements_probe_id", "probe_id"),
+        Index(
+            "idx_measurements_dst_addr_rcvd",
+            "dst_addr",
+            postgresql_include=["probe_id", "avg_ms"],
+            postgresql_where=text("rcvd > 0"),
+        ),
+        {"postgresql_partition_by": "LIST (continent_code)"},
+    )
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     serial_no: Mapped[Optional[int]] = mapped_column(Integer)
     measurement_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     probe_id: Mapped[int] = mapped_column(Integer, nullable=False)
     dst_addr: Mapped[Optional[str]] = mapped_column(INET)
     src_addr: Mapped[Optional[str]] = mapped_column(INET)
-    timestamp_unix: Mapped[Optional[int]] = mapped_column(BigInteger)
+    timestamp_unix: Mapped[int] = mapped_column(BigInteger, nullable=False)
     timestamp_iso: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True))
     sent: Mapped[Optional[int]] = mapped_column(Integer)
     rcvd: Mapped[Optional[int]] = mapped_column(Integer)
@@ -172,7 +225,7 @@ class PingResultDB(Base):
     rtt1: Mapped[Optional[float]] = mapped_column(Float)
     rtt2: Mapped[Optional[float]] = mapped_column(Float)
     rtt3: Mapped[Optional[float]] = mapped_column(Float)
-    continent_code: Mapped[str] = mapped_column(String(10), nullable=False)
+    continent_code: Mapped[str] = mapped_column(String(10), primary_key=True)
     continent_id: Mapped[Optional[int]] = mapped_column(Integer)
 
 
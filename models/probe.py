@@ -1,9 +1,52 @@
 """Probe domain model."""
+import ast
 from dataclasses import dataclass
 from typing import Optional
 
+from sqlalchemy import BigInteger, Boolean, Float, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import CIDR, INET
+from sqlalchemy.orm import Mapped, mapped_column
 
-@dataclass
+from .base import Base
+
+
+def _to_int(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value, default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() == "true"
+    return bool(value)
+
+
+def _literal(value):
+    """Parse dict/list columns that csv.DictWriter stored with str()."""
+    if isinstance(value, str) and value[:1] in "{[":
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+    return value
+
+
+@dataclass(slots=True)
 class Probe:
     """Represents a RIPE Atlas probe."""
     
@@ -20,24 +63,43 @@ class Probe:
     prefix_v6: Optional[str] = None
     is_anchor: bool = False
     is_public: bool = True
+    last_connected: Optional[int] = None
+    total_uptime: Optional[int] = None
     
     @classmethod
     def from_dict(cls, data: dict) -> "Probe":
-        """Create Probe from API response dict."""
+        """Create Probe from API response dict or a cached CSV row.
+        
+        Handles the API shape (status/geometry objects) as well as flat,
+        string-typed CSV rows.
+        """
+        status = _literal(data.get("status"))
+        if isinstance(status, dict):
+            status = status.get("id")
+        
+        latitude = data.get("latitude")
+        longitude = data.get("longitude")
+        geometry = _literal(data.get("geometry"))
+        if latitude in (None, "") and isinstance(geometry, dict):
+            coordinates = geometry.get("coordinates") or [None, None]
+            longitude, latitude = coordinates[0], coordinates[1]
+        
         return cls(
-            id=data.get("id"),
-            country_code=data.get("country_code", ""),
-            asn_v4=data.get("asn_v4"),
-            asn_v6=data.get("asn_v6"),
-            status=data.get("status"),
-            latitude=data.get("latitude"),
-            longitude=data.get("longitude"),
-            address_v4=data.get("address_v4"),
-            address_v6=data.get("address_v6"),
-            prefix_v4=data.get("prefix_v4"),
-            prefix_v6=data.get("prefix_v6"),
-            is_anchor=data.get("is_anchor", False),
-            is_public=data.get("is_public", True),
+            id=_to_int(data.get("id")),
+            country_code=data.get("country_code") or "",
+            asn_v4=_to_int(data.get("asn_v4")),
+            asn_v6=_to_int(data.get("asn_v6")),
+            status=_to_int(status),
+            latitude=_to_float(latitude),
+            longitude=_to_float(longitude),
+            address_v4=data.get("address_v4") or None,
+            address_v6=data.get("address_v6") or None,
+            prefix_v4=data.get("prefix_v4") or None,
+            prefix_v6=data.get("prefix_v6") or None,
+            is_anchor=_to_bool(data.get("is_anchor"), False),
+            is_public=_to_bool(data.get("is_public"), True),
+            last_connected=_to_int(data.get("last_connected")),
+            total_uptime=_to_int(data.get("total_uptime")),
         )
     
     def to_dict(self) -> dict:
@@ -56,8 +118,37 @@ class Probe:
             "prefix_v6": self.prefix_v6,
             "is_anchor": self.is_anchor,
             "is_public": self.is_public,
+            "last_connected": self.last_connected,
+            "total_uptime": self.total_uptime,
         }
     
     def is_african(self, african_countries: set[str]) -> bool:
         """Check if probe is in an African country."""
-        return self.country_code in african_countries
\ No newline at end of file
+        return self.country_code in african_countries
+
+
+class ProbeDB(Base):
+    """ORM mapping for probes stored in the probes table."""
+    __tablename__ = "probes"
+    __table_args__ = (
+        Index(
+            "ix_probes_v6_country_asn",
+            "country_code",
+            "asn_v6",
+            postgresql_where=text("address_v6 IS NOT NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    country_code: Mapped[Optional[str]] = mapped_column(String(2), index=True)
+    asn_v4: Mapped[Optional[int]] = mapped_column(BigInteger)
+    asn_v6: Mapped[Optional[int]] = mapped_column(BigInteger)
+    status: Mapped[Optional[int]] = mapped_column(Integer)
+    latitude: Mapped[Optional[float]] = mapped_column(Float)
+    longitude: Mapped[Optional[float]] = mapped_column(Float)
+    address_v4: Mapped[Optional[str]] = mapped_column(INET)
+    address_v6: Mapped[Optional[str]] = mapped_column(INET)
+    prefix_v4: Mapped[Optional[str]] = mapped_column(CIDR)
+    prefix_v6: Mapped[Optional[str]] = mapped_column(CIDR)
+    is_anchor: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    is_public: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
@@ -0,0 +1,168 @@
+"""Longest-prefix matching of IPv4 and IPv6 addresses against a set of CIDR prefixes."""
+import ipaddress
+import socket
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def ipv4_to_int(ips: Iterable[str]) -> np.ndarray:
+    """Convert dotted IPv4 strings to int64; invalid addresses become -1."""
+    ips = ips.tolist() if isinstance(ips, pd.Series) else list(ips)
+    pton, family = socket.inet_pton, socket.AF_INET
+    try:
+        packed = b"".join([pton(family, ip) for ip in ips])
+        return np.frombuffer(packed, dtype=">u4").astype(np.int64)
+    except (OSError, TypeError):
+        pass
+
+    # Slow path: some addresses are invalid
+    values = np.full(len(ips), -1, dtype=np.int64)
+    for position, ip in enumerate(ips):
+        try:
+            values[position] = int.from_bytes(pton(family, ip), "big")
+        except (OSError, TypeError):
+            continue
+    return values
+
+
+def ipv6_to_bytes(ips: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Pack IPv6 strings into (n, 16) uint8 rows, plus a mask of the valid ones.
+
+    Invalid addresses get an all-zero row and False in the mask.
+    """
+    ips = ips.tolist() if isinstance(ips, pd.Series) else list(ips)
+    pton, family = socket.inet_pton, socket.AF_INET6
+    valid = np.ones(len(ips), dtype=bool)
+    try:
+        packed = b"".join([pton(family, ip) for ip in ips])
+    except (OSError, TypeError, ValueError):
+        parts = []
+        for position, ip in enumerate(ips):
+            try:
+                parts.append(pton(family, ip))
+            except (OSError, TypeError, ValueError):
+                parts.append(bytes(16))
+                valid[position] = False
+        packed = b"".join(parts)
+    return np.frombuffer(packed, dtype=np.uint8).reshape(len(ips), 16), valid
+
+
+# Byte masks that keep the first `length` bits of an IPv6 address
+_V6_MASKS = np.array([np.packbits(np.arange(128) < length) for length in range(129)], dtype=np.uint8)
+
+
+def int_to_ipv4(values: Iterable[int]) -> list[str]:
+    return [str(ipaddress.IPv4Address(int(value))) for value in values]
+
+
+def ipv6_key(addresses: np.ndarray, length: int) -> np.ndarray:
+    """First `length` bits of packed IPv6 rows as sortable 16-byte keys."""
+    return np.ascontiguousarray(addresses & _V6_MASKS[length]).view("S16").ravel()
+
+
+def address_family(ip: str) -> int:
+    """4 or 6; raises ValueError for anything that is not an IP address."""
+    return ipaddress.ip_address(ip).version
+
+
+def split_families(ips: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of the IPv4-looking and IPv6-looking strings.
+
+    Non-strings (e.g. NaN from a truncated file row) go with IPv4, where
+    ipv4_to_int reports them as invalid.
+    """
+    is_v6 = np.fromiter((isinstance(ip, str) and ":" in ip for ip in ips), dtype=bool, count=len(ips))
+    return np.nonzero(~is_v6)[0], np.nonzero(is_v6)[0]
+
+
+class PrefixIndex:
+    """Sorted network arrays per prefix length, searched with np.searchsorted.
+
+    For every prefix length present the network addresses are kept in a
+    sorted array. A lookup shifts the addresses to that length and binary
+    searches the array, starting from the longest length, so nested
+    prefixes resolve to the most specific one. Lookups are vectorized over
+    whole address arrays. IPv4 keys are integers, IPv6 keys masked 16-byte
+    addresses; both families can be mixed in one index.
+    """
+
+    def __init__(self, prefixes: Sequence[str]):
+        self.prefixes = list(prefixes)
+        v4_positions, v6_positions = split_families(self.prefixes)
+        networks, lengths = self._parse([self.prefixes[i] for i in v4_positions.tolist()], v4_positions, 4)
+        # Clear host bits, like ipaddress.IPv4Network(strict=False)
+        networks = (networks >> (32 - lengths)) << (32 - lengths)
+        self._levels = self._build_levels(lengths, v4_positions, lambda length, rows: networks[rows] >> (32 - length))
+
+        addresses, lengths = self._parse([self.prefixes[i] for i in v6_positions.tolist()], v6_positions, 6)
+        self._v6_levels = self._build_levels(lengths, v6_positions, lambda length, rows: ipv6_key(addresses[rows], length))
+
+    def _parse(self, prefixes: list[str], positions: np.ndarray, version: int):
+        max_length = 32 if version == 4 else 128
+        addresses, _, lengths = zip(*(prefix.partition("/") for prefix in prefixes)) if prefixes else ((), (), ())
+        lengths = np.array([int(length) if length else max_length for length in lengths], dtype=np.int64)
+        if version == 4:
+            networks = ipv4_to_int(addresses)
+            invalid = networks < 0
+        else:
+            networks, valid = ipv6_to_bytes(addresses)
+            invalid = ~valid
+        invalid |= (lengths < 0) | (lengths > max_length)
+        if invalid.any():
+            raise ValueError(f"Invalid IPv{version} prefix: {self.prefixes[int(positions[int(np.argmax(invalid))])]}")
+        return networks, lengths
+
+    @staticmethod
+    def _build_levels(lengths: np.ndarray, positions: np.ndarray, keys_for):
+        """(length, sorted network keys, positions into self.prefixes), longest first."""
+        levels = []
+        for length in sorted(set(lengths.tolist()), reverse=True):
+            rows = np.nonzero(lengths == length)[0]
+            keys = keys_for(length, rows)
+            order = np.argsort(keys, kind="stable")
+            levels.append((length, keys[order], positions[rows][order]))
+        return levels
+
+    def __len__(self) -> int:
+        return len(self.prefixes)
+
+    @staticmethod
+    def _search(levels, addresses: np.ndarray, valid: np.ndarray, key) -> np.ndarray:
+        result = np.full(len(valid), -1, dtype=np.int64)
+        for length, keys, positions in levels:
+            pending = np.nonzero(valid & (result < 0))[0]
+            if not len(pending):
+                break
+            wanted = key(addresses[pending], length)
+            slots = np.searchsorted(keys, wanted)
+            slots[slots == len(keys)] = 0
+            hit = keys[slots] == wanted
+            result[pending[hit]] = positions[slots[hit]]
+        return result
+
+    def lookup(self, ips: np.ndarray) -> np.ndarray:
+        """Position of the most specific matching IPv4 prefix for each address, or -1.
+
+        Args:
+            ips: IPv4 addresses as integers (negative values never match)
+        """
+        ips = np.asarray(ips, dtype=np.int64)
+        return self._search(self._levels, ips, ips >= 0, lambda values, length: values >> (32 - length))
+
+    def lookup_v6(self, addresses: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """Like lookup() for IPv6 addresses packed by ipv6_to_bytes."""
+        return self._search(self._v6_levels, addresses, valid, ipv6_key)
+
+    def lookup_strings(self, ips: Iterable[str]) -> np.ndarray:
+        """Position of the most specific matching prefix for address strings of either family."""
+        ips = ips.tolist() if isinstance(ips, pd.Series) else list(ips)
+        v4_positions, v6_positions = split_families(ips)
+        if not len(v6_positions):
+            return self.lookup(ipv4_to_int(ips))
+        result = np.full(len(ips), -1, dtype=np.int64)
+        if len(v4_positions):
+            result[v4_positions] = self.lookup(ipv4_to_int([ips[i] for i in v4_positions.tolist()]))
+        result[v6_positions] = self.lookup_v6(*ipv6_to_bytes([ips[i] for i in v6_positions.tolist()]))
+        return result
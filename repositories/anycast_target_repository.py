@@ -0,0 +1,104 @@
+"""Versioned anycast target sets, one snapshot per census date and threshold."""
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+TARGET_COLUMNS = ["prefix", "num_sites", "ip", "score"]
+
+_SNAPSHOT_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})_sites(\d+)(_v6)?\.csv$")
+
+
+@dataclass
+class TargetSetDiff:
+    """Prefix-level difference between two target snapshots."""
+
+    added: pd.DataFrame
+    removed: pd.DataFrame
+    retargeted: pd.DataFrame  # same prefix, different responsive IP
+
+    @property
+    def new_target_ips(self) -> list[str]:
+        """IPs that have never been measured for their prefix."""
+        return self.added["ip"].tolist() + self.retargeted["ip"].tolist()
+
+    def summary(self) -> dict:
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "retargeted": len(self.retargeted),
+        }
+
+
+class AnycastTargetRepository:
+    """Stores matched anycast target sets as CSV snapshots.
+
+    Each snapshot holds one row per anycast prefix that matched a
+    responsive hitlist address and is keyed by census date, site
+    threshold and address family: <base_dir>/<YYYY-MM-DD>_sites<threshold>.csv
+    for IPv4 and ..._sites<threshold>_v6.csv for IPv6.
+    """
+
+    def __init__(self, base_dir: str = "data/anycast/targets"):
+        self.base_dir = base_dir
+
+    def snapshot_path(self, census_date: str, threshold: int, af: int = 4) -> str:
+        suffix = "_v6" if af == 6 else ""
+        return os.path.join(self.base_dir, f"{census_date.replace('/', '-')}_sites{int(threshold)}{suffix}.csv")
+
+    def exists(self, census_date: str, threshold: int, af: int = 4) -> bool:
+        return os.path.exists(self.snapshot_path(census_date, threshold, af))
+
+    def write_snapshot(self, census_date: str, threshold: int, targets: pd.DataFrame, af: int = 4) -> str:
+        path = self.snapshot_path(census_date, threshold, af)
+        os.makedirs(self.base_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        targets[TARGET_COLUMNS].sort_values("num_sites", ascending=False, kind="stable").to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def read_snapshot(self, census_date: str, threshold: int, af: int = 4) -> pd.DataFrame:
+        return pd.read_csv(
+            self.snapshot_path(census_date, threshold, af),
+            dtype={"prefix": str, "ip": str},
+        )
+
+    def list_snapshots(self, threshold: Optional[int] = None, af: int = 4) -> list[tuple[str, int]]:
+        """(census date 'YYYY/MM/DD', threshold) of all stored snapshots of a family, oldest first."""
+        if not os.path.isdir(self.base_dir):
+            return []
+        snapshots = []
+        for name in os.listdir(self.base_dir):
+            match = _SNAPSHOT_NAME.match(name)
+            if not match or (match.group(3) is not None) != (af == 6):
+                continue
+            if threshold is None or int(match.group(2)) == threshold:
+                snapshots.append((match.group(1).replace("-", "/"), int(match.group(2))))
+        return sorted(snapshots)
+
+    def previous_snapshot(self, census_date: str, threshold: int, af: int = 4) -> Optional[str]:
+        """Census date of the newest snapshot before census_date with the same threshold and family."""
+        earlier = [date for date, _ in self.list_snapshots(threshold, af) if date < census_date]
+        return earlier[-1] if earlier else None
+
+    @staticmethod
+    def diff(old: pd.DataFrame, new: pd.DataFrame) -> TargetSetDiff:
+        """Compare two target sets by prefix with a single merge."""
+        merged = old[["prefix", "ip"]].merge(
+            new[TARGET_COLUMNS], on="prefix", how="outer", suffixes=("_old", ""), indicator=True
+        )
+        added = merged[merged["_merge"] == "right_only"]
+        removed = merged[merged["_merge"] == "left_only"]
+        retargeted = merged[(merged["_merge"] == "both") & (merged["ip_old"] != merged["ip"])]
+        # The outer merge turns integer columns of unmatched rows into floats
+        integers = {"num_sites": "int64", "score": "int64"}
+        return TargetSetDiff(
+            added=added[TARGET_COLUMNS].astype(integers).reset_index(drop=True),
+            removed=removed[["prefix", "ip_old"]].rename(columns={"ip_old": "ip"}).reset_index(drop=True),
+            retargeted=retargeted[TARGET_COLUMNS].astype(integers).reset_index(drop=True),
+        )
+
+    def diff_snapshots(self, old_date: str, new_date: str, threshold: int, af: int = 4) -> TargetSetDiff:
+        return self.diff(self.read_snapshot(old_date, threshold, af), self.read_snapshot(new_date, threshold, af))
@@ -3,14 +3,49 @@ import csv
 import logging
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import AsyncIterator, Iterable, Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete, text
+from sqlalchemy import and_, or_, select, update, delete, text, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from models import Measurement
 from models.measurement import PingResult, PingResultDB
 
 logger = logging.getLogger("ripe_atlas")
 
+# Per-connection temp table used to merge COPY batches with ON CONFLICT
+STAGING_TABLE = "measurements_staging"
+
+
+def _number_per_measurement(results: list[PingResult]):
+    """Yield (serial_no, result) with serial_no restarting for each measurement."""
+    counters: dict[int, int] = {}
+    for result in results:
+        serial_no = counters.get(result.measurement_id, 0) + 1
+        counters[result.measurement_id] = serial_no
+        yield serial_no, result
+
+
+def _with_timestamp(results: list[PingResult]) -> list[PingResult]:
+    """Results that can be keyed; timestamp_unix is part of the natural key and NOT NULL."""
+    keyed = [result for result in results if result.timestamp is not None]
+    if len(keyed) < len(results):
+        logger.warning(f"Dropping {len(results) - len(keyed)} ping results without a timestamp")
+    return keyed
+
+
+def _after_row(table, probe_id: int, timestamp_unix: Optional[int], row_id: int):
+    """Keyset condition for rows after (probe_id, timestamp_unix, id), NULL timestamps last."""
+    later_in_probe = [and_(table.c.timestamp_unix.is_(None), table.c.id > row_id)]
+    if timestamp_unix is not None:
+        later_in_probe = [
+            tuple_(table.c.timestamp_unix, table.c.id) > tuple_(timestamp_unix, row_id),
+            table.c.timestamp_unix.is_(None),
+        ]
+    return or_(
+        table.c.probe_id > probe_id,
+        and_(table.c.probe_id == probe_id, or_(*later_in_probe)),
+    )
+
 
 class MeasurementRepository:
     """Handles measurement data persistence to database and CSV."""
@@ -127,23 +162,91 @@ class MeasurementRepository:
         """Batch save ping results to the measurements database table.
         
         Calculates serial_no similar to CSV write method (incrementing from 1).
+        Rows already stored under the same (measurement_id, probe_id, timestamp)
+        are skipped, so retries are safe; results without a timestamp are
+        dropped. Statistics of the targets that got new rows are refreshed
+        afterwards.
         """
         if not self.session:
             raise RuntimeError("Database session not initialized")
 
+        results = _with_timestamp(results)
         if not results:
             return {"status": "success", "saved": 0}
 
         try:
             rows = [result.to_db_dict(serial_no=idx) for idx, result in enumerate(results, start=1)]
-            query = insert(PingResultDB)
-            await self.session.execute(query, rows)
+            query = insert(PingResultDB).on_conflict_do_nothing(index_elements=PingResultDB.NATURAL_KEY)
+            result = await self.session.execute(query, rows)
             await self.session.commit()
-            return {"status": "success", "saved": len(rows)}
+            saved = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(rows)
         except Exception as e:
             await self.session.rollback()
             logger.error(f"Failed to save ping results to DB: {e}")
             return {"status": "error", "message": str(e)}
+        return await self._saved(results, saved)
+
+    async def copy_ping_results_to_db(self, results: list[PingResult]) -> dict:
+        """Stream ping results into the measurements table with binary COPY.
+        
+        Meant for large batches spanning many measurements: all rows go in one
+        transaction and serial_no restarts from 1 for every measurement.
+        Rows are copied into a temp staging table first and merged with
+        ON CONFLICT DO NOTHING on the natural key, so retries are safe;
+        results without a timestamp are dropped. Statistics of the targets
+        that got new rows are refreshed afterwards.
+        """
+        if not self.session:
+            raise RuntimeError("Database session not initialized")
+
+        results = _with_timestamp(results)
+        if not results:
+            return {"status": "success", "saved": 0}
+
+        try:
+            rows = [
+                result.to_db_row(serial_no=serial_no)
+                for serial_no, result in _number_per_measurement(results)
+            ]
+            connection = await self.session.connection()
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+            columns = ", ".join(PingResult.DB_COLUMNS)
+            key = ", ".join(PingResultDB.NATURAL_KEY)
+            async with driver_connection.transaction():
+                await driver_connection.execute(f"""
+                    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE}
+                    ON COMMIT DELETE ROWS
+                    AS SELECT {columns} FROM {PingResultDB.__tablename__} WITH NO DATA
+                """)
+                await driver_connection.copy_records_to_table(
+                    STAGING_TABLE,
+                    records=rows,
+                    columns=PingResult.DB_COLUMNS,
+                )
+                status = await driver_connection.execute(f"""
+                    INSERT INTO {PingResultDB.__tablename__} ({columns})
+                    SELECT DISTINCT ON ({key}) {columns}
+                    FROM {STAGING_TABLE}
+                    ORDER BY {key}
+                    ON CONFLICT ({key}) DO NOTHING
+                """)
+                await driver_connection.execute(f"TRUNCATE {STAGING_TABLE}")
+            await self.session.commit()
+            # status is the command tag, e.g. "INSERT 0 1234"
+            saved = int(status.split()[-1])
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Failed to COPY ping results to DB: {e}")
+            return {"status": "error", "message": str(e)}
+        return await self._saved(results, saved)
+
+    async def _saved(self, results: list[PingResult], saved: int) -> dict:
+        """Result of an ingest; refreshes the statistics of the ingested targets when rows were added."""
+        if saved:
+            # The rows are committed either way; stale stats are fixed by the next refresh
+            await self.refresh_target_stats({result.target for result in results})
+        return {"status": "success", "saved": saved, "skipped": len(results) - saved}
 
     async def get_existing_measurement_ids_in_db(self, continent_code: Optional[str] = None) -> list[int]:
         """Get measurement IDs that already have results in the DB.
@@ -156,84 +259,267 @@ class MeasurementRepository:
             raise RuntimeError("Database session not initialized")
         
         try:
-            if continent_code:
-                query = text("SELECT DISTINCT measurement_id FROM measurements WHERE continent_code = :continent_code")
-                result = await self.session.execute(query, {"continent_code": continent_code})
-            else:
-                query = text("SELECT DISTINCT measurement_id FROM measurements")
-                result = await self.session.execute(query)
+            # Loose index scan: one index probe per distinct ID instead of a full scan
+            continent_filter = "AND continent_code = :continent_code" if continent_code else ""
+            query = text(f"""
+                WITH RECURSIVE ids AS (
+                    (
+                        SELECT measurement_id FROM measurements
+                        WHERE TRUE {continent_filter}
+                        ORDER BY measurement_id LIMIT 1
+                    )
+                    UNION ALL
+                    SELECT (
+                        SELECT m.measurement_id FROM measurements AS m
+                        WHERE m.measurement_id > ids.measurement_id {continent_filter}
+                        ORDER BY m.measurement_id LIMIT 1
+                    )
+                    FROM ids
+                    WHERE ids.measurement_id IS NOT NULL
+                )
+                SELECT measurement_id FROM ids
+            """)
+            result = await self.session.execute(query, {"continent_code": continent_code} if continent_code else {})
             rows = result.fetchall()
             return [row[0] for row in rows if row[0] is not None]
         except Exception as e:
             logger.error(f"Failed to fetch existing measurement IDs from DB: {e}")
             return []
 
+    async def get_result_counts_in_db(self, continent_code: Optional[str] = None) -> dict[int, int]:
+        """Get the number of stored result rows per measurement ID.
+        
+        Args:
+            continent_code: Optional 2-character continent code (AF, SA, NA, etc.) to filter results.
+        """
+        if not self.session:
+            raise RuntimeError("Database session not initialized")
+        
+        try:
+            query = select(PingResultDB.measurement_id, func.count()).group_by(PingResultDB.measurement_id)
+            if continent_code:
+                query = query.where(PingResultDB.continent_code == continent_code)
+            result = await self.session.execute(query)
+            return {row[0]: row[1] for row in result.fetchall() if row[0] is not None}
+        except Exception as e:
+            logger.error(f"Failed to fetch result counts from DB: {e}")
+            return {}
+
+    async def get_final_fetched_ids(self, continent_code: str) -> set[int]:
+        """IDs of measurements whose results were fetched after they finished."""
+        if not self.session:
+            raise RuntimeError("Database session not initialized")
+        
+        try:
+            result = await self.session.execute(
+                text("SELECT measurement_id FROM measurement_fetches WHERE continent_code = :continent_code"),
+                {"continent_code": continent_code},
+            )
+            return {row[0] for row in result.fetchall()}
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Failed to fetch final fetch markers from DB: {e}")
+            return set()
+
+    async def mark_final_fetched(self, msm_ids: Iterable[int], continent_code: str) -> None:
+        """Record that these finished measurements were fetched, so they aren't re-fetched."""
+        if not self.session:
+            raise RuntimeError("Database session not initialized")
+        
+        params = [{"measurement_id": msm_id, "continent_code": continent_code} for msm_id in dict.fromkeys(msm_ids)]
+        if not params:
+            return
+        try:
+            await self.session.execute(
+                text("""
+                    INSERT INTO measurement_fetches (measurement_id, continent_code)
+                    VALUES (:measurement_id, :continent_code)
+                    ON CONFLICT (measurement_id, continent_code) DO UPDATE SET final_fetched_at = now()
+                """),
+                params,
+            )
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Failed to record final fetches in DB: {e}")
+
     # ============================================
     # DATABASE OPERATIONS
     # ============================================
     
+    async def refresh_target_stats(self, dst_addrs: Optional[Iterable[str]] = None) -> dict:
+        """Recompute per-target latency statistics into target_latency_stats.
+        
+        Targets that no longer have any qualifying rows lose their statistics.
+        
+        Args:
+            dst_addrs: Targets whose statistics changed. Only these are recomputed,
+                       using the dst_addr index. None recomputes every target.
+        """
+        if not self.session:
+            raise RuntimeError("Database session not initialized")
+        
+        params = {}
+        target_filter = ""
+        stale_filter = ""
+        if dst_addrs is not None:
+            params["dst_addrs"] = sorted({addr for addr in dst_addrs if addr})
+            if not params["dst_addrs"]:
+                return {"status": "success", "refreshed": 0, "removed": 0}
+            target_filter = "AND m.dst_addr = ANY(CAST(:dst_addrs AS inet[]))"
+            stale_filter = "AND dst_addr = ANY(CAST(:dst_addrs AS inet[]))"
+        
+        try:
+            result = await self.session.execute(text(f"""
+                With filter_records_by_rcvdPackets AS (
+                    SELECT
+                        m.*,
+                        i.asn,
+                        i.as_name,
+                        afp.probe_id as afp_probe_id,
+                        afp.country_code
+                    FROM measurements AS m
+                    JOIN ip_info AS i
+                        ON m.dst_addr = i.ip_address
+                    JOIN african_probes AS afp ON afp.probe_id = m.probe_id
+                    WHERE rcvd > 0 {target_filter}
+                )
+                INSERT INTO target_latency_stats AS s (
+                    dst_addr, n_samples, min_rtt_ms, max_rtt_ms, mean_rtt_ms, stddev_rtt_ms,
+                    p5_rtt_ms, p50_rtt_ms, p75_rtt_ms, p95_rtt_ms, ipr_95_5_ms, refreshed_at
+                )
+                SELECT 
+                    dst_addr,
+                    COUNT(*)                                  AS n_samples,
+                    MIN(m.avg_ms)                             AS min_rtt_ms,
+                    MAX(m.avg_ms)                             AS max_rtt_ms,
+                    AVG(m.avg_ms)                             AS mean_rtt_ms,
+                    STDDEV(m.avg_ms)                      AS stddev_rtt_ms,
+                    percentile_cont(0.05) WITHIN GROUP (ORDER BY m.avg_ms) AS p5_rtt_ms,
+                    percentile_cont(0.50) WITHIN GROUP (ORDER BY m.avg_ms) AS p50_rtt_ms,
+                    percentile_cont(0.75) WITHIN GROUP (ORDER BY m.avg_ms) AS p75_rtt_ms,
+                    percentile_cont(0.95) WITHIN GROUP (ORDER BY m.avg_ms) AS p95_rtt_ms,
+
+                -- spread metrics
+                (percentile_cont(0.95) WITHIN GROUP (ORDER BY m.avg_ms)
+                - percentile_cont(0.05) WITHIN GROUP (ORDER BY m.avg_ms)) AS ipr_95_5_ms,
+                    now()                                     AS refreshed_at
+                
+                FROM filter_records_by_rcvdPackets m
+                GROUP BY dst_addr
+                ON CONFLICT (dst_addr) DO UPDATE SET
+                    n_samples = EXCLUDED.n_samples,
+                    min_rtt_ms = EXCLUDED.min_rtt_ms,
+                    max_rtt_ms = EXCLUDED.max_rtt_ms,
+                    mean_rtt_ms = EXCLUDED.mean_rtt_ms,
+                    stddev_rtt_ms = EXCLUDED.stddev_rtt_ms,
+                    p5_rtt_ms = EXCLUDED.p5_rtt_ms,
+                    p50_rtt_ms = EXCLUDED.p50_rtt_ms,
+                    p75_rtt_ms = EXCLUDED.p75_rtt_ms,
+                    p95_rtt_ms = EXCLUDED.p95_rtt_ms,
+                    ipr_95_5_ms = EXCLUDED.ipr_95_5_ms,
+                    refreshed_at = EXCLUDED.refreshed_at
+            """), params)
+            # Rows the upsert didn't touch (refreshed_at is the transaction's now()) are stale
+            removed = await self.session.execute(text(f"""
+                DELETE FROM target_latency_stats
+                WHERE refreshed_at < now() {stale_filter}
+            """), params)
+            await self.session.commit()
+            return {"status": "success", "refreshed": result.rowcount, "removed": removed.rowcount}
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Failed to refresh target latency stats: {e}")
+            return {"status": "error", "message": str(e)}
+    
     async def get_measurements_for_target_analysis(self):
+        """Read per-target latency statistics maintained by refresh_target_stats."""
         result = await self.session.execute(text("""
-            With filter_records_by_rcvdPackets AS (
-                SELECT DISTINCT
-                    m.*,
-                    i.asn,
-                    i.as_name,
-                    afp.probe_id as afp_probe_id,
-                    afp.country_code
-                FROM measurements AS m
-                JOIN ip_info AS i
-                    ON m.dst_addr = i.ip_address
-                JOIN african_probes AS afp ON afp.probe_id = m.probe_id
-                WHERE rcvd > 0
-                --Select * from tmp_measurements_with_asn where rcvd > 0
-            )
-            SELECT 
-                dst_addr,
-                COUNT(*)                                  AS n_samples,
-                MIN(m.avg_ms)                             AS min_rtt_ms,
-                MAX(m.avg_ms)                             AS max_rtt_ms,
-                AVG(m.avg_ms)                             AS mean_rtt_ms,
-                STDDEV(m.avg_ms)                      AS stddev_rtt_ms,
-                percentile_cont(0.05) WITHIN GROUP (ORDER BY m.avg_ms) AS p5_rtt_ms,
-                percentile_cont(0.50) WITHIN GROUP (ORDER BY m.avg_ms) AS p50_rtt_ms,
-                percentile_cont(0.75) WITHIN GROUP (ORDER BY m.avg_ms) AS p75_rtt_ms,
-                percentile_cont(0.95) WITHIN GROUP (ORDER BY m.avg_ms) AS p95_rtt_ms,
-
-            -- spread metrics
-            (percentile_cont(0.95) WITHIN GROUP (ORDER BY m.avg_ms)
-            - percentile_cont(0.05) WITHIN GROUP (ORDER BY m.avg_ms)) AS ipr_95_5_ms
-            
-            FROM filter_records_by_rcvdPackets m
-            GROUP BY dst_addr
+            SELECT
+                dst_addr, n_samples, min_rtt_ms, max_rtt_ms, mean_rtt_ms, stddev_rtt_ms,
+                p5_rtt_ms, p50_rtt_ms, p75_rtt_ms, p95_rtt_ms, ipr_95_5_ms
+            FROM target_latency_stats
         """))
-        a = result.mappings().all()
-        return a
+        return result.mappings().all()
     
     
-    async def get_measurement(self, measurement_id: int) -> Optional[PingResultDB]:
-        """Get a measurement from the database."""
+    async def get_measurement(
+        self,
+        measurement_id: int,
+        after: Optional[tuple[int, Optional[int], int]] = None,
+        limit: int = 1000,
+    ) -> Optional[list[dict]]:
+        """Get one page of result rows of a measurement from the database.
+        
+        Rows are ordered by (probe_id, timestamp_unix, id), which follows the natural
+        key index. Rows without a timestamp come last for their probe; id breaks ties
+        between rows of the same probe and timestamp stored under different continents.
+        
+        Args:
+            measurement_id: RIPE Atlas measurement ID
+            after: Keyset cursor (probe_id, timestamp_unix or None, id) of the last row of the previous page
+            limit: Maximum number of rows in the page
+        """
         if not self.session:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = select(PingResultDB).where(PingResultDB.measurement_id == measurement_id)
+            table = PingResultDB.__table__
+            query = (
+                select(table)
+                .where(table.c.measurement_id == measurement_id)
+                .order_by(table.c.probe_id, table.c.timestamp_unix.asc().nulls_last(), table.c.id)
+                .limit(limit)
+            )
+            if after is not None:
+                query = query.where(_after_row(table, *after))
             result = await self.session.execute(query)
-            return result.scalars().all()
+            return [dict(row) for row in result.mappings().all()]
         except Exception as e:
             print(f"Error fetching measurement: {e}")
             return None
     
-    async def get_all_measurements(self) -> List[PingResultDB]:
-        """Get all measurements from the database."""
+    async def get_all_measurements(self, after_id: Optional[int] = None, limit: int = 1000) -> List[dict]:
+        """Get one page of result rows from the database, ordered by ID.
+        
+        Args:
+            after_id: Keyset cursor; only rows with a larger ID are returned
+            limit: Maximum number of rows in the page
+        """
         if not self.session:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = select(PingResultDB)
+            table = PingResultDB.__table__
+            query = select(table).order_by(table.c.id).limit(limit)
+            if after_id is not None:
+                query = query.where(table.c.id > after_id)
             result = await self.session.execute(query)
-            return result.scalars().all()
+            return [dict(row) for row in result.mappings().all()]
         except Exception as e:
             print(f"Error fetching measurements: {e}")
             return []
-    
\ No newline at end of file
+    
+    async def stream_measurement_rows(
+        self,
+        measurement_id: Optional[int] = None,
+        chunk_size: int = 5000,
+    ) -> AsyncIterator[list[dict]]:
+        """Stream result rows in chunks through a server-side cursor.
+        
+        Args:
+            measurement_id: Only stream rows of this measurement; None streams the whole table
+            chunk_size: Rows fetched from the cursor per round trip
+        """
+        if not self.session:
+            raise RuntimeError("Database session not initialized")
+        
+        table = PingResultDB.__table__
+        query = select(table)
+        if measurement_id is not None:
+            query = query.where(table.c.measurement_id == measurement_id).order_by(
+                table.c.probe_id, table.c.timestamp_unix
+            )
+        result = await self.session.stream(query.execution_options(yield_per=chunk_size))
+        async for partition in result.mappings().partitions(chunk_size):
+            yield [dict(row) for row in partition]
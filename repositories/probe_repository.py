@@ -5,7 +5,7 @@ from pathlib import Path
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert, delete, text
-from models.probe import Probe
+from models.probe import Probe, ProbeDB
 
 
 class ProbeRepository:
@@ -104,7 +104,7 @@ class ProbeRepository:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = insert(Probe).values(
+            query = insert(ProbeDB).values(
                 id=probe.id,
                 country_code=probe.country_code,
                 asn_v4=probe.asn_v4,
@@ -126,39 +126,46 @@ class ProbeRepository:
             await self.session.rollback()
             return {"status": "error", "message": str(e)}
     
-    async def get_probe(self, probe_id: int) -> Optional[Probe]:
+    async def get_probe(self, probe_id: int) -> Optional[ProbeDB]:
         """Get a probe from the database."""
         if not self.session:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = select(Probe).where(Probe.id == probe_id)
+            query = select(ProbeDB).where(ProbeDB.id == probe_id)
             result = await self.session.execute(query)
             return result.scalar_one_or_none()
         except Exception as e:
             print(f"Error fetching probe: {e}")
             return None
     
-    async def get_all_probes(self) -> List[Probe]:
-        """Get all probes from the database."""
+    async def get_all_probes(self, after_id: Optional[int] = None, limit: int = 1000) -> List[ProbeDB]:
+        """Get one page of probes from the database, ordered by ID.
+        
+        Args:
+            after_id: Keyset cursor; only probes with a larger ID are returned
+            limit: Maximum number of probes in the page
+        """
         if not self.session:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = select(Probe)
+            query = select(ProbeDB).order_by(ProbeDB.id).limit(limit)
+            if after_id is not None:
+                query = query.where(ProbeDB.id > after_id)
             result = await self.session.execute(query)
             return result.scalars().all()
         except Exception as e:
             print(f"Error fetching probes: {e}")
             return []
     
-    async def get_probes_by_country(self, country_code: str) -> List[Probe]:
+    async def get_probes_by_country(self, country_code: str) -> List[ProbeDB]:
         """Get all probes for a specific country."""
         if not self.session:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = select(Probe).where(Probe.country_code == country_code)
+            query = select(ProbeDB).where(ProbeDB.country_code == country_code)
             result = await self.session.execute(query)
             return result.scalars().all()
         except Exception as e:
@@ -171,7 +178,7 @@ class ProbeRepository:
             raise RuntimeError("Database session not initialized")
         
         try:
-            query = delete(Probe).where(Probe.id == probe_id)
+            query = delete(ProbeDB).where(ProbeDB.id == probe_id)
             await self.session.execute(query)
             await self.session.commit()
             return {"status": "success", "probe_id": probe_id}
@@ -1,7 +1,14 @@
 # atlas_client.py
+import asyncio
+import math
 import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import httpx
 
+from metrics import InstrumentedTransport
+
 RIPE_ATLAS_BASE_URL = os.getenv("RIPE_ATLAS_BASE_URL", "https://atlas.ripe.net/api/v2/")
 RIPE_ATLAS_API_KEY = os.getenv("RIPE_ATLAS_API_KEY")  # store securely in env
 
@@ -21,17 +28,36 @@ class RipeAtlasClient:
             base_url=base_url.rstrip("/"),
             headers={"Authorization": f"Key {api_key}", "Accept": "application/json"},
             timeout=timeout,
+            transport=InstrumentedTransport("ripe_atlas", base_url),
         )
 
-    async def get_probes(self, status: int = 1, page_size: int = 1000):
-        url = f"/probes/?status={status}&page_size={page_size}"
-        while url:
-            resp = await self._client.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-            for probe in data.get("results", []):
-                yield probe
-            url = data.get("next")
+    async def get_probes(self, status: Optional[int] = 1, page_size: int = 1000, concurrency: int = 4, **filters):
+        """Yield probes, fetching pages concurrently once the total count is known.
+
+        Extra keyword arguments are passed as API filters, e.g.
+        ``status_since__gte=<unix time>``. Pass ``status=None`` to include
+        probes in every status.
+        """
+        params = {"page_size": page_size, **filters}
+        if status is not None:
+            params["status"] = status
+
+        data = await self._get_probe_page(params, 1)
+        for probe in data.get("results", []):
+            yield probe
+
+        page_count = math.ceil((data.get("count") or 0) / page_size)
+        # Fetch the remaining pages in windows so at most `concurrency` are in flight
+        for first in range(2, page_count + 1, concurrency):
+            pages = range(first, min(first + concurrency, page_count + 1))
+            for data in await asyncio.gather(*(self._get_probe_page(params, page) for page in pages)):
+                for probe in data.get("results", []):
+                    yield probe
+
+    async def _get_probe_page(self, params: dict, page: int) -> dict:
+        resp = await self._client.get("/probes/", params={**params, "page": page})
+        resp.raise_for_status()
+        return resp.json()
 
     
     async def create_measurement(self, target, measurement_data: dict = None):
@@ -45,14 +71,18 @@ class RipeAtlasClient:
         
     
     async def get_measurement_result(self, id):
+        """Result list of a measurement; None if the request failed (as opposed to [] for no results)."""
         try:
             resp = await self._client.get(f"/measurements/{id}/results/")
             resp.raise_for_status()
             return resp.json()
-        except httpx.HTTPError as e:
-            logger.error(f"Error while fetching measurement {id}: error: {e}")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Error while fetching measurement results {id}: error: {e}")
             logger.error(f"details: {e.response.content}")
-            return []
+            return None
+        except httpx.HTTPError as e:
+            logger.error(f"Error while fetching measurement results {id}: error: {e}")
+            return None
         
     async def get_measurement(self, id):
         try:
@@ -63,9 +93,47 @@ class RipeAtlasClient:
             logger.error(f"Error while fetching measurement {id}: error: {e}")
             logger.error(f"details: {e.response.content}")
             return []
-    
+
+    async def get_measurements(self, ids, fields: str = "id,status,participant_count,probes_scheduled,stop_time", page_size: int = 500):
+        """Fetch measurement metadata for many IDs through the list endpoint.
+
+        IDs are sent in chunks of ``page_size`` using the ``id__in`` filter,
+        so one request covers a whole chunk instead of one call per ID.
+        """
+        ids = [int(msm_id) for msm_id in ids]
+        for start in range(0, len(ids), page_size):
+            chunk = ids[start:start + page_size]
+            params = {
+                "id__in": ",".join(str(msm_id) for msm_id in chunk),
+                "fields": fields,
+                "page_size": page_size,
+            }
+            url = "/measurements/"
+            while url:
+                resp = await self._client.get(url, params=params)
+                resp.raise_for_status()
+                data = resp.json()
+                for measurement in data.get("results", []):
+                    yield measurement
+                url = data.get("next")
+                # The "next" link already carries the query string
+                params = None
 
 
     async def aclose(self): await self._client.aclose()
     async def __aenter__(self): return self
     async def __aexit__(self, exc_type, exc, tb): await self.aclose()
+
+
+@asynccontextmanager
+async def atlas_client(client: Optional[RipeAtlasClient] = None):
+    """Yield the shared client left open, or a new RipeAtlasClient closed on exit.
+
+    Services get the API's process-wide client (app.state.ripe_atlas)
+    injected; scripts and tests without one fall back to a client per call.
+    """
+    if client is not None:
+        yield client
+    else:
+        async with RipeAtlasClient() as own_client:
+            yield own_client
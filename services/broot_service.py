@@ -5,12 +5,13 @@ import logging
 import os
 import shutil
 import subprocess
+import time
 from pathlib import Path
 
-from sqlalchemy import text
-
 from db.db import AsyncSessionLocal
-from ip_info_client import IpinfoClient
+from ip_lookup_cache import CachedIpinfoClient
+from metrics import BROOT_BYTES, BROOT_FILES, BROOT_LINES, BROOT_MATCHES, BROOT_SCAN_SECONDS
+from services.enrichment_service import EnrichmentService, GeoIpDbSource, IpinfoSource
 
 
 logger = logging.getLogger("ripe_atlas")
@@ -98,7 +99,7 @@ class BRootService:
     def __init__(
         self,
         db_session_factory=AsyncSessionLocal,
-        ipinfo_client_factory=IpinfoClient,
+        ipinfo_client_factory=CachedIpinfoClient,
     ) -> None:
         self.project_root = Path(__file__).resolve().parent.parent
         self.base_data_root = self.project_root / "data" / "b-root-analysis"
@@ -106,8 +107,7 @@ class BRootService:
         self.result_root = self.base_data_root / "results"
         self.db_session_factory = db_session_factory
         self.ipinfo_client_factory = ipinfo_client_factory
-        self._db_session = None
-        self._ipinfo_client = None
+        self._enrichment = None
 
     def download_hour(self, hour: int) -> dict:
         username = os.environ["BROOT_USER"]
@@ -227,89 +227,21 @@ class BRootService:
         )
 
     async def _lookup_ip_details(self, source_ips: set[str]) -> dict[str, dict[str, str]]:
-        if not self._db_session or not self._ipinfo_client:
+        if not self._enrichment:
             raise RuntimeError("Lookup dependencies are not initialized")
 
         if not source_ips:
             return {}
 
-        ip_details_by_ip = await self._lookup_ip_details_from_db(source_ips)
-        missing_ips = [
-            ip for ip, details in ip_details_by_ip.items()
-            if not details["continent_code"] or not details["country"]
-        ]
-
-        if missing_ips:
-            fallback_details = await self._lookup_ip_details_from_ipinfo(missing_ips)
-            for ip in missing_ips:
-                ip_details_by_ip[ip] = {
-                    "continent_code": ip_details_by_ip[ip]["continent_code"] or fallback_details[ip]["continent_code"],
-                    "country": ip_details_by_ip[ip]["country"] or fallback_details[ip]["country"],
-                }
-
-        return ip_details_by_ip
-
-    async def _lookup_ip_details_from_db(self, source_ips: set[str]) -> dict[str, dict[str, str]]:
-        ip_list = sorted(source_ips)
-        params = {}
-        values = []
-
-        for index, ip in enumerate(ip_list):
-            placeholder = f"ip_{index}"
-            params[placeholder] = ip
-            values.append(f"(CAST(:{placeholder} AS inet))")
-
-        query = text(f"""
-            WITH ips(ip) AS (
-                VALUES {", ".join(values)}
-            )
-            SELECT DISTINCT ON (ips.ip)
-                host(ips.ip) AS source_ip,
-                l.continent_code,
-                l.country_name
-            FROM ips
-            LEFT JOIN geoip2_network AS n
-                ON n.network >>= ips.ip
-            LEFT JOIN geoip2_location AS l
-                ON l.geoname_id = n.geoname_id
-               AND l.locale_code = 'en'
-            ORDER BY ips.ip, masklen(n.network) DESC NULLS LAST
-        """)
-
-        result = await self._db_session.execute(query, params)
-        rows = result.mappings().all()
-        ip_details_by_ip = {
-            row["source_ip"]: {
-                "continent_code": row["continent_code"] or "",
-                "country": row["country_name"] or "",
+        enrichment_by_ip = await self._enrichment.lookup_many(source_ips)
+        return {
+            ip: {
+                "continent_code": result.continent_code or "",
+                "country": result.country or "",
             }
-            for row in rows
+            for ip, result in enrichment_by_ip.items()
         }
 
-        for source_ip in source_ips:
-            ip_details_by_ip.setdefault(source_ip, {"continent_code": "", "country": ""})
-
-        return ip_details_by_ip
-
-    async def _lookup_ip_details_from_ipinfo(self, source_ips: list[str]) -> dict[str, dict[str, str]]:
-        ip_details_by_ip = {}
-
-        for index, ip in enumerate(sorted(source_ips), start=1):
-            try:
-                data = await self._ipinfo_client.lookup(ip)
-                ip_details_by_ip[ip] = {
-                    "continent_code": data.get("continent_code", ""),
-                    "country": data.get("country", ""),
-                }
-            except Exception as error:
-                logger.warning("Ipinfo lookup failed for %s: %s", ip, error)
-                ip_details_by_ip[ip] = {"continent_code": "", "country": ""}
-
-            if index % 10 == 0 and index < len(source_ips):
-                await asyncio.sleep(2)
-
-        return ip_details_by_ip
-
     async def _collect_matches(
         self,
         downloaded_files: list[Path],
@@ -317,9 +249,13 @@ class BRootService:
         matches = []
         file_summaries = []
         try:
-            async with self.db_session_factory() as session, self.ipinfo_client_factory() as ipinfo:
-                self._db_session = session
-                self._ipinfo_client = ipinfo
+            # Postgres GeoIP2 tables first, ipinfo for what they leave empty
+            sources = [
+                GeoIpDbSource(session_factory=self.db_session_factory),
+                IpinfoSource(client_factory=self.ipinfo_client_factory),
+            ]
+            async with EnrichmentService(sources, required_fields=("continent_code", "country")) as enrichment:
+                self._enrichment = enrichment
 
                 for filepath in downloaded_files:
                     file_matches = await self._analyze_file(filepath)
@@ -336,13 +272,14 @@ class BRootService:
                 logger.info("B-root total matches across %d files: %d", len(downloaded_files), len(matches))
                 return matches, len({match["source_ip"] for match in matches}), file_summaries
         finally:
-            self._db_session = None
-            self._ipinfo_client = None
+            self._enrichment = None
 
     async def _analyze_file(self, filepath: Path) -> list[dict]:
         matches = []
+        line_count = 0
+        started = time.perf_counter()
         with lzma.open(filepath, mode="rt", encoding="utf-8", errors="replace") as file:
-            for line in file:
+            for line_count, line in enumerate(file, 1):
                 if not line or line.startswith("#"):
                     continue
 
@@ -369,6 +306,13 @@ class BRootService:
                         }
                     )
 
+        # Counters are updated once per file to keep the per-line loop free of metric calls
+        BROOT_SCAN_SECONDS.observe(time.perf_counter() - started)
+        BROOT_FILES.inc()
+        BROOT_LINES.inc(line_count)
+        BROOT_BYTES.inc(filepath.stat().st_size)
+        BROOT_MATCHES.inc(len(matches))
+
         ip_details_by_ip = await self._lookup_ip_details({match["source_ip"] for match in matches})
         for match in matches:
             ip_details = ip_details_by_ip.get(
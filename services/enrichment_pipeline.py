@@ -0,0 +1,208 @@
+"""Concurrent, rate-limited IP enrichment with a SQLite checkpoint store."""
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger("ripe_atlas")
+
+LookupFunc = Callable[[str], Awaitable[Optional[dict]]]
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CheckpointStore:
+    """Enrichment results per (source, ip) in an indexed SQLite table.
+
+    Lets a run skip IPs that are already done without re-reading output
+    files, and keeps failed lookups apart so they can be retried.
+    """
+
+    def __init__(self, path: str = "data/enrichment/checkpoints.sqlite"):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS enrichment (
+                source TEXT NOT NULL,
+                ip TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (source, ip)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def count(self, source: str) -> int:
+        return self._conn.execute("SELECT count(*) FROM enrichment WHERE source = ?", (source,)).fetchone()[0]
+
+    def done(self, source: str, ips: Iterable[str], chunk_size: int = 500) -> set[str]:
+        """IPs from `ips` that already have a successful result."""
+        ips = list(ips)
+        found = set()
+        for start in range(0, len(ips), chunk_size):
+            chunk = ips[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT ip FROM enrichment WHERE source = ? AND status = 'ok' AND ip IN ({placeholders})",
+                (source, *chunk),
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def put_many(self, source: str, results: list[tuple[str, str, Optional[dict]]]) -> None:
+        """Store (ip, status, data) rows, replacing earlier results."""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO enrichment (source, ip, status, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(source, ip, status, json.dumps(data) if data is not None else None, now) for ip, status, data in results],
+        )
+        self._conn.commit()
+
+    def results(self, source: str) -> Iterable[tuple[str, dict]]:
+        """All successful (ip, data) results for a source, in insertion order."""
+        rows = self._conn.execute(
+            "SELECT ip, data FROM enrichment WHERE source = ? AND status = 'ok' ORDER BY rowid", (source,)
+        )
+        for ip, data in rows:
+            yield ip, json.loads(data)
+
+    def import_csv(self, source: str, csv_path: str, ip_field: str) -> int:
+        """Seed the store from an output CSV written by an earlier run."""
+        if not os.path.exists(csv_path) or self.count(source):
+            return 0
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = [(row[ip_field], "ok", row) for row in csv.DictReader(f) if row.get(ip_field)]
+        self.put_many(source, rows)
+        logger.info(f"Imported {len(rows)} {source} results from {csv_path}")
+        return len(rows)
+
+
+class EnrichmentPipeline:
+    """Looks up many IPs with bounded concurrency and a shared rate limit.
+
+    Successful results and failures are written to the checkpoint store
+    every `flush_every` lookups, so an interrupted run resumes where it
+    stopped and a finished IP is never looked up again.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        lookup: LookupFunc,
+        store: CheckpointStore,
+        concurrency: int = 8,
+        rate_per_sec: Optional[float] = None,
+        flush_every: int = 100,
+    ):
+        self.source = source
+        self.lookup = lookup
+        self.store = store
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate_per_sec) if rate_per_sec else None
+        self.flush_every = flush_every
+
+    async def _lookup_one(self, ip: str) -> tuple[str, str, Optional[dict]]:
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+        try:
+            data = await self.lookup(ip)
+        except Exception as e:
+            logger.warning(f"{self.source} lookup failed for {ip}: {e}")
+            return ip, "error", {"error": str(e)}
+        if not data:
+            return ip, "empty", None
+        return ip, "ok", data
+
+    async def run(self, ips: Iterable[str]) -> dict[str, Any]:
+        ips = list(dict.fromkeys(ip for ip in ips if ip))
+        done = self.store.done(self.source, ips)
+        pending = [ip for ip in ips if ip not in done]
+        stats = {"seen": len(ips), "skipped_existing": len(done), "written": 0, "errors": 0}
+        if not pending:
+            logger.info(f"Nothing to do: all {len(ips)} IPs already enriched from {self.source}")
+            return stats
+
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        for ip in pending:
+            queue.put_nowait(ip)
+        buffer: list[tuple[str, str, Optional[dict]]] = []
+
+        def flush() -> None:
+            if buffer:
+                self.store.put_many(self.source, buffer)
+                buffer.clear()
+
+        async def worker() -> None:
+            while True:
+                try:
+                    ip = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                ip, status, data = await self._lookup_one(ip)
+                buffer.append((ip, status, data))
+                if status == "ok":
+                    stats["written"] += 1
+                else:
+                    stats["errors"] += 1
+                if len(buffer) >= self.flush_every:
+                    flush()
+                    logger.info(f"{self.source}: {stats['written'] + stats['errors']}/{len(pending)} IPs processed")
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)))))
+        finally:
+            flush()
+
+        logger.info(
+            f"{self.source} done. Seen={stats['seen']}, Skipped(existing)={stats['skipped_existing']}, "
+            f"Written={stats['written']}, Errors={stats['errors']}"
+        )
+        return stats
+
+
+def export_results_csv(store: CheckpointStore, source: str, csv_path: str, fieldnames: list[str], row_builder: Callable[[str, dict], dict]) -> int:
+    """Rewrite csv_path with all successful results of a source."""
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    tmp_path = f"{csv_path}.tmp"
+    count = 0
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for ip, data in store.results(source):
+            writer.writerow(row_builder(ip, data))
+            count += 1
+    os.replace(tmp_path, csv_path)
+    return count
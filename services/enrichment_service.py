@@ -0,0 +1,371 @@
+"""Geo/ASN enrichment of IP addresses through a configurable chain of sources."""
+import asyncio
+import ipaddress
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Iterable, Optional, Sequence
+
+from sqlalchemy import text
+
+from db.db import AsyncSessionLocal
+from ip_info_client import IpinfoClient
+from ip_lookup_cache import CachedGeoLiteClient, CachedIpinfoClient
+
+logger = logging.getLogger("ripe_atlas")
+
+# Comma-separated source names (env ENRICHMENT_SOURCES), queried in order: local index -> DB -> remote APIs
+DEFAULT_ENRICHMENT_SOURCES = "geolite,geoip_db,ipinfo"
+DEFAULT_REQUIRED_FIELDS = ("asn", "country_code", "continent_code")
+
+
+@dataclass(slots=True)
+class IpEnrichment:
+    """Geo/ASN attributes of one IP, merged from the sources that answered."""
+
+    ip: str
+    asn: Optional[int] = None
+    as_name: Optional[str] = None
+    as_domain: Optional[str] = None
+    network: Optional[str] = None
+    country_code: Optional[str] = None
+    country: Optional[str] = None
+    continent_code: Optional[str] = None
+    continent: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    sources: list[str] = field(default_factory=list)
+
+    def missing(self, required: Iterable[str]) -> bool:
+        return any(getattr(self, name) in (None, "") for name in required)
+
+    def merge(self, source: str, data: dict[str, Any]) -> bool:
+        """Fill empty attributes from data; earlier sources win. True if anything was filled."""
+        filled = False
+        for name, value in data.items():
+            if value in (None, "") or name in ("ip", "sources") or getattr(self, name, "") not in (None, ""):
+                continue
+            setattr(self, name, value)
+            filled = True
+        if filled:
+            self.sources.append(source)
+        return filled
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+_ATTRIBUTES = frozenset(f.name for f in fields(IpEnrichment)) - {"ip", "sources"}
+
+
+def parse_asn(value: Any) -> Optional[int]:
+    """ASN as an integer from 15169, '15169' or 'AS15169'."""
+    if value in (None, ""):
+        return None
+    try:
+        return int(str(value).upper().removeprefix("AS"))
+    except ValueError:
+        return None
+
+
+class EnrichmentSource:
+    """One lookup source in the chain, with its own latency budget and concurrency.
+
+    The service hands the source at most batch_size IPs per lookup_many
+    call, and timeout is the budget of one such call.
+    """
+
+    name = ""
+
+    def __init__(self, timeout: float, concurrency: int, batch_size: int):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def lookup_many(self, ips: list[str]) -> dict[str, dict[str, Any]]:
+        """IpEnrichment attributes per IP; IPs without an answer may be left out."""
+        raise NotImplementedError
+
+
+class AsnDbSource(EnrichmentSource):
+    """Local prefix-to-AS database (see asn_database.py); ASN and AS name only."""
+
+    name = "asn_db"
+
+    def __init__(self, timeout: float = 5.0, concurrency: int = 1, path: Optional[str] = None, batch_size: int = 50_000):
+        super().__init__(timeout, concurrency, batch_size)
+        self.path = path
+        self._database = None
+
+    async def open(self) -> None:
+        # numpy/pandas are only needed once this source is configured
+        from asn_database import ASN_DB_PATH, get_asn_database
+
+        self._database = get_asn_database(self.path or ASN_DB_PATH)
+
+    async def lookup_many(self, ips: list[str]) -> dict[str, dict[str, Any]]:
+        results = {}
+        for ip, record in self._database.lookup_many(ips).items():
+            if record is not None:
+                results[ip] = {
+                    "asn": record.asn,
+                    "as_name": record.org_name or record.as_name,
+                    "network": record.network,
+                }
+        return results
+
+
+class GeoLiteSource(EnrichmentSource):
+    """GeoLite2 City/ASN; a local index with GEO_LITE_BACKEND=mmdb, the web service otherwise."""
+
+    name = "geolite"
+
+    def __init__(self, timeout: float = 10.0, concurrency: int = 16, client_factory=CachedGeoLiteClient, batch_size: int = 256):
+        super().__init__(timeout, concurrency, batch_size)
+        self.client_factory = client_factory
+        self._client = None
+
+    async def open(self) -> None:
+        self._client = self.client_factory()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def lookup_many(self, ips: list[str]) -> dict[str, dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def lookup_one(ip):
+            async with semaphore:
+                return ip, await self._client.city(ip)
+
+        results = {}
+        for ip, result in await asyncio.gather(*(lookup_one(ip) for ip in ips)):
+            if result is None:
+                continue
+            results[ip] = {
+                "asn": result.as_num,
+                "as_name": result.as_org,
+                "network": result.network,
+                "country_code": result.country_iso,
+                "country": result.country,
+                "continent_code": result.continent_code,
+                "continent": result.continent,
+                "latitude": result.latitude,
+                "longitude": result.longitude,
+            }
+        return results
+
+
+class GeoIpDbSource(EnrichmentSource):
+    """GeoIP2 City tables in Postgres (see sql/geolite_setup.sql), most specific network first."""
+
+    name = "geoip_db"
+
+    def __init__(self, timeout: float = 10.0, concurrency: int = 1, session_factory=AsyncSessionLocal, chunk_size: int = 1000):
+        # One query per call: the service hands over chunk_size IPs at a time
+        super().__init__(timeout, concurrency, chunk_size)
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+
+    async def lookup_many(self, ips: list[str]) -> dict[str, dict[str, Any]]:
+        # One invalid address would fail the whole CAST
+        valid = []
+        for ip in ips:
+            try:
+                ipaddress.ip_address(ip)
+            except ValueError:
+                continue
+            valid.append(ip)
+
+        results = {}
+        # A session per call: a timeout or SQL error closes (and rolls back) it
+        # instead of leaving an aborted transaction for the next batch.
+        # A single session can't run statements concurrently, so chunks go one by one
+        async with self.session_factory() as session:
+            for start in range(0, len(valid), self.chunk_size):
+                chunk = valid[start:start + self.chunk_size]
+                params = {f"ip_{index}": ip for index, ip in enumerate(chunk)}
+                values = ", ".join(f"(CAST(:ip_{index} AS inet))" for index in range(len(chunk)))
+                query = text(f"""
+                    WITH ips(ip) AS (
+                        VALUES {values}
+                    )
+                    SELECT DISTINCT ON (ips.ip)
+                        host(ips.ip) AS source_ip,
+                        n.network::text AS network,
+                        n.latitude,
+                        n.longitude,
+                        l.continent_code,
+                        l.continent_name,
+                        l.country_iso_code,
+                        l.country_name
+                    FROM ips
+                    LEFT JOIN geoip2_network AS n
+                        ON n.network >>= ips.ip
+                    LEFT JOIN geoip2_location AS l
+                        ON l.geoname_id = n.geoname_id
+                       AND l.locale_code = 'en'
+                    ORDER BY ips.ip, masklen(n.network) DESC NULLS LAST
+                """)
+                rows = (await session.execute(query, params)).mappings().all()
+                for row in rows:
+                    results[row["source_ip"]] = {
+                        "network": row["network"],
+                        "latitude": float(row["latitude"]) if row["latitude"] is not None else None,
+                        "longitude": float(row["longitude"]) if row["longitude"] is not None else None,
+                        "continent_code": row["continent_code"],
+                        "continent": row["continent_name"],
+                        "country_code": row["country_iso_code"],
+                        "country": row["country_name"],
+                    }
+        return results
+
+
+class IpinfoSource(EnrichmentSource):
+    """ipinfo Lite, batched through IpinfoClient.lookup_many."""
+
+    name = "ipinfo"
+
+    def __init__(self, timeout: float = 60.0, concurrency: int = 10, client_factory=CachedIpinfoClient, batch_size: int = IpinfoClient.BATCH_SIZE):
+        # One batch request per call, or batch_size / concurrency rounds of single lookups
+        super().__init__(timeout, concurrency, batch_size)
+        self.client_factory = client_factory
+        self._client = None
+
+    async def open(self) -> None:
+        self._client = self.client_factory()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def lookup_many(self, ips: list[str]) -> dict[str, dict[str, Any]]:
+        data_by_ip = await self._client.lookup_many(ips, concurrency=self.concurrency)
+        results = {}
+        for ip, data in data_by_ip.items():
+            if not data:
+                continue
+            result = {key: value for key, value in data.items() if key in _ATTRIBUTES}
+            result["asn"] = parse_asn(data.get("asn"))
+            results[ip] = result
+        return results
+
+
+SOURCES = {source.name: source for source in (AsnDbSource, GeoLiteSource, GeoIpDbSource, IpinfoSource)}
+
+
+def create_sources(names: Optional[Sequence[str]] = None) -> list[EnrichmentSource]:
+    """Source chain from names (default: env ENRICHMENT_SOURCES), each with its default budget."""
+    if names is None:
+        configured = os.getenv("ENRICHMENT_SOURCES", DEFAULT_ENRICHMENT_SOURCES)
+        names = [name.strip() for name in configured.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown enrichment sources {unknown}; expected some of {sorted(SOURCES)}")
+    return [SOURCES[name]() for name in names]
+
+
+@dataclass
+class SourceStats:
+    """Calls, answered IPs and latency of one source."""
+
+    calls: int = 0
+    ips: int = 0
+    filled: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "ips": self.ips,
+            "filled": self.filled,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_call_ms": round(self.seconds / self.calls * 1000, 2) if self.calls else None,
+        }
+
+
+class EnrichmentService:
+    """Enriches IPs by asking each source in turn for the IPs still incomplete.
+
+    An IP moves on to the next source while any of `required_fields` is
+    empty; attributes already set by an earlier source are kept. Each source
+    gets the pending IPs in chunks of its batch_size; a chunk that exceeds
+    the source's timeout or fails is skipped (its IPs move on to the next
+    source) while the answers of the other chunks are kept, so one slow
+    upstream call can't hold up the whole chain.
+
+    Use as an async context manager so the sources' clients are opened
+    once and closed afterwards.
+    """
+
+    def __init__(self, sources: Optional[Sequence[EnrichmentSource]] = None, required_fields: Sequence[str] = DEFAULT_REQUIRED_FIELDS):
+        self.sources = list(sources) if sources is not None else create_sources()
+        self.required_fields = tuple(required_fields)
+        self._stats = {source.name: SourceStats() for source in self.sources}
+
+    async def __aenter__(self):
+        opened = []
+        try:
+            for source in self.sources:
+                await source.open()
+                opened.append(source)
+        except BaseException:
+            for source in opened:
+                await source.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for source in self.sources:
+            try:
+                await source.close()
+            except Exception as e:
+                logger.warning(f"Closing enrichment source {source.name} failed: {e}")
+
+    async def lookup_many(self, ips: Iterable[str]) -> dict[str, IpEnrichment]:
+        results = {ip: IpEnrichment(ip) for ip in dict.fromkeys(ip for ip in ips if ip)}
+        for source in self.sources:
+            pending = [ip for ip, result in results.items() if result.missing(self.required_fields)]
+            if not pending:
+                break
+            stats = self._stats[source.name]
+            answers = {}
+            for start in range(0, len(pending), source.batch_size):
+                chunk = pending[start:start + source.batch_size]
+                stats.calls += 1
+                started = time.perf_counter()
+                try:
+                    answers.update(await asyncio.wait_for(source.lookup_many(chunk), source.timeout))
+                except asyncio.TimeoutError:
+                    stats.timeouts += 1
+                    logger.warning(f"Enrichment source {source.name} exceeded {source.timeout}s for {len(chunk)} IPs, skipping them")
+                except Exception as e:
+                    stats.errors += 1
+                    logger.warning(f"Enrichment source {source.name} failed for {len(chunk)} IPs: {e}")
+                finally:
+                    stats.seconds += time.perf_counter() - started
+
+            stats.ips += len(answers)
+            for ip, data in answers.items():
+                if ip in results and results[ip].merge(source.name, data):
+                    stats.filled += 1
+        return results
+
+    async def lookup(self, ip: str) -> IpEnrichment:
+        return (await self.lookup_many([ip]))[ip]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
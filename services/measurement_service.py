@@ -5,10 +5,10 @@ from typing import Literal, AsyncGenerator, Optional, List
 from fastapi import Path
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from anycast_ip_collection import get_anycast_ips
 from models.measurement import Measurement, PingResult, PingResultDB
 from repositories.measurement_repository import MeasurementRepository
-from ripe_atlas_client import RipeAtlasClient
+from ripe_atlas_client import RipeAtlasClient, atlas_client
+from services.measurement_tracker import MeasurementTracker
 from services.probe_service import ProbeService
 import os
 import json
@@ -19,14 +19,32 @@ VALID_CONTINENT_CODES = ["AF", "SA", "NA", "AS"]
 class MeasurementService:
     """Service for managing and processing measurements."""
     
-    def __init__(self, probe_service: ProbeService, measurement_repository: MeasurementRepository):
-        """Initialize the MeasurementService."""
+    def __init__(
+        self,
+        probe_service: ProbeService,
+        measurement_repository: MeasurementRepository,
+        client: Optional[RipeAtlasClient] = None,
+    ):
+        """Initialize the MeasurementService.
+        
+        client: the API's shared RipeAtlasClient for reading measurements; None opens one per call.
+        Measurements are created with a separate client per RIPE_ATLAS_API_KEYS key.
+        """
         self.probe_service = probe_service
         self.repo = measurement_repository
+        self.client = client
         self.rate_limit_count = 90  # Number of requests before sleeping
         self.rate_limit_sleep = 800   # Sleep duration in seconds
+        self.copy_batch_rows = 50_000  # Rows buffered before one COPY into the DB
         self.initialize_key_list()
-        self.ripe_client = RipeAtlasClient(api_key=self.get_api_key())
+        self._ripe_client: Optional[RipeAtlasClient] = None
+    
+    @property
+    def ripe_client(self) -> RipeAtlasClient:
+        """Client with the current measurement-creation key, opened on first use."""
+        if self._ripe_client is None:
+            self._ripe_client = RipeAtlasClient(api_key=self.get_api_key())
+        return self._ripe_client
         
     def initialize_key_list(self) -> list: 
         """Get a dictionary of RIPE Atlas API keys."""
@@ -94,7 +112,7 @@ class MeasurementService:
                     
                     logger.info(f"Switching to next API key and retrying target {target}...")
                     await self.ripe_client.aclose()
-                    self.ripe_client = RipeAtlasClient(api_key)
+                    self._ripe_client = RipeAtlasClient(api_key)
                     # Continue loop to retry with new key
                 else:
                     logger.error(f"Unexpected error: {e}")
@@ -103,29 +121,43 @@ class MeasurementService:
     async def create_measurements(
         self,
         continent_code: str = "AF",
-        measurement_type: Literal["ping", "traceroute"] = "ping"
+        measurement_type: Literal["ping", "traceroute"] = "ping",
+        census_date: Optional[str] = None,
+        threshold: int = 10,
+        only_new: bool = False,
+        af: int = 4,
     ) -> dict:
-        """Create measurements for multiple targets with rate limiting."""
+        """Create measurements for multiple targets with rate limiting.
+        
+        With only_new, targets are limited to prefixes that were added or
+        got a different responsive IP since the previous census snapshot
+        with the same threshold. With af=6 the targets come from the IPv6
+        census and only IPv6-capable probes are used.
+        """
         if continent_code not in VALID_CONTINENT_CODES:
             return {"status": "error", "message": "Invalid continent code"}
 
         # Check what's already done
         measurements_csv = f"data/measurements/measurements_{continent_code.lower()}.csv"
-        targets = get_anycast_ips(10)
+        # The census pipeline needs pandas; import it on first use, not at app startup
+        from anycast_ip_collection import DEFAULT_CENSUS_DATE
+
+        census_date = census_date or DEFAULT_CENSUS_DATE
+        targets = self.get_target_ips(census_date, threshold, only_new, af)
         
         existing_measurements = self.repo.read_all_measurements(measurements_csv)
         
-        if len(existing_measurements) >= len(targets):
+        # Filter out targets that already have measurements
+        targets_to_process = [t for t in targets if t not in existing_measurements]
+        
+        if not targets_to_process:
             return {
                 "status": "complete",
                 "message": "All measurements have already been created.",
                 "created": 0,
             }
         
-        # Filter out targets that already have measurements
-        targets_to_process = [t for t in targets if t not in existing_measurements]
-        
-        probes = await self.probe_service.get_filtered_probes(continent_code)
+        probes = await self.probe_service.get_filtered_probes(continent_code, af=af)
         if not probes:
             return {
                 "status": "complete",
@@ -171,6 +203,25 @@ class MeasurementService:
             "status": "success",
         }
     
+    def get_target_ips(self, census_date: str, threshold: int = 10, only_new: bool = False, af: int = 4) -> list[str]:
+        """Target IPs of a census snapshot, or only its new targets versus the previous snapshot."""
+        from anycast_ip_collection import get_anycast_targets
+        from repositories.anycast_target_repository import AnycastTargetRepository
+
+        targets = get_anycast_targets(threshold, census_date, af)
+        if not only_new:
+            return targets["ip"].drop_duplicates().tolist()
+        
+        target_repo = AnycastTargetRepository()
+        previous_date = target_repo.previous_snapshot(census_date, threshold, af)
+        if previous_date is None:
+            logger.info(f"No IPv{af} snapshot before {census_date} (sites > {threshold}), using all targets")
+            return targets["ip"].drop_duplicates().tolist()
+        
+        diff = target_repo.diff(target_repo.read_snapshot(previous_date, threshold, af), targets)
+        logger.info(f"IPv{af} target diff {previous_date} -> {census_date} (sites > {threshold}): {diff.summary()}")
+        return list(dict.fromkeys(diff.new_target_ips))
+    
     def _build_measurement_data(
         self,
         target: str,
@@ -179,13 +230,15 @@ class MeasurementService:
         measurement_type: Literal["ping", "traceroute"] = "ping"
     ) -> dict:
         """Build measurement data structure for RIPE Atlas API."""
+        from prefix_index import address_family
+
         return {
             "definitions": [
                 {
                     "target": target,
                     "description": f"{measurement_type} measurement for {target}",
                     "type": measurement_type,
-                    "af": "4",
+                    "af": str(address_family(target)),
                     "is_oneoff": True,
                 }
             ],
@@ -224,12 +277,14 @@ class MeasurementService:
         failed_measurements = []
         measurements_count = 0
         
-        async with RipeAtlasClient() as client:
+        async with atlas_client(self.client) as client:
             for msm_id in measurements_to_fetch:
                 logger.info(f"Fetching results for measurement {msm_id}")
                 
                 try:
                     response = await client.get_measurement_result(msm_id)
+                    if response is None:
+                        failed_measurements.append(msm_id)
                     
                     if response:
                         ping_results = [
@@ -269,7 +324,9 @@ class MeasurementService:
         continent_code: str = "AF",
     ) -> dict:
         """Fetch measurement results using DB to track already-fetched measurements.
-                Checks DB for existing measurement IDs and fetches only missing ones.
+                Polls measurement status in bulk first and only fetches finished
+                measurements. Measurements stored while still running are re-fetched
+                once after they finish; rows already in the DB are skipped on insert.
         """
         if continent_code not in VALID_CONTINENT_CODES:
             return {"status": "error", "message": "Invalid continent code"}
@@ -277,42 +334,49 @@ class MeasurementService:
         measurements_csv = f"data/measurements/measurements_{continent_code.lower()}.csv"
         all_measurements = self.repo.read_all_measurements(measurements_csv)
         
-        results_csv = f"data/measurements/measurement_details_{continent_code.lower()}.csv"
-        already_fetched = self.repo.read_fetched_results(results_csv)
-        
-        already_fetched_in_db = await self.repo.get_existing_measurement_ids_in_db(continent_code=continent_code)
-        
-        measurements_to_fetch = [
-            msm_id for msm_id in all_measurements.values()
-            if msm_id not in already_fetched_in_db
-        ]
-        
-        logger.info(f"Fetching results for {len(measurements_to_fetch)} measurements (DB-based tracking)")
+        stored_counts = await self.repo.get_result_counts_in_db(continent_code=continent_code)
+        final_fetched = await self.repo.get_final_fetched_ids(continent_code)
         
         total_rows_saved = 0
         failed_measurements = []
+        fetched_ids = []
         measurements_count = 0
         
-        async with RipeAtlasClient() as client:
+        async with atlas_client(self.client) as client:
+            tracker = MeasurementTracker(client)
+            plan = await tracker.plan(all_measurements.values(), stored_counts, final_fetched)
+            measurements_to_fetch = plan.to_fetch + plan.to_refetch
+            buffered_results: list[PingResult] = []
+            buffered_ids: list[int] = []
+            
+            logger.info(f"Fetching results for {len(measurements_to_fetch)} measurements (DB-based tracking)")
+            
             for msm_id in measurements_to_fetch:
                 logger.info(f"Fetching results for measurement {msm_id}")
                 
                 try:
                     response = await client.get_measurement_result(msm_id)
                     
-                    if response:
+                    if response is None:
+                        # Request failed; retried on the next run
+                        failed_measurements.append(msm_id)
+                    elif response:
                         ping_results = [
                             PingResult.from_api_response(result_data, continent_code=continent_code)
                             for result_data in response
                         ]
                         
-                        db_save = await self.repo.write_ping_results_to_db(ping_results)
-                        if db_save["status"] == "success":
-                            total_rows_saved += db_save["saved"]
-                            logger.info(f"Saved measurement {msm_id} with {db_save['saved']} rows to DB")
-                        else:
-                            logger.error(f"Failed to persist measurement {msm_id} to DB: {db_save.get('message')}")
-                            failed_measurements.append(msm_id)
+                        buffered_results.extend(ping_results)
+                        buffered_ids.append(msm_id)
+                        if len(buffered_results) >= self.copy_batch_rows:
+                            saved, failed = await self._flush_results_to_db(buffered_results, buffered_ids)
+                            total_rows_saved += saved
+                            failed_measurements.extend(failed)
+                            fetched_ids.extend(msm for msm in buffered_ids if msm not in failed)
+                            buffered_results, buffered_ids = [], []
+                    else:
+                        # Finished with no results at all
+                        fetched_ids.append(msm_id)
                     
                     measurements_count += 1
                     if measurements_count >= 20:
@@ -329,14 +393,38 @@ class MeasurementService:
                         await asyncio.sleep(10)
                         measurements_count = 0
         
+        saved, failed = await self._flush_results_to_db(buffered_results, buffered_ids)
+        total_rows_saved += saved
+        failed_measurements.extend(failed)
+        fetched_ids.extend(msm for msm in buffered_ids if msm not in failed)
+        # Only finished measurements are planned, so these won't need another fetch
+        await self.repo.mark_final_fetched(fetched_ids, continent_code)
+        
         return {
             "status": "success",
             "message": f"Processed and saved {total_rows_saved} rows to DB",
             "saved": total_rows_saved,
             "planned": len(measurements_to_fetch),
+            "refetched": len(plan.to_refetch),
+            "pending": len(plan.pending),
+            "failed_upstream": plan.failed,
             "failed_measurements": failed_measurements
         }
 
+    async def _flush_results_to_db(self, results: list[PingResult], msm_ids: list[int]) -> tuple[int, list[int]]:
+        """COPY buffered results of several measurements in one transaction.
+        Returns: (rows saved, measurement IDs that failed)
+        """
+        if not results:
+            return 0, []
+        
+        db_save = await self.repo.copy_ping_results_to_db(results)
+        if db_save["status"] == "success":
+            logger.info(f"Saved {db_save['saved']} rows of {len(msm_ids)} measurements to DB")
+            return db_save["saved"], []
+        
+        logger.error(f"Failed to persist measurements {msm_ids} to DB: {db_save.get('message')}")
+        return 0, list(msm_ids)
     
     # async def process_and_save_results(self, ripe_client) -> dict:
     #     """Process measurement results and save them."""
@@ -365,24 +453,35 @@ class MeasurementService:
     # ============================================
     
     async def get_measurement_for_target_analysis(self):
-        """Get a measurement from the database."""
+        """Get per-target latency statistics from the database."""
         if not self.repo.session:
             return None
         return await self.repo.get_measurements_for_target_analysis()
     
+    async def refresh_target_stats(self) -> dict:
+        """Recompute latency statistics for every target."""
+        if not self.repo.session:
+            return {"status": "error", "message": "Database session not initialized"}
+        return await self.repo.refresh_target_stats()
+    
     
     
     
     
-    async def get_measurement_from_db(self, measurement_id: int) -> Optional[PingResultDB]:
-        """Get a measurement from the database."""
+    async def get_measurement_from_db(
+        self,
+        measurement_id: int,
+        after: Optional[tuple[int, Optional[int], int]] = None,
+        limit: int = 1000,
+    ) -> Optional[List[dict]]:
+        """Get one page of a measurement's result rows from the database."""
         if not self.repo.session:
             return None
-        return await self.repo.get_measurement(measurement_id)
+        return await self.repo.get_measurement(measurement_id, after=after, limit=limit)
     
-    async def get_all_measurements_from_db(self) -> List[Measurement]:
-        """Get all measurements from the database."""
+    async def get_all_measurements_from_db(self, after_id: Optional[int] = None, limit: int = 1000) -> List[dict]:
+        """Get one page of result rows from the database."""
         if not self.repo.session:
             return []
-        return await self.repo.get_all_measurements()
+        return await self.repo.get_all_measurements(after_id=after_id, limit=limit)
     
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""Track RIPE Atlas measurement completion before fetching results."""
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from ripe_atlas_client import RipeAtlasClient
+
+logger = logging.getLogger("ripe_atlas")
+
+# RIPE Atlas measurement status ids
+FINISHED_STATUS_IDS = frozenset({4, 5, 8})  # Stopped, Forced to stop, Archived
+FAILED_STATUS_IDS = frozenset({6, 7})  # No suitable probes, Failed
+
+
+@dataclass
+class MeasurementStatus:
+    """Status snapshot of a single measurement from the list endpoint."""
+
+    id: int
+    status_id: Optional[int]
+    status: str
+    participant_count: Optional[int] = None
+    probes_scheduled: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MeasurementStatus":
+        """Create MeasurementStatus from API response dict."""
+        status = data.get("status") or {}
+        return cls(
+            id=data.get("id"),
+            status_id=status.get("id"),
+            status=status.get("name", "unknown"),
+            participant_count=data.get("participant_count"),
+            probes_scheduled=data.get("probes_scheduled"),
+        )
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status_id in FINISHED_STATUS_IDS
+
+    @property
+    def is_failed(self) -> bool:
+        return self.status_id in FAILED_STATUS_IDS
+
+
+@dataclass
+class MeasurementFetchPlan:
+    """Which measurements to fetch, re-fetch or leave alone for now."""
+
+    to_fetch: list[int] = field(default_factory=list)
+    to_refetch: list[int] = field(default_factory=list)
+    pending: list[int] = field(default_factory=list)
+    failed: list[int] = field(default_factory=list)
+    complete: list[int] = field(default_factory=list)
+    unknown: list[int] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "to_fetch": len(self.to_fetch),
+            "to_refetch": len(self.to_refetch),
+            "pending": len(self.pending),
+            "failed": len(self.failed),
+            "complete": len(self.complete),
+            "unknown": len(self.unknown),
+        }
+
+
+class MeasurementTracker:
+    """Polls measurement status in bulk and decides which results to fetch."""
+
+    def __init__(self, client: RipeAtlasClient, page_size: int = 500):
+        self.client = client
+        self.page_size = page_size
+
+    async def get_statuses(self, msm_ids: Iterable[int]) -> dict[int, MeasurementStatus]:
+        """Get the status of many measurements with one list call per chunk."""
+        statuses = {}
+        async for data in self.client.get_measurements(msm_ids, page_size=self.page_size):
+            status = MeasurementStatus.from_dict(data)
+            statuses[status.id] = status
+        return statuses
+
+    async def plan(
+        self,
+        msm_ids: Iterable[int],
+        stored_counts: dict[int, int],
+        final_fetched: Iterable[int] = (),
+    ) -> MeasurementFetchPlan:
+        """Build a fetch plan from current status and already stored rows.
+
+        Args:
+            msm_ids: Measurement IDs we created
+            stored_counts: {measurement_id: number of result rows already stored}
+            final_fetched: Measurements already fetched after they finished. They
+                           are complete even with fewer rows than participants
+                           (probes that never reported).
+        """
+        final_fetched = set(final_fetched)
+        msm_ids = sorted({int(msm_id) for msm_id in msm_ids})
+        statuses = await self.get_statuses(msm_ids)
+        plan = MeasurementFetchPlan()
+
+        for msm_id in msm_ids:
+            status = statuses.get(msm_id)
+            stored = stored_counts.get(msm_id, 0)
+
+            if status is None:
+                plan.unknown.append(msm_id)
+            elif status.is_failed:
+                plan.failed.append(msm_id)
+            elif not status.is_finished:
+                plan.pending.append(msm_id)
+            elif msm_id in final_fetched:
+                plan.complete.append(msm_id)
+            elif not stored:
+                plan.to_fetch.append(msm_id)
+            elif status.participant_count and stored < status.participant_count:
+                # Fetched while the measurement was still running
+                plan.to_refetch.append(msm_id)
+            else:
+                plan.complete.append(msm_id)
+
+        logger.info(f"Measurement fetch plan: {plan.summary()}")
+        return plan
@@ -0,0 +1,243 @@
+"""Process-wide, indexed in-memory registry of RIPE Atlas probes."""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
+
+from models.probe import Probe
+from repositories.probe_repository import ProbeRepository
+from ripe_atlas_client import RipeAtlasClient
+from services.probe_sync import ProbeCatalogSync
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from services.probe_spatial_index import ProbeSpatialIndex
+
+logger = logging.getLogger("ripe_atlas")
+
+AFRICAN_COUNTRIES: frozenset[str] = frozenset({
+    "DZ","AO","BJ","BW","BF","BI","CM","CV","CF","TD","KM",
+    "CD","CG","CI","DJ","EG","GQ","ER","SZ","ET","GA","GM",
+    "GH","GN","GW","KE","LS","LR","LY","MG","MW","ML","MR",
+    "MU","MA","MZ","NA","NE","NG","RW","ST","SN","SC","SL",
+    "SO","ZA","SS","SD","TZ","TG","TN","UG","ZM","ZW"
+})
+
+SOUTH_AMERICA_COUNTRIES: frozenset[str] = frozenset({
+    "AR","BO","BR","CL","CO","EC","FK","GF","GY",
+    "PE","PY","SR","UY","VE"
+})
+
+CONTINENT_COUNTRIES: dict[str, frozenset[str]] = {
+    "AF": AFRICAN_COUNTRIES,
+    "SA": SOUTH_AMERICA_COUNTRIES,
+}
+
+COUNTRY_CONTINENT: dict[str, str] = {
+    country_code: continent_code
+    for continent_code, country_codes in CONTINENT_COUNTRIES.items()
+    for country_code in country_codes
+}
+
+
+class ProbeRegistry:
+    """Loads the probe catalog once and answers filter queries from indexes.
+
+    Probes are kept as typed Probe records keyed by ID, with secondary
+    indexes by country, continent, ASN and anchor status. A filter query
+    starts from the smallest matching index bucket and checks the other
+    conditions only on that bucket, so its cost follows the result size
+    rather than the catalog size.
+
+    The catalog comes from the CSV cache and is synced with the RIPE Atlas
+    API once the last sync is older than ttl_seconds. Syncs are
+    incremental (see ProbeCatalogSync), so a short TTL stays cheap.
+    """
+
+    def __init__(self, csv_path: str = "data/ripe/all_active_probes_v2.csv", ttl_seconds: float = 3600):
+        self.csv_path = csv_path
+        self.ttl_seconds = ttl_seconds
+        self._sync = ProbeCatalogSync(os.path.join(os.path.dirname(csv_path), "probe_sync_state.json"))
+        self._lock = asyncio.Lock()
+        self._loaded_at: Optional[float] = None
+        self._set_probes([])
+
+    @property
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.time() - self._loaded_at > self.ttl_seconds
+
+    def __len__(self) -> int:
+        return len(self._probes)
+
+    async def ensure_loaded(self, client: Optional[RipeAtlasClient] = None) -> None:
+        """Load the catalog on first use and refresh it once the TTL expired.
+
+        client is the shared RipeAtlasClient used if a sync is needed.
+        """
+        if not self.is_stale:
+            return
+        async with self._lock:
+            if self.is_stale:
+                await self._load(client=client)
+
+    async def refresh(self, full: bool = False, client: Optional[RipeAtlasClient] = None) -> dict:
+        """Sync the catalog with the RIPE Atlas API now."""
+        async with self._lock:
+            return await self._load(force_sync=True, full=full, client=client)
+
+    async def _load(self, force_sync: bool = False, full: bool = False, client: Optional[RipeAtlasClient] = None) -> dict:
+        probe_repo = ProbeRepository(self.csv_path)
+        if not self._probes and probe_repo.exists():
+            logger.info("Loading probes from File")
+            self._set_probes([Probe.from_dict(row) for row in probe_repo.read_probes_from_csv()])
+
+        last_sync = self._sync.state.last_sync
+        if not force_sync and self._probes and last_sync and time.time() - last_sync <= self.ttl_seconds:
+            self._loaded_at = last_sync
+            return {"mode": "cached", "probes": len(self._probes)}
+
+        try:
+            probes, summary = await self._sync.sync(self._probes, full=full, client=client)
+        except Exception as e:
+            if not self._probes:
+                raise
+            logger.error(f"Probe sync failed, keeping cached probes: {e}")
+            self._loaded_at = time.time()
+            return {"mode": "failed", "probes": len(self._probes), "error": str(e)}
+
+        probe_repo.write_probes_to_csv([probe.to_dict() for probe in probes])
+        logger.info(f"Cached {len(probes)} probes")
+        self._set_probes(probes)
+        self._loaded_at = time.time()
+        return summary
+
+    def _set_probes(self, probes: list[Probe]) -> None:
+        """Replace the catalog and rebuild all indexes."""
+        by_id: dict[int, Probe] = {}
+        by_country: dict[str, list[int]] = defaultdict(list)
+        by_continent: dict[str, list[int]] = defaultdict(list)
+        by_asn: dict[int, list[int]] = defaultdict(list)
+        by_asn_v6: dict[int, list[int]] = defaultdict(list)
+        with_v6: list[int] = []
+        anchors: list[int] = []
+
+        for probe in sorted(probes, key=lambda probe: probe.id):
+            if probe.id is None:
+                continue
+            by_id[probe.id] = probe
+            by_country[probe.country_code].append(probe.id)
+            continent_code = COUNTRY_CONTINENT.get(probe.country_code)
+            if continent_code:
+                by_continent[continent_code].append(probe.id)
+            if probe.asn_v4 is not None:
+                by_asn[probe.asn_v4].append(probe.id)
+            if probe.asn_v6 is not None:
+                by_asn_v6[probe.asn_v6].append(probe.id)
+            if probe.address_v6:
+                with_v6.append(probe.id)
+            if probe.is_anchor:
+                anchors.append(probe.id)
+
+        self._probes = by_id
+        self._by_country = dict(by_country)
+        self._by_continent = dict(by_continent)
+        self._by_asn = dict(by_asn)
+        self._by_asn_v6 = dict(by_asn_v6)
+        self._with_v6 = with_v6
+        self._anchors = anchors
+        self._all_dicts: Optional[list[dict]] = None
+        self._frame: Optional["pd.DataFrame"] = None
+        self._spatial_index: Optional["ProbeSpatialIndex"] = None
+
+    def get(self, probe_id: int) -> Optional[Probe]:
+        return self._probes.get(probe_id)
+
+    def all(self) -> list[Probe]:
+        return list(self._probes.values())
+
+    def filter(
+        self,
+        country_code: Optional[str] = None,
+        continent_code: Optional[str] = None,
+        asn: Optional[int] = None,
+        is_anchor: Optional[bool] = None,
+        af: Optional[int] = None,
+    ) -> list[Probe]:
+        """Return probes matching all given conditions, ordered by ID.
+
+        With af, only probes that have an address in that family are kept
+        and asn is matched against the ASN of that family (IPv4 otherwise).
+        """
+        asn_attribute = "asn_v6" if af == 6 else "asn_v4"
+        address_attribute = f"address_v{af}" if af in (4, 6) else None
+        candidates = []
+        if country_code is not None:
+            candidates.append(self._by_country.get(country_code, []))
+        if continent_code is not None:
+            candidates.append(self._by_continent.get(continent_code, []))
+        if asn is not None:
+            candidates.append((self._by_asn_v6 if af == 6 else self._by_asn).get(asn, []))
+        if is_anchor:
+            candidates.append(self._anchors)
+        if af == 6:
+            candidates.append(self._with_v6)
+
+        if not candidates:
+            probes = self._probes.values()
+            return [
+                probe for probe in probes
+                if (is_anchor is None or probe.is_anchor == is_anchor)
+                and (address_attribute is None or getattr(probe, address_attribute))
+            ]
+
+        smallest = min(candidates, key=len)
+        result = []
+        for probe_id in smallest:
+            probe = self._probes[probe_id]
+            if country_code is not None and probe.country_code != country_code:
+                continue
+            if continent_code is not None and COUNTRY_CONTINENT.get(probe.country_code) != continent_code:
+                continue
+            if asn is not None and getattr(probe, asn_attribute) != asn:
+                continue
+            if is_anchor is not None and probe.is_anchor != is_anchor:
+                continue
+            if address_attribute is not None and not getattr(probe, address_attribute):
+                continue
+            result.append(probe)
+        return result
+
+    def as_frame(self) -> "pd.DataFrame":
+        """All probes as a ranked columnar table; built once per catalog load."""
+        if self._frame is None:
+            # pandas is only loaded once a selection actually needs the table
+            from services.probe_selection import probes_frame
+            self._frame = probes_frame(self._probes.values())
+        return self._frame
+
+    def spatial_index(self) -> "ProbeSpatialIndex":
+        """Location index over all probes; built once per catalog load."""
+        if self._spatial_index is None:
+            from services.probe_spatial_index import ProbeSpatialIndex
+            self._spatial_index = ProbeSpatialIndex(self._probes.values())
+        return self._spatial_index
+
+    def all_as_dicts(self) -> list[dict]:
+        """All probes as dicts; rendered once per catalog load."""
+        if self._all_dicts is None:
+            self._all_dicts = [probe.to_dict() for probe in self._probes.values()]
+        return self._all_dicts
+
+
+_registry: Optional[ProbeRegistry] = None
+
+
+def get_probe_registry() -> ProbeRegistry:
+    """Get the process-wide probe registry."""
+    global _registry
+    if _registry is None:
+        _registry = ProbeRegistry()
+    return _registry
@@ -0,0 +1,140 @@
+"""Columnar probe selection with named, parameterized diversity policies."""
+import logging
+from typing import Any, Callable, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from models.probe import Probe
+
+logger = logging.getLogger("ripe_atlas")
+
+PROBE_COLUMNS = (
+    "id", "country_code", "asn_v4", "asn_v6", "address_v4", "address_v6",
+    "latitude", "longitude", "last_connected", "total_uptime", "is_anchor",
+)
+
+PolicyFunc = Callable[..., pd.DataFrame]
+PolicySpec = Union[str, tuple[str, dict[str, Any]]]
+
+POLICIES: dict[str, PolicyFunc] = {}
+
+
+def policy(name: str) -> Callable[[PolicyFunc], PolicyFunc]:
+    """Register a selection policy under a name."""
+    def register(func: PolicyFunc) -> PolicyFunc:
+        POLICIES[name] = func
+        return func
+    return register
+
+
+def probes_frame(probes: Iterable[Union[Probe, dict]]) -> pd.DataFrame:
+    """Build the columnar probe table used by all policies.
+
+    Rows are ranked best first (most recently connected, then longest
+    uptime, then lowest ID), so every policy can keep the first k rows of
+    a group without sorting again.
+    """
+    records = [
+        (probe.id, probe.country_code, probe.asn_v4, probe.asn_v6, probe.address_v4, probe.address_v6,
+         probe.latitude, probe.longitude, probe.last_connected, probe.total_uptime, probe.is_anchor)
+        if isinstance(probe, Probe)
+        else tuple(probe.get(column) for column in PROBE_COLUMNS)
+        for probe in probes
+    ]
+    frame = pd.DataFrame.from_records(records, columns=PROBE_COLUMNS)
+    for column in ("id", "asn_v4", "asn_v6", "last_connected", "total_uptime"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    for column in ("address_v4", "address_v6"):
+        frame[column] = frame[column].astype("string").replace("", pd.NA)
+    for column in ("latitude", "longitude"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+    # An empty country is as unknown as a missing one; per-country policies skip both
+    frame["country_code"] = frame["country_code"].astype("string").replace("", pd.NA)
+    frame["is_anchor"] = frame["is_anchor"].astype("string").str.lower().eq("true").fillna(False).astype(bool)
+
+    frame = frame.dropna(subset=["id"])
+    frame["id"] = frame["id"].astype("int64")
+    return frame.sort_values(
+        ["last_connected", "total_uptime", "id"],
+        ascending=[False, False, True],
+        na_position="last",
+        kind="stable",
+    ).reset_index(drop=True)
+
+
+def _first_k(frame: pd.DataFrame, keys: list[str], k: int) -> pd.DataFrame:
+    """Keep the first k rows of every group; rows with a missing key are dropped."""
+    frame = frame.dropna(subset=keys)
+    return frame[frame.groupby(keys, sort=False).cumcount() < k]
+
+
+def _asn_column(af: int) -> str:
+    if af not in (4, 6):
+        raise ValueError(f"Invalid address family: {af}")
+    return f"asn_v{af}"
+
+
+@policy("address_family")
+def with_address_family(frame: pd.DataFrame, af: int = 4) -> pd.DataFrame:
+    """Only probes with an address (and so connectivity) in family af."""
+    _asn_column(af)
+    return frame[frame[f"address_v{af}"].notna().to_numpy()]
+
+
+@policy("k_per_country_asn")
+def k_per_country_asn(frame: pd.DataFrame, k: int = 1, af: int = 4) -> pd.DataFrame:
+    """At most k probes per (country, ASN of family af)."""
+    return _first_k(frame, ["country_code", _asn_column(af)], k)
+
+
+@policy("k_per_asn")
+def k_per_asn(frame: pd.DataFrame, k: int = 1, af: int = 4) -> pd.DataFrame:
+    """At most k probes per ASN of family af."""
+    return _first_k(frame, [_asn_column(af)], k)
+
+
+@policy("country_cap")
+def country_cap(frame: pd.DataFrame, max_per_country: int = 10) -> pd.DataFrame:
+    """At most max_per_country probes per country."""
+    return _first_k(frame, ["country_code"], max_per_country)
+
+
+@policy("grid_spread")
+def grid_spread(frame: pd.DataFrame, cell_degrees: float = 1.0, k: int = 1) -> pd.DataFrame:
+    """At most k probes per lat/lon grid cell of cell_degrees; probes without location are dropped."""
+    frame = frame.dropna(subset=["latitude", "longitude"])
+    cells = frame.assign(
+        cell_lat=np.floor(frame["latitude"].to_numpy() / cell_degrees),
+        cell_lon=np.floor(frame["longitude"].to_numpy() / cell_degrees),
+    )
+    return frame[cells.groupby(["cell_lat", "cell_lon"], sort=False).cumcount().to_numpy() < k]
+
+
+class ProbeSelector:
+    """Applies chains of selection policies to one probe table.
+
+    Build it once per probe set and call select() as often as needed;
+    each call works on the prepared columns only.
+    """
+
+    def __init__(self, probes: Union[pd.DataFrame, Iterable[Union[Probe, dict]]]):
+        self.frame = probes if isinstance(probes, pd.DataFrame) else probes_frame(probes)
+
+    def select(self, policies: Union[PolicySpec, list[PolicySpec]], frame: Optional[pd.DataFrame] = None) -> np.ndarray:
+        """Return the IDs of probes kept by all policies, applied in order.
+
+        Args:
+            policies: A policy name, a (name, params) pair, or a list of these
+            frame: Subset of the table to select from (defaults to all probes)
+        """
+        if isinstance(policies, (str, tuple)):
+            policies = [policies]
+
+        selected = self.frame if frame is None else frame
+        for spec in policies:
+            name, params = (spec, {}) if isinstance(spec, str) else spec
+            if name not in POLICIES:
+                raise ValueError(f"Unknown probe selection policy: {name}")
+            selected = POLICIES[name](selected, **params)
+        return selected["id"].to_numpy()
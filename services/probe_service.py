@@ -1,138 +1,151 @@
 """Probe service with business logic."""
 import logging
-from typing import Any, Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from repositories.probe_repository import ProbeRepository
-from ripe_atlas_client import RipeAtlasClient
-from collections import defaultdict
-from models.probe import Probe
+from ripe_atlas_client import RipeAtlasClient, atlas_client
+from models.probe import Probe, ProbeDB
+from services.probe_registry import AFRICAN_COUNTRIES, CONTINENT_COUNTRIES, SOUTH_AMERICA_COUNTRIES, get_probe_registry
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from services.probe_selection import PolicySpec
 
 logger = logging.getLogger("ripe_atlas")
 
 
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 class ProbeService:
     """Business logic for probe operations."""
     
-    def __init__(self, probe_repository: Optional[ProbeRepository] = None):
-        """Initialize ProbeService with optional repository for database operations."""
+    def __init__(self, probe_repository: Optional[ProbeRepository] = None, client: Optional[RipeAtlasClient] = None):
+        """Initialize ProbeService with optional repository for database operations.
+        
+        client: the API's shared RipeAtlasClient; None opens one per call.
+        """
         self.repo = probe_repository
+        self.client = client
     
     async def fetch_all_probes(self):
         probes = []
-        async with RipeAtlasClient() as client:
+        async with atlas_client(self.client) as client:
             async for probe in client.get_probes():
                 probes.append(probe)
         return probes
     
     async def get_all_probes(self):
-        """Get all probes, fetching from API if not cached."""
-        # Try to load from cache first
-        
-        probe_repo = ProbeRepository("data/ripe/all_active_probes_v2.csv")
-        
-        if probe_repo.exists():
-            logger.info("Loading probes from File")
-            return probe_repo.read_probes_from_csv()
-        
-        # Fetch from API
-        logger.info("Fetching probes from RIPE Atlas API")
-        probes = await self.fetch_all_probes()
-        
-        # Cache the results
-        probe_repo.write_probes_to_csv(probes)
-        logger.info(f"Cached {len(probes)} probes")
-        
-        return probes
-    
-    async def get_filtered_probes(self, continent_code: str):
-        probes = await self.get_continent_probes(continent_code)
-        filtered_probes = self.filter_max_two_probes_per_country_asn(probes)
-        logger.info(f"continent_code: {continent_code}, total_continent_probes: {len(probes)}, filtered_probes: {len(filtered_probes)}")
+        """Get all probes from the process-wide registry."""
+        registry = get_probe_registry()
+        await registry.ensure_loaded(self.client)
+        return registry.all_as_dicts()
+    
+    async def sync_probes(self, full: bool = False) -> dict:
+        """Sync the probe registry with the RIPE Atlas API."""
+        summary = await get_probe_registry().refresh(full=full, client=self.client)
+        return {"status": "success", **summary}
+    
+    async def get_filtered_probes(self, continent_code: str, af: int = 4):
+        probes = await self.get_continent_probes(continent_code, af=6 if af == 6 else None)
+        filtered_probes = self.filter_max_two_probes_per_country_asn(probes, af=af)
+        logger.info(f"continent_code: {continent_code}, af: {af}, total_continent_probes: {len(probes)}, filtered_probes: {len(filtered_probes)}")
         return filtered_probes
     
-    async def get_continent_probes(self, continent_code: str):
+    async def get_continent_probes(self, continent_code: str, af: Optional[int] = None):
+        """Probes of a continent; with af only those with an address in that family."""
         settings = self.getSettings(continent_code)
-        probe_repo = ProbeRepository(settings["probe_file_path"])
-        
-        if probe_repo.exists():
-            logger.info(f"Loading {settings['continent']} probes from File")
-            return probe_repo.read_probes_from_csv()
-        
-        # Get all probes and filter
-        logger.info(f"Filtering {settings['continent']} probes")
-        all_probes = await self.get_all_probes()
-        continent_probes = [
-            probe for probe in all_probes 
-            if probe.get("country_code") in settings["county_codes"]]
+        registry = get_probe_registry()
+        await registry.ensure_loaded(self.client)
         
-        # Cache the results
-        probe_repo.write_probes_to_csv(continent_probes)
-        logger.info(f"Cached {len(continent_probes)} {settings['continent']} probes")
-        
-        return continent_probes
+        continent_code = continent_code if continent_code in CONTINENT_COUNTRIES else "AF"
+        continent_probes = registry.filter(continent_code=continent_code, af=af)
+        logger.info(f"Loaded {len(continent_probes)} {settings['continent']} probes from registry")
+        return [probe.to_dict() for probe in continent_probes]
     
 
     def filter_max_two_probes_per_country_asn(
         self,
         probes: List[Dict[str, Any]],
+        af: int = 4,
     ) -> List[Dict[str, Any]]:
         """
-        Keep at most 2 probes per (country_code, asn_v4).
+        Keep one probe per (country_code, asn_v4), or per (country_code, asn_v6)
+        among IPv6-capable probes when af is 6.
 
         Ranking rule (best first):
         1) last_connected (desc)
         2) total_uptime (desc)
         3) id (asc)  # stable
         """
-        def as_int(v, default=0):
-            try:
-                return int(v)
-            except Exception:
-                return default
-
-        buckets: Dict[Tuple[str, int], List[Dict[str, Any]]] = defaultdict(list)
-
-        for p in probes:
-            cc = p.get("country_code")
-            asn = p.get("asn_v4")
-            if not cc or asn is None:
+        # Plain dict bucketing: on a continent's probes it beats building a
+        # policy table per call (see benchmarks/bench_probe_selection.py)
+        asn_key = "asn_v6" if af == 6 else "asn_v4"
+        best: Dict[tuple, tuple] = {}
+        for probe in probes:
+            country_code = probe.get("country_code")
+            asn = _as_int(probe.get(asn_key))
+            if not country_code or asn is None:
                 continue
-
-            asn_i = as_int(asn, -1)
-            if asn_i == -1:
+            if af == 6 and not probe.get("address_v6"):
                 continue
-
-            buckets[(cc, asn_i)].append(p)
-
-        selected: List[Dict[str, Any]] = []
-        for (_cc, _asn), items in buckets.items():
-            items_sorted = sorted(
-                items,
-                key=lambda x: (
-                    -as_int(x.get("last_connected"), 0),
-                    -as_int(x.get("total_uptime"), 0),
-                    as_int(x.get("id"), 10**18),
-                ),
+            rank = (
+                -(_as_int(probe.get("last_connected")) or 0),
+                -(_as_int(probe.get("total_uptime")) or 0),
+                _as_int(probe.get("id")),
             )
-            selected.extend(items_sorted[:1])
+            if rank[2] is None:
+                continue
+            key = (country_code, asn)
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, probe)
+        return [probe for _, probe in sorted(best.values(), key=lambda item: item[0])]
+    
+    async def select_probes(
+        self,
+        policies: List["PolicySpec"],
+        continent_code: Optional[str] = None,
+    ) -> "np.ndarray":
+        """Select probe IDs from the registry with a chain of selection policies."""
+        from services.probe_selection import ProbeSelector
 
-        return selected
+        registry = get_probe_registry()
+        await registry.ensure_loaded(self.client)
+        
+        frame = registry.as_frame()
+        if continent_code is not None:
+            countries = CONTINENT_COUNTRIES.get(continent_code, frozenset())
+            frame = frame[frame["country_code"].isin(countries).to_numpy()]
+        return ProbeSelector(frame).select(policies)
+
+    
+    async def nearest_probes(self, latitude: float, longitude: float, k: int = 10) -> List[Dict[str, Any]]:
+        """Get the k probes closest to a location, nearest first."""
+        registry = get_probe_registry()
+        await registry.ensure_loaded(self.client)
+        probe_ids, distances = registry.spatial_index().nearest(latitude, longitude, k)
+        return self._with_distances(registry, probe_ids, distances)
+    
+    async def probes_within(self, latitude: float, longitude: float, radius_km: float) -> List[Dict[str, Any]]:
+        """Get all probes within radius_km of a location, nearest first."""
+        registry = get_probe_registry()
+        await registry.ensure_loaded(self.client)
+        probe_ids, distances = registry.spatial_index().within(latitude, longitude, radius_km)
+        return self._with_distances(registry, probe_ids, distances)
+    
+    @staticmethod
+    def _with_distances(registry, probe_ids: "np.ndarray", distances: "np.ndarray") -> List[Dict[str, Any]]:
+        return [
+            {**registry.get(probe_id).to_dict(), "distance_km": round(distance, 3)}
+            for probe_id, distance in zip(probe_ids.tolist(), distances.tolist())
+        ]
 
     
     def getSettings(self, continent_code: str = "AF") -> dict:
-        
-        AFRICAN_COUNTRIES: frozenset[str] = frozenset({
-            "DZ","AO","BJ","BW","BF","BI","CM","CV","CF","TD","KM",
-            "CD","CG","CI","DJ","EG","GQ","ER","SZ","ET","GA","GM",
-            "GH","GN","GW","KE","LS","LR","LY","MG","MW","ML","MR",
-            "MU","MA","MZ","NA","NE","NG","RW","ST","SN","SC","SL",
-            "SO","ZA","SS","SD","TZ","TG","TN","UG","ZM","ZW"
-        })
-        
-        SOUTH_AMERICA_COUNTRIES: frozenset[str] = frozenset({
-            "AR","BO","BR","CL","CO","EC","FK","GF","GY",
-            "PE","PY","SR","UY","VE"
-        })
-        
         settings = {
             "AF": {
                 "continent": "Africa", 
@@ -207,11 +220,11 @@ class ProbeService:
             return None
         return await self.repo.get_probe(probe_id)
     
-    async def get_all_probes_from_db(self) -> List[Probe]:
-        """Get all probes from the database."""
+    async def get_all_probes_from_db(self, after_id: Optional[int] = None, limit: int = 1000) -> List[ProbeDB]:
+        """Get one page of probes from the database."""
         if not self.repo:
             return []
-        return await self.repo.get_all_probes()
+        return await self.repo.get_all_probes(after_id=after_id, limit=limit)
     
     async def get_probes_by_country_from_db(self, country_code: str) -> List[Probe]:
         """Get all probes for a specific country from the database."""
@@ -0,0 +1,128 @@
+"""Grid spatial index over probe locations with kNN and radius queries."""
+import math
+from collections import defaultdict
+from typing import Iterable, Union
+
+import numpy as np
+
+from models.probe import Probe
+
+EARTH_RADIUS_KM = 6371.0088
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points (degrees)."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class ProbeSpatialIndex:
+    """Buckets probes into cell_degrees x cell_degrees lat/lon cells.
+
+    A radius query computes the lat/lon bounding box of the circle (wrapping
+    at the antimeridian, widening to all longitudes near the poles), gathers
+    the probes of the covered cells and filters them with the vectorized
+    haversine kernel. A kNN query grows the radius until it holds k probes;
+    everything outside that radius is farther away, so the result is exact.
+    Probes without a location are not indexed.
+    """
+
+    def __init__(self, probes: Iterable[Union[Probe, dict]], cell_degrees: float = 2.0):
+        rows = [
+            (probe.id, probe.latitude, probe.longitude) if isinstance(probe, Probe)
+            else (probe.get("id"), probe.get("latitude"), probe.get("longitude"))
+            for probe in probes
+        ]
+        rows = [
+            (int(probe_id), float(lat), float(lon))
+            for probe_id, lat, lon in rows
+            if probe_id is not None and lat not in (None, "") and lon not in (None, "")
+        ]
+        self.cell_degrees = cell_degrees
+        self.lon_cells = math.ceil(360 / cell_degrees)
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.lats = np.array([row[1] for row in rows], dtype=np.float64)
+        self.lons = np.array([row[2] for row in rows], dtype=np.float64)
+
+        cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+        lat_cells = self._lat_cell(self.lats)
+        lon_cells = self._lon_cell(self.lons)
+        for row, cell in enumerate(zip(lat_cells.tolist(), lon_cells.tolist())):
+            cells[cell].append(row)
+        self._cells = {cell: np.array(rows, dtype=np.int64) for cell, rows in cells.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _lat_cell(self, lats):
+        return np.floor((np.asarray(lats) + 90) / self.cell_degrees).astype(np.int64)
+
+    def _lon_cell(self, lons):
+        return np.floor((np.asarray(lons) + 180) / self.cell_degrees).astype(np.int64) % self.lon_cells
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Row numbers of all probes in cells touching the circle's bounding box."""
+        if radius_km >= HALF_CIRCUMFERENCE_KM:
+            return np.arange(len(self.ids))
+
+        angular = radius_km / EARTH_RADIUS_KM
+        min_lat = lat - math.degrees(angular)
+        max_lat = lat + math.degrees(angular)
+        if min_lat <= -90 or max_lat >= 90:
+            lon_span = None
+        else:
+            ratio = math.sin(angular) / math.cos(math.radians(lat))
+            lon_span = None if ratio >= 1 else math.degrees(math.asin(ratio))
+
+        lat_range = range(int(self._lat_cell(max(min_lat, -90))), int(self._lat_cell(min(max_lat, 90))) + 1)
+        if lon_span is None or 2 * lon_span >= 360 - self.cell_degrees:
+            lon_range = range(self.lon_cells)
+        else:
+            first = int(np.floor((lon - lon_span + 180) / self.cell_degrees))
+            last = int(np.floor((lon + lon_span + 180) / self.cell_degrees))
+            lon_range = [cell % self.lon_cells for cell in range(first, last + 1)]
+
+        if len(lat_range) * len(lon_range) >= len(self._cells):
+            buckets = [
+                rows for (lat_cell, lon_cell), rows in self._cells.items()
+                if lat_cell in lat_range and lon_cell in lon_range
+            ]
+        else:
+            buckets = [
+                self._cells[(lat_cell, lon_cell)]
+                for lat_cell in lat_range for lon_cell in lon_range
+                if (lat_cell, lon_cell) in self._cells
+            ]
+        return np.concatenate(buckets) if buckets else np.empty(0, dtype=np.int64)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Probe IDs and distances (km) within radius_km, nearest first."""
+        rows = self._candidates(lat, lon, radius_km)
+        distances = haversine_km(lat, lon, self.lats[rows], self.lons[rows])
+        keep = distances <= radius_km
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return self.ids[rows[order]], distances[order]
+
+    def nearest(self, lat: float, lon: float, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """The k probes closest to (lat, lon) as IDs and distances (km), nearest first."""
+        if k <= 0 or not len(self.ids):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        radius_km = self.cell_degrees * 111.0
+        while True:
+            rows = self._candidates(lat, lon, radius_km)
+            if len(rows) >= k or radius_km >= HALF_CIRCUMFERENCE_KM:
+                distances = haversine_km(lat, lon, self.lats[rows], self.lons[rows])
+                keep = distances <= radius_km
+                if keep.sum() >= k or radius_km >= HALF_CIRCUMFERENCE_KM:
+                    rows, distances = rows[keep], distances[keep]
+                    order = np.argsort(distances, kind="stable")[:k]
+                    return self.ids[rows[order]], distances[order]
+            radius_km *= 2
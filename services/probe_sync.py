@@ -0,0 +1,133 @@
+"""Incremental synchronisation of the RIPE Atlas probe catalog."""
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from models.probe import Probe
+from ripe_atlas_client import RipeAtlasClient, atlas_client
+
+logger = logging.getLogger("ripe_atlas")
+
+CONNECTED_STATUS_ID = 1
+
+
+@dataclass
+class ProbeSyncState:
+    """When the catalog was last synced, persisted next to the CSV cache."""
+
+    last_sync: Optional[int] = None
+    last_full_sync: Optional[int] = None
+
+    @classmethod
+    def load(cls, path: str) -> "ProbeSyncState":
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path) as f:
+                return cls(**json.load(f))
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Ignoring unreadable probe sync state {path}: {e}")
+            return cls()
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+
+
+class ProbeCatalogSync:
+    """Keeps a catalog of connected probes up to date with few API calls.
+
+    The first sync and every full_resync_interval seconds afterwards the
+    whole catalog of connected probes is downloaded. In between only
+    probes whose status changed since the last sync are fetched (through
+    the status_since__gte filter, in any status) and merged: connected
+    probes are inserted or replaced, all others are dropped. The window
+    starts overlap_seconds before the last sync to cover clock skew and
+    changes made while the previous sync ran.
+    """
+
+    def __init__(
+        self,
+        state_path: str = "data/ripe/probe_sync_state.json",
+        full_resync_interval: float = 7 * 24 * 3600,
+        overlap_seconds: int = 3600,
+        concurrency: int = 4,
+    ):
+        self.state_path = state_path
+        self.full_resync_interval = full_resync_interval
+        self.overlap_seconds = overlap_seconds
+        self.concurrency = concurrency
+        self.state = ProbeSyncState.load(state_path)
+
+    def needs_full_sync(self, current: dict[int, Probe]) -> bool:
+        if not current or self.state.last_sync is None or self.state.last_full_sync is None:
+            return True
+        return time.time() - self.state.last_full_sync > self.full_resync_interval
+
+    async def sync(
+        self,
+        current: dict[int, Probe],
+        full: bool = False,
+        client: Optional[RipeAtlasClient] = None,
+    ) -> tuple[list[Probe], dict]:
+        """Return the updated catalog and a summary of what changed.
+
+        Args:
+            current: Catalog from the previous sync, {probe_id: Probe}
+            full: Download the whole catalog even if an incremental sync would do
+            client: Shared RipeAtlasClient; None opens one for this sync
+        """
+        started_at = int(time.time())
+        full = full or self.needs_full_sync(current)
+
+        async with atlas_client(client) as client:
+            if full:
+                logger.info("Fetching all probes from RIPE Atlas API")
+                probes = [
+                    Probe.from_dict(data)
+                    async for data in client.get_probes(concurrency=self.concurrency)
+                ]
+                summary = {"mode": "full", "probes": len(probes)}
+            else:
+                since = self.state.last_sync - self.overlap_seconds
+                logger.info(f"Fetching probes changed since {since} from RIPE Atlas API")
+                changed = [
+                    Probe.from_dict(data)
+                    async for data in client.get_probes(
+                        status=None, concurrency=self.concurrency, status_since__gte=since
+                    )
+                ]
+                probes, summary = self.merge(current, changed)
+
+        self.state.last_sync = started_at
+        if full:
+            self.state.last_full_sync = started_at
+        self.state.save(self.state_path)
+        logger.info(f"Probe sync finished: {summary}")
+        return probes, summary
+
+    @staticmethod
+    def merge(current: dict[int, Probe], changed: list[Probe]) -> tuple[list[Probe], dict]:
+        """Apply changed probes to the catalog of connected probes."""
+        merged = dict(current)
+        updated = removed = 0
+        for probe in changed:
+            if probe.status == CONNECTED_STATUS_ID:
+                merged[probe.id] = probe
+                updated += 1
+            elif merged.pop(probe.id, None) is not None:
+                removed += 1
+        summary = {
+            "mode": "incremental",
+            "changed": len(changed),
+            "updated": updated,
+            "removed": removed,
+            "probes": len(merged),
+        }
+        return list(merged.values()), summary
@@ -0,0 +1,203 @@
+"""Guarded execution of ad-hoc read-only SQL queries."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.db import engine
+
+logger = logging.getLogger("ripe_atlas")
+
+# Marks a wait that was abandoned because the client disconnected
+_DISCONNECTED = object()
+
+
+class QueryValidationError(ValueError):
+    """Raised when a query is not a single read-only SELECT statement."""
+
+
+class QueryService:
+    """Runs ad-hoc SELECT queries in read-only transactions with limits.
+
+    Every query runs on its own connection in a READ ONLY transaction with
+    a local statement_timeout, and is wrapped in a LIMIT so the server
+    never produces more than max_rows + 1 rows. Rows are fetched through a
+    server-side cursor in chunks. The client connection is polled while
+    the database works on a chunk; when the client goes away the pending
+    fetch is cancelled, which cancels the query on the server.
+    """
+
+    def __init__(
+        self,
+        db_engine: AsyncEngine = engine,
+        statement_timeout_ms: int = 30_000,
+        max_rows: int = 10_000,
+        chunk_size: int = 1000,
+        cache_ttl: float = 300.0,
+        cache_size: int = 64,
+        disconnect_poll_interval: float = 0.5,
+    ):
+        self.engine = db_engine
+        self.statement_timeout_ms = statement_timeout_ms
+        self.max_rows = max_rows
+        self.chunk_size = chunk_size
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.disconnect_poll_interval = disconnect_poll_interval
+        self._cache: OrderedDict[tuple[str, int], tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def validate(sql_query: str) -> str:
+        """Return the normalized query or raise QueryValidationError."""
+        sql_query = (sql_query or "").strip().rstrip(";").strip()
+        if not sql_query:
+            raise QueryValidationError("Query is empty")
+        if ";" in sql_query:
+            raise QueryValidationError("Only a single statement is allowed")
+        if not sql_query.upper().startswith(("SELECT", "WITH")):
+            raise QueryValidationError("Only SELECT queries are allowed")
+        return sql_query
+
+    async def stream(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        statement_timeout_ms: Optional[int] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[list[dict]]:
+        """Stream result rows in chunks, stopping after max_rows rows.
+
+        Args:
+            sql_query: SELECT statement
+            max_rows: Row cap; defaults to the service limit and can only lower it
+            statement_timeout_ms: Timeout; defaults to the service limit and can only lower it
+            is_disconnected: Polled while a chunk is fetched; the stream stops when it returns True
+        """
+        sql_query = self.validate(sql_query)
+        limit = min(max_rows or self.max_rows, self.max_rows)
+        async for rows in self._stream(sql_query, limit, statement_timeout_ms, is_disconnected):
+            yield rows
+
+    async def _stream(
+        self,
+        sql_query: str,
+        limit: int,
+        statement_timeout_ms: Optional[int] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[list[dict]]:
+        timeout_ms = min(statement_timeout_ms or self.statement_timeout_ms, self.statement_timeout_ms)
+
+        sent = 0
+        async with self.engine.connect() as conn:
+            async with conn.begin():
+                await conn.execute(text("SET TRANSACTION READ ONLY"))
+                await conn.execute(
+                    text("SELECT set_config('statement_timeout', :timeout, true)"),
+                    {"timeout": f"{timeout_ms}ms"},
+                )
+                result = await self._unless_disconnected(
+                    conn.stream(
+                        text(f"SELECT * FROM ({sql_query}) AS q LIMIT {int(limit)}").execution_options(
+                            yield_per=self.chunk_size
+                        )
+                    ),
+                    is_disconnected,
+                )
+                if result is _DISCONNECTED:
+                    logger.info("Client disconnected, cancelled query before the first row")
+                    return
+                partitions = result.mappings().partitions(self.chunk_size).__aiter__()
+                while True:
+                    try:
+                        partition = await self._unless_disconnected(partitions.__anext__(), is_disconnected)
+                    except StopAsyncIteration:
+                        return
+                    if partition is _DISCONNECTED:
+                        logger.info(f"Client disconnected, stopped query after {sent} rows")
+                        return
+                    rows = [dict(row) for row in partition]
+                    sent += len(rows)
+                    yield rows
+
+    async def _unless_disconnected(
+        self,
+        awaitable: Awaitable[Any],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]],
+    ) -> Any:
+        """Await a DB call, polling the client meanwhile; cancel it and return _DISCONNECTED if the client left."""
+        if is_disconnected is None:
+            return await awaitable
+        if await is_disconnected():
+            # The awaitable may be an un-started coroutine; close it so it is not left pending
+            getattr(awaitable, "close", lambda: None)()
+            return _DISCONNECTED
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.disconnect_poll_interval)
+                if done:
+                    return task.result()
+                if await is_disconnected():
+                    return _DISCONNECTED
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def run(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        statement_timeout_ms: Optional[int] = None,
+        use_cache: bool = False,
+    ) -> dict:
+        """Run a query and return all rows (up to max_rows) in one result dict."""
+        sql_query = self.validate(sql_query)
+        max_rows = min(max_rows or self.max_rows, self.max_rows)
+        cache_key = (sql_query, max_rows)
+
+        if use_cache:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        # Ask for one extra row to know whether the result was truncated
+        data = []
+        async for rows in self._stream(sql_query, max_rows + 1, statement_timeout_ms):
+            data.extend(rows)
+        truncated = len(data) > max_rows
+        data = data[:max_rows]
+
+        result = {
+            "status": "success",
+            "row_count": len(data),
+            "truncated": truncated,
+            "data": data,
+        }
+        if use_cache:
+            self._cache_put(cache_key, result)
+        return {**result, "cached": False}
+
+    def _cache_get(self, key: tuple[str, int]) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def _cache_put(self, key: tuple[str, int], value: dict) -> None:
+        self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+query_service = QueryService()
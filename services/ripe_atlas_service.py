@@ -1,8 +1,7 @@
 import asyncio
 import time
-from anycast_ip_collection import get_anycast_ips
-from ripe_atlas_client import RipeAtlasClient
-from typing import Literal
+from ripe_atlas_client import RipeAtlasClient, atlas_client
+from typing import Literal, Optional
 import os
 import csv
 from utility import read_fetched_ping_msm_result, read_measurements, save_fetched_ping_msm_result, write_failed_msm_target, write_single_msm_id
@@ -37,13 +36,16 @@ class RipeAtlasService:
             pass
         return probes
 
-    def __init__(self):
-        self.client = RipeAtlasClient()
+    def __init__(self, client: Optional[RipeAtlasClient] = None):
+        """client: a shared RipeAtlasClient (the API creates one per process); None opens one per call."""
+        self.client = client
 
+    def _atlas(self):
+        return atlas_client(self.client)
 
     async def fetch_all_probes(self):
         probes = []
-        async with RipeAtlasClient() as client:
+        async with self._atlas() as client:
             async for probe in client.get_probes():
                 probes.append(probe)
         return probes
@@ -93,13 +95,15 @@ class RipeAtlasService:
 
     
     async def create_measurement(self, target, probes_str, num_of_probes, type: Literal["ping", "traceroute"] = "ping"):
+        from prefix_index import address_family
+
         measurement_data = {
             "definitions": [
                 {
                     "target": target,
                     "description": f"{type} measurement for {target}",
                     "type": type,
-                    "af": "4",
+                    "af": str(address_family(target)),
                     "is_oneoff": True  # it should be always true
                 }
                 ], 
@@ -116,13 +120,16 @@ class RipeAtlasService:
             }
 
         try:
-            async with RipeAtlasClient() as client:
+            async with self._atlas() as client:
                 response = await client.create_measurement(target, measurement_data)
                 return response.get("measurements", [])
         except Exception as e:
             raise e
 
     async def initiate_measurement(self):
+        # pandas-backed census pipeline, loaded on first use only
+        from anycast_ip_collection import get_anycast_ips
+
         targets = get_anycast_ips()
         #probes = await self.get_probes()
         probes_from_africa = await self.get_african_probes()
@@ -177,7 +184,7 @@ class RipeAtlasService:
         msm_ids = list(done_already.values())
 
         results = []
-        async with RipeAtlasClient() as client:
+        async with self._atlas() as client:
             for i in range(0, len(msm_ids), batch_size):
                 batch = msm_ids[i:i + batch_size]
 
@@ -209,7 +216,7 @@ class RipeAtlasService:
                 continue
 
             logger.info(f"Fetching results for measurement ID: {msm_id}")
-            async with RipeAtlasClient() as client:
+            async with self._atlas() as client:
                 response = await client.get_measurement_result(msm_id)
                 yield response
             counter += 1
@@ -217,7 +224,7 @@ class RipeAtlasService:
                 await asyncio.sleep(10)
 
     async def get_msm_ping_result_by_id(self, id):
-        async with RipeAtlasClient() as client:
+        async with self._atlas() as client:
             response = await client.get_measurement(id)
             return response
 
@@ -231,4 +238,4 @@ class RipeAtlasService:
             
 
     async def close(self):
-        await self.client.aclose()
+        """No-op for a shared client; its owner closes it."""
@@ -42,56 +42,9 @@ create table geoip2_location (
 \copy geoip2_location from 'GeoIP2-City-Locations-en.csv' with (format csv, header);
 
 
--- step 6: anycast ip info details table
-CREATE TABLE ip_info (
-    id SERIAL PRIMARY KEY,
-    ip_address INET NOT NULL,
-    asn TEXT,
-    as_name TEXT,
-    as_domain TEXT,
-    as_org TEXT,
-    country_code CHAR(2),
-    country TEXT,
-    continent TEXT,
-    continent_code CHAR(2)
-);
-
--- For fast lookup by IP
-CREATE INDEX idx_ip_info_ip ON ip_info USING gist (ip_address inet_ops);
-
--- For fast lookup by ASN
-CREATE INDEX idx_ip_info_asn ON ip_info (asn);
-
-
--- step-7: create measurement table and related indexes
-CREATE TABLE measurements (
-    id                BIGSERIAL PRIMARY KEY,
-    measurement_id    BIGINT,
-    probe_id          INTEGER,
-    dst_addr          INET,
-    src_addr          INET,
-    timestamp_unix    BIGINT,
-    timestamp_iso     TIMESTAMPTZ,
-    sent              INTEGER,
-    rcvd              INTEGER,
-    loss_pct          REAL,
-    min_ms            REAL,
-    avg_ms            REAL,
-    max_ms            REAL,
-    rtt1              REAL,
-    rtt2              REAL,
-    rtt3              REAL
-);
-
-
-CREATE INDEX idx_measurements_measurement_id
-    ON measurements (measurement_id);
-
-CREATE INDEX idx_measurements_probe_id
-    ON measurements (probe_id);
-
-CREATE INDEX idx_measurements_dst_addr
-    ON measurements (dst_addr);
+-- step 6: application tables (ip_info, measurements, ...)
+-- These are managed by Alembic migrations in db/migrations. From the project root run:
+--   alembic upgrade head
 
 
 -- get
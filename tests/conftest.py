@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+sys.path.insert(0, ROOT)
+# Keep the IP lookup cache and the log file of the tests out of data/ and logs/
+TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("IP_CACHE_PATH", os.path.join(TMP_DIR, "ip_cache.sqlite"))
+os.environ.setdefault("LOG_FILE", os.path.join(TMP_DIR, "logs", "ripe_atlas.log"))
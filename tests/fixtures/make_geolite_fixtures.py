@@ -0,0 +1,42 @@
+"""Generate the small GeoLite2 City/ASN fixture databases used by the tests.
+
+Needs mmdb-writer (pip install mmdb-writer), only to regenerate the files:
+    python tests/fixtures/make_geolite_fixtures.py
+"""
+import os
+
+from mmdb_writer import MMDBWriter
+from netaddr import IPSet
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+CITY = {
+    "81.2.69.0/24": {
+        "continent": {"code": "EU", "names": {"en": "Europe"}},
+        "country": {"iso_code": "GB", "names": {"en": "United Kingdom"}},
+        "registered_country": {"iso_code": "GB", "names": {"en": "United Kingdom"}},
+        "location": {"latitude": 51.5142, "longitude": -0.0931, "time_zone": "Europe/London", "accuracy_radius": 10},
+    },
+    "2001:db8:100::/40": {
+        "continent": {"code": "AF", "names": {"en": "Africa"}},
+        "country": {"iso_code": "KE", "names": {"en": "Kenya"}},
+        "registered_country": {"iso_code": "KE", "names": {"en": "Kenya"}},
+        "location": {"latitude": -1.2833, "longitude": 36.8167, "time_zone": "Africa/Nairobi", "accuracy_radius": 50},
+    },
+}
+ASN = {
+    "81.2.69.0/24": {"autonomous_system_number": 20712, "autonomous_system_organization": "Andrews & Arnold Ltd"},
+    "2001:db8:100::/40": {"autonomous_system_number": 64500, "autonomous_system_organization": "Example Networks"},
+}
+
+
+def write(path: str, database_type: str, networks: dict) -> None:
+    writer = MMDBWriter(ip_version=6, database_type=database_type, ipv4_compatible=True)
+    for network, record in networks.items():
+        writer.insert_network(IPSet([network]), record)
+    writer.to_db_file(path)
+
+
+if __name__ == "__main__":
+    write(os.path.join(FIXTURES, "GeoLite2-City-Test.mmdb"), "GeoLite2-City", CITY)
+    write(os.path.join(FIXTURES, "GeoLite2-ASN-Test.mmdb"), "GeoLite2-ASN", ASN)
@@ -0,0 +1,61 @@
+import os
+
+import httpx
+
+import anycast_census_client
+from anycast_census_client import AnycastCensusClient
+
+CENSUS_CSV = "prefix,number_of_sites\n1.1.1.0/24,120\n8.8.8.0/24,40\n"
+
+
+def test_stale_snapshot_is_revalidated_with_its_etag(tmp_path, monkeypatch):
+    requests = []
+
+    def handle(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text=CENSUS_CSV, headers={"ETag": '"v1"', "Last-Modified": "Wed, 08 Oct 2025 00:00:00 GMT"})
+
+    monkeypatch.setattr(
+        anycast_census_client, "InstrumentedSyncTransport",
+        lambda upstream, url=None: httpx.MockTransport(handle),
+    )
+    client = AnycastCensusClient(base_url="https://census.example", cache_dir=str(tmp_path), max_age=3600)
+    path = client.snapshot_path("2025/10/08")
+
+    # First fetch downloads and stores the validators
+    assert client.get_snapshot("2025/10/08")["number_of_sites"].tolist() == [120, 40]
+    assert "If-None-Match" not in requests[0].headers
+
+    # A fresh snapshot is served from disk
+    client.fetch("2025/10/08")
+    assert len(requests) == 1
+
+    # A stale one is revalidated; the 304 keeps the file and makes it fresh again
+    os.utime(path, (0, 0))
+    assert client.get_snapshot("2025/10/08")["prefix"].tolist() == ["1.1.1.0/24", "8.8.8.0/24"]
+    assert len(requests) == 2
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+    assert requests[1].headers["If-Modified-Since"] == "Wed, 08 Oct 2025 00:00:00 GMT"
+    assert os.path.getmtime(path) > 0
+    client.fetch("2025/10/08")
+    assert len(requests) == 2
+
+
+def test_cached_snapshot_is_used_when_the_census_is_unreachable(tmp_path, monkeypatch):
+    def handle(request):
+        raise httpx.ConnectError("offline", request=request)
+
+    monkeypatch.setattr(
+        anycast_census_client, "InstrumentedSyncTransport",
+        lambda upstream, url=None: httpx.MockTransport(handle),
+    )
+    client = AnycastCensusClient(base_url="https://census.example", cache_dir=str(tmp_path), max_age=0)
+    path = client.snapshot_path("2025/10/08")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write(CENSUS_CSV)
+    os.utime(path, (0, 0))
+
+    assert len(client.get_snapshot("2025/10/08")) == 2
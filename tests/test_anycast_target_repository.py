@@ -0,0 +1,63 @@
+import pandas as pd
+
+from repositories.anycast_target_repository import AnycastTargetRepository
+
+
+def targets(rows):
+    return pd.DataFrame(rows, columns=["prefix", "num_sites", "ip", "score"])
+
+
+OLD = targets([
+    ("1.1.1.0/24", 120, "1.1.1.1", 99),
+    ("8.8.8.0/24", 40, "8.8.8.8", 90),
+    ("9.9.9.0/24", 30, "9.9.9.9", 80),
+])
+NEW = targets([
+    ("1.1.1.0/24", 125, "1.1.1.1", 99),  # unchanged target, more sites
+    ("8.8.8.0/24", 40, "8.8.8.4", 95),   # retargeted
+    ("2001:db8::/32", 12, "2001:db8::1", 50),  # added
+])
+
+
+def test_snapshot_round_trip(tmp_path):
+    repo = AnycastTargetRepository(base_dir=str(tmp_path))
+    repo.write_snapshot("2025/10/08", 10, OLD)
+    repo.write_snapshot("2025/10/08", 10, OLD.head(1), af=6)
+
+    assert repo.exists("2025/10/08", 10) and not repo.exists("2025/10/08", 5)
+    read = repo.read_snapshot("2025/10/08", 10)
+    pd.testing.assert_frame_equal(read, OLD.sort_values("num_sites", ascending=False).reset_index(drop=True))
+    assert len(repo.read_snapshot("2025/10/08", 10, af=6)) == 1
+
+
+def test_snapshots_are_listed_per_threshold_and_family(tmp_path):
+    repo = AnycastTargetRepository(base_dir=str(tmp_path))
+    for date, threshold, af in [
+        ("2025/10/08", 10, 4), ("2025/09/01", 10, 4), ("2025/11/01", 10, 4),
+        ("2025/10/08", 0, 4), ("2025/10/08", 10, 6),
+    ]:
+        repo.write_snapshot(date, threshold, OLD, af)
+    (tmp_path / "notes.txt").write_text("not a snapshot")
+
+    assert repo.list_snapshots(10) == [("2025/09/01", 10), ("2025/10/08", 10), ("2025/11/01", 10)]
+    assert repo.list_snapshots(af=6) == [("2025/10/08", 10)]
+    assert repo.previous_snapshot("2025/11/01", 10) == "2025/10/08"
+    assert repo.previous_snapshot("2025/09/01", 10) is None
+    assert repo.previous_snapshot("2025/11/01", 0) == "2025/10/08"
+
+
+def test_diff_snapshots(tmp_path):
+    repo = AnycastTargetRepository(base_dir=str(tmp_path))
+    repo.write_snapshot("2025/10/08", 10, OLD)
+    repo.write_snapshot("2025/11/01", 10, NEW)
+
+    diff = repo.diff_snapshots("2025/10/08", "2025/11/01", 10)
+
+    assert diff.summary() == {"added": 1, "removed": 1, "retargeted": 1}
+    assert diff.added.to_dict("records") == [{"prefix": "2001:db8::/32", "num_sites": 12, "ip": "2001:db8::1", "score": 50}]
+    assert diff.removed.to_dict("records") == [{"prefix": "9.9.9.0/24", "ip": "9.9.9.9"}]
+    assert diff.retargeted.to_dict("records") == [{"prefix": "8.8.8.0/24", "num_sites": 40, "ip": "8.8.8.4", "score": 95}]
+    assert diff.new_target_ips == ["2001:db8::1", "8.8.8.4"]
+
+    unchanged = repo.diff_snapshots("2025/10/08", "2025/10/08", 10)
+    assert unchanged.summary() == {"added": 0, "removed": 0, "retargeted": 0}
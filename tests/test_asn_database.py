@@ -0,0 +1,70 @@
+import pytest
+
+from asn_database import AsnDatabase, AsnRecord
+
+PFX2AS_V4 = "\n".join([
+    "8.0.0.0\t8\t3356",
+    "8.8.8.0\t24\t15169",
+    "8.8.0.0\t16\t64500",
+    "1.1.1.0\t24\t13335_209242",
+    "10.0.0.0\t8\t64512,64513",
+    "192.0.2.0\t24\t{}",
+])
+
+PFX2AS_V6 = "\n".join([
+    "2001:4860::\t32\t15169",
+    "2001:4860:4860::\t48\t64501",
+    "2606:4700::\t32\t13335",
+])
+
+AS2ORG = "\n".join([
+    "# format:org_id|changed|org_name|country|source",
+    "GOGL-ARIN|20230101|Google LLC|US|ARIN",
+    "CLOUD14-ARIN|20230101|Cloudflare, Inc.|US|ARIN",
+    "# format:aut|changed|aut_name|org_id|opaque_id|source",
+    "15169|20230101|GOOGLE|GOGL-ARIN||ARIN",
+    "13335|20230101|CLOUDFLARENET|CLOUD14-ARIN||ARIN",
+])
+
+
+@pytest.fixture
+def database(tmp_path):
+    paths = []
+    for name, content in (("rv2.pfx2as", PFX2AS_V4), ("rv6.pfx2as", PFX2AS_V6)):
+        (tmp_path / name).write_text(content + "\n")
+        paths.append(str(tmp_path / name))
+    (tmp_path / "as-org2info.txt").write_text(AS2ORG + "\n")
+    return AsnDatabase.build(paths, str(tmp_path / "as-org2info.txt"))
+
+
+CASES = [
+    # Most specific of /8, /16 and /24 wins
+    ("8.8.8.8", AsnRecord(15169, "8.8.8.0/24", "GOOGLE", "Google LLC", "US")),
+    ("8.8.4.4", AsnRecord(64500, "8.8.0.0/16")),
+    ("8.1.2.3", AsnRecord(3356, "8.0.0.0/8")),
+    # Multi-origin and AS-set origins keep their first ASN
+    ("1.1.1.1", AsnRecord(13335, "1.1.1.0/24", "CLOUDFLARENET", "Cloudflare, Inc.", "US")),
+    ("10.20.30.40", AsnRecord(64512, "10.0.0.0/8")),
+    ("2001:4860:4860::8888", AsnRecord(64501, "2001:4860:4860::/48")),
+    ("2001:4860:1::1", AsnRecord(15169, "2001:4860::/32", "GOOGLE", "Google LLC", "US")),
+    ("2606:4700:4700::1111", AsnRecord(13335, "2606:4700::/32", "CLOUDFLARENET", "Cloudflare, Inc.", "US")),
+    # Misses: unrouted, a prefix with an unparseable origin, invalid input
+    ("9.9.9.9", None),
+    ("192.0.2.1", None),
+    ("2a00::1", None),
+    ("not-an-ip", None),
+    ("", None),
+]
+
+
+def test_longest_prefix_match(database):
+    results = database.lookup_many([ip for ip, _ in CASES])
+    assert results == dict(CASES)
+
+
+def test_save_load_round_trip(database, tmp_path):
+    path = database.save(str(tmp_path / "asn" / "asn_db.npz"))
+    loaded = AsnDatabase.load(path)
+
+    assert len(loaded) == len(database)
+    assert loaded.lookup_many([ip for ip, _ in CASES]) == dict(CASES)
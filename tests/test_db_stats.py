@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+import api
+from db.db import get_db
+
+
+def table(name, partitioned=False, partition_of=None, rows=0, total_bytes=0):
+    return {
+        "table": name, "is_partitioned": partitioned, "partition_of": partition_of,
+        "row_count": rows, "dead_rows": 0, "total_bytes": total_bytes, "table_bytes": total_bytes,
+        "index_bytes": 0, "seq_scan": 0, "seq_tup_read": 0, "idx_scan": 0, "idx_tup_fetch": 0,
+        "last_analyzed": None,
+    }
+
+
+class FakeSession:
+    rows = [
+        table("measurements", partitioned=True),
+        table("measurements_af", partition_of="measurements", rows=30, total_bytes=300),
+        table("measurements_sa", partition_of="measurements", rows=10, total_bytes=100),
+        table("ip_info", rows=5, total_bytes=50),
+    ]
+
+    async def execute(self, query, params=None):
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return [dict(row) for row in self.rows]
+
+
+def test_db_stats_keeps_table_key_and_rolls_up_partitions():
+    async def fake_db():
+        yield FakeSession()
+
+    api.app.dependency_overrides[get_db] = fake_db
+    try:
+        body = TestClient(api.app).get("/api/db/stats").json()
+    finally:
+        api.app.dependency_overrides.pop(get_db)
+
+    assert body["status"] == "success"
+    assert body["total_rows"] == 45
+    tables = {stat["table"]: stat for stat in body["tables"]}
+    assert tables["measurements"]["row_count"] == 40
+    assert tables["measurements"]["total_bytes"] == 400
+    assert body["tables"][0]["table"] == "measurements"
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from services.enrichment_pipeline import CheckpointStore, EnrichmentPipeline
+
+IPS = [f"192.0.2.{i}" for i in range(1, 11)]
+
+
+class Interrupted(BaseException):
+    """Stands in for Ctrl-C: not caught by the per-lookup error handling."""
+
+
+def test_resume_skips_checkpointed_ips(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    looked_up = []
+
+    async def interrupted_lookup(ip):
+        if len(looked_up) == 5:
+            raise Interrupted()
+        looked_up.append(ip)
+        if ip == "192.0.2.2":
+            raise RuntimeError("HTTP 502")
+        return {"ip": ip}
+
+    store = CheckpointStore(path)
+    with pytest.raises(Interrupted):
+        asyncio.run(EnrichmentPipeline("ipinfo", interrupted_lookup, store, concurrency=1, flush_every=2).run(IPS))
+    store.close()
+    assert looked_up == IPS[:5]
+
+    resumed = []
+
+    async def lookup(ip):
+        resumed.append(ip)
+        return {"ip": ip}
+
+    store = CheckpointStore(path)
+    stats = asyncio.run(EnrichmentPipeline("ipinfo", lookup, store, concurrency=1).run(IPS))
+
+    # Successes of the interrupted run are skipped; its failure is retried
+    assert resumed == ["192.0.2.2"] + IPS[5:]
+    assert stats == {"seen": 10, "skipped_existing": 4, "written": 6, "errors": 0}
+    assert sorted(ip for ip, _ in store.results("ipinfo")) == sorted(IPS)
+
+    # A run over the same IPs has nothing left to do
+    assert asyncio.run(EnrichmentPipeline("ipinfo", lookup, store).run(IPS))["skipped_existing"] == 10
+    assert len(resumed) == 6
+    store.close()
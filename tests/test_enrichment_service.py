@@ -0,0 +1,96 @@
+import asyncio
+
+from services.enrichment_service import EnrichmentService, EnrichmentSource, GeoIpDbSource
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class FakeSession:
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def execute(self, query, params):
+        if self.behaviour == "hang":
+            await asyncio.sleep(10)
+        if self.behaviour == "fail":
+            raise RuntimeError("current transaction is aborted")
+        return FakeResult([
+            {
+                "source_ip": ip, "network": "81.2.69.0/24", "latitude": 51.5, "longitude": -0.1,
+                "continent_code": "EU", "continent_name": "Europe", "country_iso_code": "GB", "country_name": "United Kingdom",
+            }
+            for ip in params.values()
+        ])
+
+
+def test_geoip_db_uses_a_fresh_session_after_timeout_or_error():
+    sessions = []
+    behaviours = iter(["hang", "fail", "ok"])
+
+    def session_factory():
+        sessions.append(FakeSession(next(behaviours)))
+        return sessions[-1]
+
+    async def run():
+        source = GeoIpDbSource(timeout=0.05, session_factory=session_factory)
+        async with EnrichmentService([source], required_fields=("country_code",)) as service:
+            first = await service.lookup("81.2.69.1")
+            second = await service.lookup("81.2.69.2")
+            third = await service.lookup("81.2.69.3")
+            return first, second, third, service.stats()["geoip_db"]
+
+    first, second, third, stats = asyncio.run(run())
+    assert first.country_code is None and second.country_code is None
+    assert third.country_code == "GB"
+    assert (stats["timeouts"], stats["errors"]) == (1, 1)
+    assert len(sessions) == 3 and all(session.closed for session in sessions)
+
+
+class ChunkedSource(EnrichmentSource):
+    """Answers every IP except those of chunks containing a slow IP."""
+
+    def __init__(self, name, slow=(), batch_size=2):
+        super().__init__(timeout=0.05, concurrency=1, batch_size=batch_size)
+        self.name = name
+        self.slow = set(slow)
+        self.chunks = []
+
+    async def lookup_many(self, ips):
+        self.chunks.append(list(ips))
+        if self.slow & set(ips):
+            await asyncio.sleep(10)
+        return {ip: {"country_code": self.name.upper()} for ip in ips}
+
+
+def test_timeout_applies_per_chunk_and_keeps_partial_answers():
+    first = ChunkedSource("aa", slow={"192.0.2.3"})
+    fallback = ChunkedSource("bb", batch_size=10)
+    ips = [f"192.0.2.{n}" for n in range(1, 6)]
+
+    async def run():
+        async with EnrichmentService([first, fallback], required_fields=("country_code",)) as service:
+            return await service.lookup_many(ips), service.stats()
+
+    results, stats = asyncio.run(run())
+    assert first.chunks == [ips[0:2], ips[2:4], ips[4:5]]
+    assert {ip: result.country_code for ip, result in results.items()} == {
+        "192.0.2.1": "AA", "192.0.2.2": "AA", "192.0.2.3": "BB", "192.0.2.4": "BB", "192.0.2.5": "AA",
+    }
+    assert fallback.chunks == [["192.0.2.3", "192.0.2.4"]]
+    assert (stats["aa"]["calls"], stats["aa"]["timeouts"]) == (3, 1)
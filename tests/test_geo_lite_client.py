@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+
+from geo_lite_client import GeoLiteClient
+
+
+def test_web_city_many_bounds_concurrency(monkeypatch):
+    monkeypatch.setenv("GEO_LITE_BASE_URL", "https://geolite.example")
+    monkeypatch.setenv("GEO_LITE_ACCOUNT_ID", "test")
+    monkeypatch.setenv("GEO_LITE_LICENSE_KEY", "test")
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def handle(request):
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        ip = request.url.path.rsplit("/", 1)[-1]
+        if ip.endswith(".9"):
+            return httpx.Response(404)
+        if ip.endswith(".8"):
+            return httpx.Response(503)
+        return httpx.Response(200, json={"country": {"iso_code": "KE"}, "traits": {"ip_address": ip}})
+
+    ips = [f"192.0.2.{i}" for i in range(1, 21)] * 2
+
+    async def run():
+        client = GeoLiteClient()
+        client._client = httpx.AsyncClient(base_url="https://geolite.example", transport=httpx.MockTransport(handle))
+        async with client:
+            return await client.city_many(ips, concurrency=4)
+
+    results = asyncio.run(run())
+
+    assert list(results) == list(dict.fromkeys(ips))
+    assert state["max_in_flight"] == 4
+    # No data (404) and failed (503) lookups both come back as None
+    assert results["192.0.2.9"] is None and results["192.0.2.8"] is None
+    assert results["192.0.2.1"].country_iso == "KE"
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("maxminddb")
+
+import ip_lookup_cache
+from geo_lite_client import GeoLiteMMDBClient, create_geolite_client
+from ip_lookup_cache import CachedGeoLiteClient
+
+from conftest import FIXTURES
+
+CITY_MMDB = os.path.join(FIXTURES, "GeoLite2-City-Test.mmdb")
+ASN_MMDB = os.path.join(FIXTURES, "GeoLite2-ASN-Test.mmdb")
+
+
+def test_lookup_ipv4_merges_city_and_asn():
+    client = GeoLiteMMDBClient(CITY_MMDB, ASN_MMDB)
+    result = client.lookup("81.2.69.160")
+    assert result.country_iso == "GB"
+    assert result.continent_code == "EU"
+    assert result.as_num == 20712
+    assert result.as_org == "Andrews & Arnold Ltd"
+    assert result.network == "81.2.69.0/24"
+    assert result.latitude == pytest.approx(51.5142)
+
+
+def test_lookup_ipv6():
+    client = GeoLiteMMDBClient(CITY_MMDB, ASN_MMDB)
+    result = client.lookup("2001:db8:101::1")
+    assert result.country_iso == "KE"
+    assert result.as_num == 64500
+    assert result.network == "2001:db8:100::/40"
+
+
+def test_lookup_unknown_and_invalid_ip():
+    client = GeoLiteMMDBClient(CITY_MMDB, ASN_MMDB)
+    assert client.lookup("8.8.8.8") is None
+    assert client.lookup("not-an-ip") is None
+
+
+def test_city_only_database():
+    client = GeoLiteMMDBClient(CITY_MMDB, asn_path="")
+    result = client.lookup("81.2.69.160")
+    assert result.country_iso == "GB"
+    assert result.as_num is None
+
+
+def test_reloads_replaced_database(tmp_path):
+    city = tmp_path / "city.mmdb"
+    shutil.copy(ASN_MMDB, city)  # no City records yet
+    client = GeoLiteMMDBClient(str(city), asn_path="", check_interval=0)
+    assert client.lookup("81.2.69.160").country_iso is None
+
+    replacement = tmp_path / "city.mmdb.new"
+    shutil.copy(CITY_MMDB, replacement)
+    os.replace(replacement, city)
+    assert client.lookup("81.2.69.160").country_iso == "GB"
+
+
+def test_cached_client_bypasses_cache_for_mmdb(monkeypatch):
+    monkeypatch.setenv("GEO_LITE_CITY_MMDB", CITY_MMDB)
+    monkeypatch.setenv("GEO_LITE_ASN_MMDB", ASN_MMDB)
+    monkeypatch.setattr("geo_lite_client._mmdb_client", None)
+    writes = []
+    monkeypatch.setattr(ip_lookup_cache.PersistentCache, "put_many", lambda self, *args: writes.append(args))
+
+    async def lookup():
+        async with CachedGeoLiteClient(client=create_geolite_client("mmdb")) as client:
+            return await client.city("81.2.69.160")
+
+    result = asyncio.run(lookup())
+    assert result.country_iso == "GB"
+    assert writes == []
+    memory = ip_lookup_cache._memory.get("geolite_city")
+    assert memory is None or memory.get(("geolite_city", "81.2.69.160")) is None
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from ip_info_client import IpinfoClient
+
+import ip_lookup_cache
+from ip_lookup_cache import NEGATIVE, CachedLookup, PersistentCache
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PersistentCache(str(tmp_path / "cache.sqlite"))
+
+
+def make_cache(store, fetch, error_ttl=60):
+    return CachedLookup("test", fetch, ttl=3600, negative_ttl=3600, error_ttl=error_ttl, persistent=store)
+
+
+def test_errors_are_not_negative_cached(store):
+    calls = []
+
+    async def fetch(ip):
+        calls.append(ip)
+        if ip == "8.8.8.8":
+            raise TimeoutError("upstream timed out")
+        return None
+
+    cache = make_cache(store, fetch, error_ttl=0)
+
+    async def run():
+        return [await cache.get(ip) for ip in ("8.8.8.8", "8.8.8.8", "1.1.1.1", "1.1.1.1")]
+
+    assert asyncio.run(run()) == [None] * 4
+    # the error is retried; the empty answer is cached
+    assert calls == ["8.8.8.8", "8.8.8.8", "1.1.1.1"]
+    assert store.get("test", "8.8.8.8") == (None, 0.0)
+    assert store.get("test", "1.1.1.1")[0] is NEGATIVE
+    assert cache.metrics.errors == 2
+
+
+def test_errors_are_remembered_briefly_in_memory(store):
+    calls = []
+
+    async def fetch(ip):
+        calls.append(ip)
+        raise ConnectionError("refused")
+
+    cache = make_cache(store, fetch)
+
+    async def run():
+        await cache.get("8.8.8.8")
+        await cache.get("8.8.8.8")
+
+    asyncio.run(run())
+    assert calls == ["8.8.8.8"]
+    assert store.get("test", "8.8.8.8") == (None, 0.0)
+
+
+def test_batch_failures_are_not_negative_cached(store):
+    batches = []
+
+    async def fetch_many(ips):
+        batches.append(list(ips))
+        if len(batches) == 1:
+            raise ConnectionError("refused")
+        # 9.9.9.9 failed on its own and is left out; 1.1.1.1 has no data
+        return {"8.8.8.8": {"asn": 15169}, "1.1.1.1": None}
+
+    cache = make_cache(store, None, error_ttl=0)
+    ips = ["8.8.8.8", "1.1.1.1", "9.9.9.9"]
+
+    async def run():
+        return [await cache.get_many(ips, fetch_many) for _ in range(3)]
+
+    first, second, third = asyncio.run(run())
+    assert first == dict.fromkeys(ips)
+    assert second == third == {"8.8.8.8": {"asn": 15169}, "1.1.1.1": None, "9.9.9.9": None}
+    assert batches == [ips, ips, ["9.9.9.9"]]
+    assert store.get("test", "1.1.1.1")[0] is NEGATIVE
+    assert store.get("test", "9.9.9.9") == (None, 0.0)
+
+
+def test_ipinfo_single_lookups_leave_out_failures(monkeypatch):
+    monkeypatch.setenv("IP_INFO_BASE_URL", "https://ipinfo.example")
+
+    def handle(request):
+        ip = request.url.path.rsplit("/", 1)[-1]
+        status = {"8.8.8.8": 200, "1.1.1.1": 404}.get(ip, 503)
+        return httpx.Response(status, json={"ip": ip, "asn": "AS15169"} if status == 200 else {})
+
+    async def run():
+        client = IpinfoClient()
+        client._client = httpx.AsyncClient(base_url="https://ipinfo.example", transport=httpx.MockTransport(handle))
+        client._batch_available = False
+        async with client:
+            return await client.lookup_many(["8.8.8.8", "1.1.1.1", "9.9.9.9"])
+
+    assert asyncio.run(run()) == {"8.8.8.8": {"ip": "8.8.8.8", "asn": "AS15169"}, "1.1.1.1": None}
+
+
+@pytest.mark.parametrize("batch_status, headers, sleeps", [
+    (429, {"Retry-After": "3"}, [3.0, 3.0]),
+    (503, {}, [0.5, 1.0]),
+])
+def test_ipinfo_batch_retries_then_falls_back_to_single_lookups(monkeypatch, batch_status, headers, sleeps):
+    monkeypatch.setenv("IP_INFO_BASE_URL", "https://ipinfo.example")
+    requests = []
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    def handle(request):
+        requests.append(request.url.path)
+        if request.url.path == "/batch":
+            return httpx.Response(batch_status, headers=headers)
+        ip = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={"ip": ip})
+
+    async def run():
+        client = IpinfoClient()
+        client.BATCH_BACKOFF = 0.5
+        client._client = httpx.AsyncClient(base_url="https://ipinfo.example", transport=httpx.MockTransport(handle))
+        async with client:
+            results = await client.lookup_many(["8.8.8.8", "1.1.1.1"])
+            return results, client._batch_available
+
+    monkeypatch.setattr("ip_info_client.asyncio.sleep", sleep)
+    results, batch_available = asyncio.run(run())
+
+    assert results == {"8.8.8.8": {"ip": "8.8.8.8"}, "1.1.1.1": {"ip": "1.1.1.1"}}
+    assert requests.count("/batch") == 3 and sorted(requests[3:]) == ["/lite/1.1.1.1", "/lite/8.8.8.8"]
+    assert slept == sleeps
+    # A transient failure doesn't turn the batch endpoint off
+    assert batch_available
+
+
+def test_get_many_writes_the_store_once(store, monkeypatch):
+    writes = []
+    put_many = store.put_many
+    monkeypatch.setattr(store, "put_many", lambda source, entries: writes.append(len(entries)) or put_many(source, entries))
+
+    async def fetch_many(ips):
+        return {ip: {"asn": 64500} for ip in ips}
+
+    cache = make_cache(store, None)
+    ips = ["8.8.8.8", "1.1.1.1", "9.9.9.9", "10.0.0.1"]
+    results = asyncio.run(cache.get_many(ips, fetch_many))
+
+    assert results["10.0.0.1"] is None and results["8.8.8.8"] == {"asn": 64500}
+    assert writes == [4]
+    assert store.get("test", "9.9.9.9")[0] == {"asn": 64500}
+    assert store.get("test", "10.0.0.1")[0] is NEGATIVE
+
+
+def test_cancelled_single_lookups_keep_their_answers(store, monkeypatch):
+    from ip_lookup_cache import CachedIpinfoClient
+
+    class SlowIpinfo:
+        _batch_available = False
+        calls = []
+
+        async def lookup(self, ip):
+            self.calls.append(ip)
+            if ip == "9.9.9.9":
+                await asyncio.sleep(10)
+            return {"ip": ip}
+
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr(ip_lookup_cache, "_memory", {})
+    monkeypatch.setattr(ip_lookup_cache, "_persistent_cache", store)
+    client = CachedIpinfoClient(client=SlowIpinfo())
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.lookup_many(["8.8.8.8", "1.1.1.1", "9.9.9.9"]), 0.1)
+        return await client.lookup_many(["8.8.8.8", "1.1.1.1"])
+
+    assert asyncio.run(run()) == {"8.8.8.8": {"ip": "8.8.8.8"}, "1.1.1.1": {"ip": "1.1.1.1"}}
+    assert sorted(SlowIpinfo.calls) == ["1.1.1.1", "8.8.8.8", "9.9.9.9"]
+
+
+def test_store_is_used_off_the_event_loop(store, monkeypatch):
+    calls = []
+    for name in ("get", "get_many", "put_many"):
+        method = getattr(PersistentCache, name)
+
+        def recorded(self, *args, _name=name, _method=method):
+            calls.append((_name, threading.get_ident()))
+            return _method(self, *args)
+
+        monkeypatch.setattr(PersistentCache, name, recorded)
+
+    async def fetch_many(ips):
+        return {ip: {"ip": ip} for ip in ips}
+
+    async def fetch(ip):
+        return {"ip": ip}
+
+    cache = make_cache(store, fetch)
+
+    async def run():
+        await cache.get_many(["8.8.8.8", "1.1.1.1", "10.0.0.1"], fetch_many)
+        await cache.get("9.9.9.9")
+
+    asyncio.run(run())
+    # One read and one commit per call, none of them on the loop's thread
+    assert [name for name, _ in calls] == ["get_many", "put_many", "get", "put_many"]
+    assert threading.get_ident() not in {thread for _, thread in calls}
+    assert store.get_many("test", ["8.8.8.8", "9.9.9.9", "10.0.0.1"]).keys() == {"8.8.8.8", "9.9.9.9", "10.0.0.1"}
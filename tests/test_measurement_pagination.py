@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select
+
+from apis.routes.measurement_routes import _decode_cursor, _encode_cursor
+from repositories.measurement_repository import _after_row
+
+
+def test_cursor_round_trip_with_missing_timestamp():
+    for row in ({"probe_id": 7, "timestamp_unix": 1700000000, "id": 42}, {"probe_id": 7, "timestamp_unix": None, "id": 43}):
+        assert _decode_cursor(_encode_cursor(row)) == (row["probe_id"], row["timestamp_unix"], row["id"])
+    with pytest.raises(HTTPException):
+        _decode_cursor("7:1700000000")
+
+
+def test_keyset_pages_visit_every_row_once():
+    table = Table(
+        "measurements", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("probe_id", Integer, nullable=False),
+        Column("timestamp_unix", Integer),
+    )
+    engine = create_engine("sqlite://")
+    table.metadata.create_all(engine)
+    # Same probe and timestamp under two continents, and rows without a timestamp
+    rows = [
+        (1, 10, 100), (2, 10, 100), (3, 10, None), (4, 10, 200), (5, 10, None),
+        (6, 11, 100), (7, 9, None), (8, 11, 100), (9, 10, 200),
+    ]
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{"id": i, "probe_id": p, "timestamp_unix": t} for i, p, t in rows])
+
+    order = (table.c.probe_id, table.c.timestamp_unix.asc().nulls_last(), table.c.id)
+    seen, after = [], None
+    with engine.connect() as conn:
+        while True:
+            query = select(table).order_by(*order).limit(2)
+            if after is not None:
+                query = query.where(_after_row(table, *_decode_cursor(after)))
+            page = [dict(row) for row in conn.execute(query).mappings()]
+            seen += [row["id"] for row in page]
+            if len(page) < 2:
+                break
+            after = _encode_cursor(page[-1])
+
+    assert seen == [7, 1, 2, 4, 9, 3, 5, 6, 8]
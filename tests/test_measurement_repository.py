@@ -0,0 +1,36 @@
+import asyncio
+
+from models.measurement import PingResult
+from repositories.measurement_repository import MeasurementRepository
+
+
+def ping(target, timestamp=1700000000):
+    return PingResult(
+        measurement_id=1, probe_id=2, target=target, source_address="10.0.0.1", timestamp=timestamp,
+        sent=3, received=3, loss_percentage=0.0, continent_code="AF",
+    )
+
+
+def test_ingest_refreshes_stats_of_touched_targets(monkeypatch):
+    repo = MeasurementRepository(session=object())
+    refreshed = []
+
+    async def refresh_target_stats(dst_addrs=None):
+        refreshed.append(dst_addrs)
+        return {"status": "success"}
+
+    monkeypatch.setattr(repo, "refresh_target_stats", refresh_target_stats)
+    results = [ping("192.0.2.1"), ping("192.0.2.2"), ping("192.0.2.1")]
+
+    assert asyncio.run(repo._saved(results, 2)) == {"status": "success", "saved": 2, "skipped": 1}
+    assert asyncio.run(repo._saved(results, 0))["saved"] == 0
+    assert refreshed == [{"192.0.2.1", "192.0.2.2"}]
+
+
+def test_results_without_timestamp_are_not_ingested():
+    # session=object() would fail on use, so nothing may reach the database
+    repo = MeasurementRepository(session=object())
+    results = [ping("192.0.2.1", timestamp=None), ping("192.0.2.2", timestamp=None)]
+
+    assert asyncio.run(repo.write_ping_results_to_db(results)) == {"status": "success", "saved": 0}
+    assert asyncio.run(repo.copy_ping_results_to_db(results)) == {"status": "success", "saved": 0}
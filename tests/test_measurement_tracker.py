@@ -0,0 +1,82 @@
+import asyncio
+
+from services.measurement_tracker import MeasurementTracker
+
+STOPPED, ONGOING = 4, 2
+
+
+class FakeAtlasClient:
+    def __init__(self, measurements):
+        self.measurements = measurements
+
+    async def get_measurements(self, msm_ids, page_size=500):
+        for msm_id in msm_ids:
+            if msm_id in self.measurements:
+                yield self.measurements[msm_id]
+
+
+def measurement(msm_id, status_id, participant_count=10):
+    return {"id": msm_id, "status": {"id": status_id, "name": "x"}, "participant_count": participant_count}
+
+
+def test_short_finished_measurement_is_refetched_only_once():
+    tracker = MeasurementTracker(FakeAtlasClient({
+        1: measurement(1, STOPPED),
+        2: measurement(2, STOPPED),
+        3: measurement(3, ONGOING),
+        4: measurement(4, STOPPED),
+    }))
+    stored = {1: 7, 2: 7, 4: 10}
+
+    first = asyncio.run(tracker.plan([1, 2, 3, 4, 5], stored))
+    assert (first.to_refetch, first.pending, first.complete, first.unknown) == ([1, 2], [3], [4], [5])
+
+    # 1 was fetched after it stopped; its missing probes never reported
+    second = asyncio.run(tracker.plan([1, 2, 3, 4, 5], stored, final_fetched={1}))
+    assert (second.to_refetch, second.complete) == ([2], [1, 4])
+
+
+class FakeRepository:
+    session = object()
+
+    def __init__(self):
+        self.marked = []
+
+    def read_all_measurements(self, path):
+        return {f"target-{msm_id}": msm_id for msm_id in (1, 2, 3)}
+
+    async def get_result_counts_in_db(self, continent_code=None):
+        return {}
+
+    async def get_final_fetched_ids(self, continent_code):
+        return set()
+
+    async def copy_ping_results_to_db(self, results):
+        return {"status": "success", "saved": len(results)}
+
+    async def mark_final_fetched(self, msm_ids, continent_code):
+        self.marked.extend(msm_ids)
+
+
+class ResultsClient(FakeAtlasClient):
+    async def get_measurement_result(self, msm_id):
+        if msm_id == 1:
+            return None  # 429 / 5xx / timeout
+        if msm_id == 2:
+            return []
+        return [{"msm_id": 3, "prb_id": 7, "dst_addr": "192.0.2.1", "from": "198.51.100.1", "timestamp": 1700000000, "sent": 3, "rcvd": 3}]
+
+
+def test_failed_result_fetch_is_retried_not_marked_final(monkeypatch):
+    from services.measurement_service import MeasurementService
+
+    monkeypatch.setenv("RIPE_ATLAS_API_KEYS", '{"main": "key"}')
+    repo = FakeRepository()
+    client = ResultsClient({msm_id: measurement(msm_id, STOPPED) for msm_id in (1, 2, 3)})
+    service = MeasurementService(probe_service=None, measurement_repository=repo, client=client)
+
+    summary = asyncio.run(service.fetch_measurement_results_to_db("AF"))
+
+    assert summary["failed_measurements"] == [1]
+    assert summary["saved"] == 1
+    assert sorted(repo.marked) == [2, 3]
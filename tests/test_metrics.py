@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from metrics import InstrumentedTransport, env_proxy
+from ripe_atlas_client import RipeAtlasClient
+
+
+def _pool(client: RipeAtlasClient):
+    return client._client._transport._transport._pool
+
+
+def test_env_proxy(monkeypatch):
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example:3128")
+    monkeypatch.setenv("NO_PROXY", "internal.example")
+    assert env_proxy("https://atlas.ripe.net/api/v2/") == "http://proxy.example:3128"
+    assert env_proxy("https://internal.example/") is None
+    assert env_proxy("http://atlas.ripe.net/") is None
+
+
+def test_instrumented_clients_keep_environment_proxies(monkeypatch):
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example:3128")
+    assert type(_pool(RipeAtlasClient(api_key="key"))).__name__ == "AsyncHTTPProxy"
+
+    monkeypatch.delenv("HTTPS_PROXY")
+    monkeypatch.delenv("https_proxy", raising=False)
+    assert type(_pool(RipeAtlasClient(api_key="key"))).__name__ == "AsyncConnectionPool"
+
+
+def test_records_latency_and_errors():
+    def handle(request):
+        if request.url.path == "/down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(503 if request.url.path == "/busy" else 200)
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"upstream": "test", **labels}) or 0
+
+    before = sample("upstream_request_duration_seconds_count")
+
+    async def run():
+        transport = InstrumentedTransport("test", transport=httpx.MockTransport(handle))
+        async with httpx.AsyncClient(base_url="https://upstream.example", transport=transport) as client:
+            await client.get("/ok")
+            await client.get("/busy")
+            with pytest.raises(httpx.ConnectError):
+                await client.get("/down")
+
+    asyncio.run(run())
+    assert sample("upstream_request_duration_seconds_count") - before == 3
+    assert sample("upstream_request_errors_total", error="http_503") == 1
+    assert sample("upstream_request_errors_total", error="ConnectError") == 1
@@ -0,0 +1,29 @@
+import pytest
+
+from anycast_ip_collection import match_hitlist
+from prefix_index import PrefixIndex, split_families
+
+
+def test_split_families_treats_non_strings_as_invalid_ipv4():
+    v4, v6 = split_families(["1.2.3.4", float("nan"), "2001:db8::1", None])
+    assert v4.tolist() == [0, 1, 3]
+    assert v6.tolist() == [2]
+
+
+def test_lookup_strings_mixed_families_and_invalid_values():
+    index = PrefixIndex(["1.2.0.0/16", "1.2.3.0/24", "2001:db8::/32"])
+    positions = index.lookup_strings(["1.2.3.4", "1.2.9.9", "2001:db8::1", "9.9.9.9", float("nan"), "garbage"])
+    assert positions.tolist() == [1, 0, 2, -1, -1, -1]
+
+
+@pytest.mark.parametrize("lines", [
+    ["ab 5 1.2.3.4", "cd 7", "ef 9 2001:db8::5"],
+    ["cd 7", "ab 5 1.2.3.4", "ef 9 2001:db8::5"],
+])
+def test_match_hitlist_skips_truncated_fsdb_rows(tmp_path, lines):
+    hitlist = tmp_path / "hitlist.fsdb"
+    hitlist.write_text("#fsdb -F s hex score ip\n" + "\n".join(lines) + "\n")
+    match = match_hitlist(["1.2.3.0/24", "2001:db8::/32", "5.6.7.0/24"], str(hitlist))
+    assert match.ips == ["1.2.3.4", "2001:db8::5", None]
+    assert match.scores == [5, 9, None]
+    assert match.rows_scanned == 3
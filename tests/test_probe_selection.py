@@ -0,0 +1,60 @@
+import pytest
+
+from services.probe_selection import ProbeSelector
+
+# Ranked best first by last_connected, so the expected IDs below follow this order
+PROBES = [
+    {"id": 1, "country_code": "KE", "asn_v4": 100, "asn_v6": 600, "address_v4": "10.0.0.1", "address_v6": "2001:db8::1",
+     "latitude": -1.2, "longitude": 36.8, "last_connected": 900, "total_uptime": 10, "is_anchor": "True"},
+    {"id": 2, "country_code": "KE", "asn_v4": 100, "asn_v6": None, "address_v4": "10.0.0.2", "address_v6": "",
+     "latitude": -1.3, "longitude": 36.9, "last_connected": 800, "total_uptime": 10, "is_anchor": "False"},
+    {"id": 3, "country_code": "KE", "asn_v4": 200, "asn_v6": 600, "address_v4": "10.0.0.3", "address_v6": "2001:db8::3",
+     "latitude": 0.5, "longitude": 37.5, "last_connected": 700, "total_uptime": 10, "is_anchor": "False"},
+    {"id": 4, "country_code": "NG", "asn_v4": 100, "asn_v6": None, "address_v4": "10.0.0.4", "address_v6": None,
+     "latitude": 6.5, "longitude": 3.4, "last_connected": 600, "total_uptime": 10, "is_anchor": "False"},
+    {"id": 5, "country_code": "NG", "asn_v4": 300, "asn_v6": 700, "address_v4": None, "address_v6": "2001:db8::5",
+     "latitude": None, "longitude": None, "last_connected": 500, "total_uptime": 10, "is_anchor": "False"},
+    {"id": 6, "country_code": "", "asn_v4": 400, "asn_v6": None, "address_v4": "10.0.0.6", "address_v6": None,
+     "latitude": 6.6, "longitude": 3.3, "last_connected": 400, "total_uptime": 10, "is_anchor": "False"},
+    # Same last_connected as 1: the longer uptime ranks first
+    {"id": 7, "country_code": "KE", "asn_v4": 100, "asn_v6": None, "address_v4": "10.0.0.7", "address_v6": None,
+     "latitude": -1.25, "longitude": 36.85, "last_connected": 900, "total_uptime": 20, "is_anchor": "False"},
+]
+
+CASES = [
+    ([], [7, 1, 2, 3, 4, 5, 6]),
+    ("address_family", [7, 1, 2, 3, 4, 6]),
+    (("address_family", {"af": 6}), [1, 3, 5]),
+    ("k_per_country_asn", [7, 3, 4, 5]),
+    (("k_per_country_asn", {"k": 2}), [7, 1, 3, 4, 5]),
+    (("k_per_country_asn", {"af": 6}), [1, 5]),
+    ("k_per_asn", [7, 3, 5, 6]),
+    (("k_per_asn", {"af": 6}), [1, 5]),
+    (("country_cap", {"max_per_country": 2}), [7, 1, 4, 5]),
+    ("grid_spread", [7, 3, 4]),
+    (("grid_spread", {"cell_degrees": 10.0, "k": 2}), [7, 1, 3, 4, 6]),
+    # Policies apply in order: family first, then one probe per ASN
+    ([("address_family", {"af": 6}), ("k_per_asn", {"af": 6})], [1, 5]),
+    (["k_per_asn", ("address_family", {"af": 6})], [3, 5]),
+]
+
+
+@pytest.fixture(scope="module")
+def selector():
+    return ProbeSelector(PROBES)
+
+
+@pytest.mark.parametrize("policies, expected", CASES)
+def test_policies(selector, policies, expected):
+    assert selector.select(policies).tolist() == expected
+
+
+def test_select_from_a_subset(selector):
+    subset = selector.frame[selector.frame["country_code"] == "NG"]
+    assert selector.select("k_per_asn", frame=subset).tolist() == [4, 5]
+
+
+@pytest.mark.parametrize("policies", ["nearest", ("k_per_asn", {"af": 5})])
+def test_invalid_policies_are_rejected(selector, policies):
+    with pytest.raises(ValueError):
+        selector.select(policies)
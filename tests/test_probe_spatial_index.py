@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from services.probe_spatial_index import ProbeSpatialIndex, haversine_km
+
+
+def random_probes(count=3000, seed=7):
+    rng = np.random.default_rng(seed)
+    # Uniform on the sphere, plus probes sitting on the poles and the antimeridian
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    lons = rng.uniform(-180, 180, count)
+    edges = [(90, 0), (-90, 45), (89.95, -179.99), (-89.95, 179.99), (0, 180), (0, -180), (10, 179.999), (10, -179.999)]
+    lats = np.concatenate([lats, [lat for lat, _ in edges]])
+    lons = np.concatenate([lons, [lon for _, lon in edges]])
+    return [{"id": i, "latitude": lat, "longitude": lon} for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+QUERIES = [
+    (90, 0), (-90, 0), (89.5, 120), (-89.9, -60),
+    (0, 180), (0, -180), (45, 179.5), (-30, -179.9),
+    (52.37, 4.9), (-33.87, 151.2), (0, 0),
+]
+
+
+@pytest.fixture(scope="module")
+def probes():
+    return random_probes()
+
+
+@pytest.fixture(scope="module")
+def index(probes):
+    return ProbeSpatialIndex(probes)
+
+
+def brute_force(probes, lat, lon):
+    ids = np.array([probe["id"] for probe in probes])
+    distances = haversine_km(
+        lat, lon,
+        np.array([probe["latitude"] for probe in probes]),
+        np.array([probe["longitude"] for probe in probes]),
+    )
+    return ids, distances
+
+
+@pytest.mark.parametrize("lat, lon", QUERIES)
+@pytest.mark.parametrize("radius_km", [50, 500, 2500, 15000])
+def test_within_matches_brute_force(index, probes, lat, lon, radius_km):
+    ids, distances = brute_force(probes, lat, lon)
+    expected = set(ids[distances <= radius_km].tolist())
+
+    found, found_distances = index.within(lat, lon, radius_km)
+    assert set(found.tolist()) == expected
+    assert np.all(np.diff(found_distances) >= 0)
+
+
+@pytest.mark.parametrize("lat, lon", QUERIES)
+@pytest.mark.parametrize("k", [1, 10, 100])
+def test_nearest_matches_brute_force(index, probes, lat, lon, k):
+    _, distances = brute_force(probes, lat, lon)
+
+    found, found_distances = index.nearest(lat, lon, k)
+    assert len(found) == k
+    np.testing.assert_allclose(found_distances, np.sort(distances)[:k])
+
+
+def test_nearest_returns_everything_when_k_exceeds_the_index(index, probes):
+    found, _ = index.nearest(0, 0, len(probes) + 5)
+    assert sorted(found.tolist()) == [probe["id"] for probe in probes]
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from models.probe import Probe
+from services.probe_sync import ProbeCatalogSync
+
+CONNECTED, DISCONNECTED, ABANDONED = 1, 2, 3
+
+
+def probe(probe_id, status=CONNECTED, asn=64500):
+    return Probe.from_dict({"id": probe_id, "country_code": "KE", "asn_v4": asn, "status": {"id": status}})
+
+
+CURRENT = {1: probe(1), 2: probe(2), 3: probe(3)}
+
+MERGE_CASES = [
+    # (changed probes, catalog after the merge {id: asn}, updated, removed)
+    ([], {1: 64500, 2: 64500, 3: 64500}, 0, 0),
+    ([probe(2, asn=64501)], {1: 64500, 2: 64501, 3: 64500}, 1, 0),
+    ([probe(4)], {1: 64500, 2: 64500, 3: 64500, 4: 64500}, 1, 0),
+    ([probe(1, DISCONNECTED), probe(3, ABANDONED)], {2: 64500}, 0, 2),
+    # A probe that was never connected is not counted as removed
+    ([probe(5, DISCONNECTED)], {1: 64500, 2: 64500, 3: 64500}, 0, 0),
+    ([probe(2, DISCONNECTED), probe(2, CONNECTED, asn=64502)], {1: 64500, 2: 64502, 3: 64500}, 1, 1),
+]
+
+
+@pytest.mark.parametrize("changed, expected, updated, removed", MERGE_CASES)
+def test_merge(changed, expected, updated, removed):
+    probes, summary = ProbeCatalogSync.merge(CURRENT, changed)
+
+    assert {p.id: p.asn_v4 for p in probes} == expected
+    assert summary == {
+        "mode": "incremental", "changed": len(changed), "updated": updated,
+        "removed": removed, "probes": len(expected),
+    }
+    assert {p.id for p in CURRENT.values()} == {1, 2, 3}
+
+
+class FakeAtlasClient:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    async def get_probes(self, status=1, page_size=1000, concurrency=4, **filters):
+        self.calls.append({"status": status, **filters})
+        for data in self.pages.pop(0):
+            yield data
+
+
+def api_probe(probe_id, status=CONNECTED):
+    return {"id": probe_id, "country_code": "KE", "asn_v4": 64500, "status": {"id": status}}
+
+
+def test_full_sync_then_incremental_window(tmp_path):
+    client = FakeAtlasClient([
+        [api_probe(1), api_probe(2)],
+        [api_probe(2, DISCONNECTED), api_probe(3)],
+    ])
+    sync = ProbeCatalogSync(str(tmp_path / "state.json"), overlap_seconds=600)
+
+    probes, summary = asyncio.run(sync.sync({}, client=client))
+    assert summary == {"mode": "full", "probes": 2}
+    assert client.calls == [{"status": 1}]
+    first_sync = sync.state.last_sync
+
+    # A new instance resumes from the saved state and only asks for changes
+    sync = ProbeCatalogSync(str(tmp_path / "state.json"), overlap_seconds=600)
+    probes, summary = asyncio.run(sync.sync({p.id: p for p in probes}, client=client))
+    assert client.calls[1] == {"status": None, "status_since__gte": first_sync - 600}
+    assert sorted(p.id for p in probes) == [1, 3]
+    assert (summary["mode"], summary["updated"], summary["removed"]) == ("incremental", 1, 1)
+
+
+def test_full_sync_is_due_after_the_interval(tmp_path):
+    sync = ProbeCatalogSync(str(tmp_path / "state.json"), full_resync_interval=3600)
+    now = int(time.time())
+
+    cases = [
+        # (catalog, last_sync, last_full_sync, full sync needed)
+        ({}, now, now, True),
+        (CURRENT, None, None, True),
+        (CURRENT, now, now - 60, False),
+        (CURRENT, now, now - 7200, True),
+    ]
+    for current, last_sync, last_full_sync, expected in cases:
+        sync.state.last_sync, sync.state.last_full_sync = last_sync, last_full_sync
+        assert sync.needs_full_sync(current) is expected
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from apis.streaming import _csv_lines, _ndjson_lines
+from services.query_service import _DISCONNECTED, QueryService
+
+
+async def failing_chunks():
+    yield [{"id": 1}, {"id": 2}]
+    raise RuntimeError("canceling statement due to statement timeout")
+
+
+async def collect(lines):
+    return [line async for line in lines]
+
+
+def test_stream_failing_midway_ends_with_an_error_line():
+    ndjson = "".join(asyncio.run(collect(_ndjson_lines(failing_chunks())))).splitlines()
+    assert [json.loads(line) for line in ndjson] == [
+        {"id": 1}, {"id": 2},
+        {"status": "error", "message": "canceling statement due to statement timeout"},
+    ]
+
+    csv_body = "".join(asyncio.run(collect(_csv_lines(failing_chunks())))).splitlines()
+    assert csv_body == ["id", "1", "2", "# error: canceling statement due to statement timeout"]
+
+
+def test_slow_fetch_is_cancelled_when_the_client_disconnects():
+    service = QueryService(db_engine=None, disconnect_poll_interval=0.01)
+    cancelled = []
+
+    async def slow_fetch():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        polls = 0
+
+        async def is_disconnected():
+            nonlocal polls
+            polls += 1
+            return polls > 3
+
+        fast = await service._unless_disconnected(asyncio.sleep(0, result="rows"), is_disconnected)
+        slow = await asyncio.wait_for(service._unless_disconnected(slow_fetch(), is_disconnected), 1)
+        return fast, slow
+
+    assert asyncio.run(main()) == ("rows", _DISCONNECTED)
+    assert cancelled == [True]
+
+
+@pytest.mark.parametrize("body", [
+    {"max_rows": 0},
+    {"max_rows": -5},
+    {"max_rows": "100"},
+    {"timeout_ms": 1.5},
+    {"timeout_ms": True},
+    {"format": "xml"},
+])
+def test_invalid_query_limits_are_rejected(body):
+    response = TestClient(api.app).post("/api/db/query", json={"query": "SELECT 1", **body})
+    assert response.status_code == 400
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ripe_atlas_client import RipeAtlasClient
+
+
+def paged_client(count, page_size, failing_page=None):
+    client = RipeAtlasClient(api_key="test", base_url="https://atlas.example/api/v2/")
+    state = {"in_flight": 0, "max_in_flight": 0, "pages": [], "params": []}
+
+    async def handle(request):
+        page = int(request.url.params["page"])
+        state["pages"].append(page)
+        state["params"].append(dict(request.url.params))
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        # Later pages answer first, so the yield order is not just arrival order
+        await asyncio.sleep(0.01 / page)
+        state["in_flight"] -= 1
+        if page == failing_page:
+            return httpx.Response(503)
+        first = (page - 1) * page_size
+        ids = range(first + 1, min(first + page_size, count) + 1)
+        return httpx.Response(200, json={"count": count, "results": [{"id": i} for i in ids]})
+
+    client._client = httpx.AsyncClient(base_url="https://atlas.example/api/v2", transport=httpx.MockTransport(handle))
+    return client, state
+
+
+async def collect(client, **kwargs):
+    return [probe["id"] async for probe in client.get_probes(**kwargs)]
+
+
+WINDOW_CASES = [
+    # (count, page_size, concurrency, pages requested, most pages in flight)
+    (0, 100, 4, [1], 1),
+    (100, 100, 4, [1], 1),
+    (101, 100, 4, [1, 2], 1),
+    (950, 100, 4, list(range(1, 11)), 4),
+    (950, 100, 3, list(range(1, 11)), 3),
+    (950, 100, 1, list(range(1, 11)), 1),
+]
+
+
+@pytest.mark.parametrize("count, page_size, concurrency, pages, max_in_flight", WINDOW_CASES)
+def test_get_probes_windows(count, page_size, concurrency, pages, max_in_flight):
+    client, state = paged_client(count, page_size)
+
+    ids = asyncio.run(collect(client, page_size=page_size, concurrency=concurrency))
+
+    # Every probe once, in page order, with no page requested twice
+    assert ids == list(range(1, count + 1))
+    assert sorted(state["pages"]) == pages
+    assert state["max_in_flight"] == max_in_flight
+
+
+def test_get_probes_passes_filters_to_every_page():
+    client, state = paged_client(250, 100)
+    asyncio.run(collect(client, status=None, page_size=100, status_since__gte=1700000000))
+
+    assert sorted(params["page"] for params in state["params"]) == ["1", "2", "3"]
+    assert all(
+        params["status_since__gte"] == "1700000000" and params["page_size"] == "100" and "status" not in params
+        for params in state["params"]
+    )
+
+
+def test_get_probes_raises_when_a_page_fails():
+    client, _ = paged_client(950, 100, failing_page=7)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(collect(client, page_size=100, concurrency=4))
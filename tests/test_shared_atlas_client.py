@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+
+import api
+import services.probe_registry as probe_registry
+from models.probe import Probe
+from services.probe_registry import ProbeRegistry
+from services.probe_sync import ProbeCatalogSync
+
+
+def test_probe_sync_uses_the_app_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(probe_registry, "_registry", ProbeRegistry(csv_path=str(tmp_path / "probes.csv")))
+    clients = []
+
+    async def sync(self, current, full=False, client=None):
+        clients.append(client)
+        return [Probe.from_dict({"id": 1, "country_code": "KE", "asn_v4": 64500, "status": {"id": 1}})], {"mode": "full"}
+
+    monkeypatch.setattr(ProbeCatalogSync, "sync", sync)
+    with TestClient(api.app) as client:
+        assert client.get("/probes/").json()["total"] == 1
+        assert client.post("/probes/sync").status_code == 200
+        shared = api.app.state.ripe_atlas
+
+    assert len(clients) == 2 and all(c is shared for c in clients)
@@ -0,0 +1,62 @@
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import api
+import ip_lookup_cache
+from geo_lite_client import GeoLiteClient
+from ip_info_client import IpinfoClient
+from ip_lookup_cache import CachedGeoLiteClient, CachedIpinfoClient, PersistentCache
+from services import enrichment_service
+from services.enrichment_service import GeoLiteSource, IpinfoSource
+
+
+def handle(request):
+    path = request.url.path
+    if path == "/batch":
+        keys = json.loads(request.content)
+        return httpx.Response(200, json={key: {"ip": key.split("/")[-1], "asn": "AS64500", "continent_code": "EU"} for key in keys})
+    ip = path.split("/")[-1]
+    return httpx.Response(200, json={"country": {"iso_code": "GB"}, "traits": {"ip_address": ip, "autonomous_system_number": 64500}})
+
+
+def test_upload_keeps_per_source_keys(tmp_path, monkeypatch):
+    # The app runs on the TestClient's thread, so this also uses the store across threads
+    monkeypatch.setattr(ip_lookup_cache, "_persistent_cache", PersistentCache(str(tmp_path / "cache.sqlite")))
+    monkeypatch.setenv("IP_INFO_BASE_URL", "https://ipinfo.example")
+    monkeypatch.setenv("GEO_LITE_BASE_URL", "https://geolite.example")
+    monkeypatch.setenv("GEO_LITE_ACCOUNT_ID", "test")
+    monkeypatch.setenv("GEO_LITE_LICENSE_KEY", "test")
+    monkeypatch.setenv("GEO_LITE_BACKEND", "web")
+
+    def cached_ipinfo():
+        client = IpinfoClient()
+        client._client = httpx.AsyncClient(base_url="https://ipinfo.example", transport=httpx.MockTransport(handle))
+        return CachedIpinfoClient(client=client)
+
+    def cached_geolite():
+        client = GeoLiteClient()
+        client._client = httpx.AsyncClient(base_url="https://geolite.example", transport=httpx.MockTransport(handle))
+        return CachedGeoLiteClient(client=client)
+
+    monkeypatch.setattr(api, "CachedIpinfoClient", cached_ipinfo)
+    monkeypatch.setattr(api, "CachedGeoLiteClient", cached_geolite)
+    monkeypatch.setattr(enrichment_service, "create_sources", lambda names=None: [
+        GeoLiteSource(client_factory=cached_geolite),
+        IpinfoSource(client_factory=cached_ipinfo),
+    ])
+    line = {"src_addr": "192.0.2.1", "dst_addr": "198.51.100.1", "prb_id": 1, "result": [
+        {"hop": 1, "result": [{"from": "81.2.69.142", "rtt": 1.0}]},
+        {"hop": 2, "result": [{"x": "*"}]},
+    ]}
+
+    response = TestClient(api.app).post("/upload", files={"file": ("upload.json", json.dumps(line).encode())})
+
+    assert response.status_code == 200
+    hops = response.json()[0]["traceroute"]
+    first = next(hop for hop in hops if hop["from"] == "81.2.69.142")
+    assert first["ipinfo"]["asn"] == "AS64500"
+    assert first["geolite"]["country_iso"] == "GB"
+    assert first["enrichment"]["continent_code"] == "EU" and first["enrichment"]["asn"] == 64500
+    assert all(set(hop) >= {"ipinfo", "geolite", "enrichment"} for hop in hops)